@@ -0,0 +1,282 @@
+"""
+Dialogflow CX agent export packages.
+
+build_bundle lays converted flows out the way a JSON package agent export
+does, one file per resource, with references between resources by display
+name:
+
+    agent.json
+    flows/<flow>/<flow>.json
+    flows/<flow>/pages/<page>.json
+    intents/<intent>/<intent>.json
+    intents/<intent>/trainingPhrases/<language>.json
+    webhooks/<webhook>.json
+
+Zipped, the package is the agentContent of a single agents:restore call
+(DialogflowUploader.restore_flows), which replaces all of the agent's flows,
+intents and webhooks with the bundle's. build_flow_package cuts out one
+flow with the intents and webhook it uses, the flowContent of a flows:import
+call (DialogflowUploader.import_flows) that leaves the rest of the agent
+alone. Pages, intents and routes are built by the same code as a
+resource-by-resource upload. Building, validating and writing a bundle
+needs no credentials or network.
+
+    python csv_to_dialogflow_json.py sheets --bulk --bundle agent.zip --dispatcher-url https://...
+"""
+
+import io
+import json
+import os
+import re
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flow_model import Flow, OrderedSet
+from upload_to_dialogflow import DialogflowUploader, parse_header
+
+# Resource ids in a bundle are derived from display names, so the same flows give the same bundle
+BUNDLE_NAMESPACE = uuid.UUID("5c1f6a2e-0d1b-4b8e-9a57-3f0c2d9e7b41")
+
+DEFAULT_START_FLOW = "Default Start Flow"
+DISPATCHER = "Dispatcher"
+
+# Agent settings carried over from the live agent; the rest are resource references or read-only
+AGENT_SETTINGS = ("displayName", "defaultLanguageCode", "supportedLanguageCodes", "timeZone",
+                  "description", "avatarUri", "enableSpellCorrection")
+DEFAULT_AGENT = {"displayName": "Agent", "defaultLanguageCode": "en", "timeZone": "America/New_York"}
+
+# Built-in intents every agent has, with their fixed ids
+DEFAULT_INTENTS = {
+    "Default Welcome Intent": ("00000000-0000-0000-0000-000000000000", {}, ["hi", "hello", "hey there"]),
+    "Default Negative Intent": ("00000000-0000-0000-0000-000000000001", {"isFallback": True}, []),
+}
+DEFAULT_NLU_SETTINGS = {"modelType": "MODEL_TYPE_STANDARD", "classificationThreshold": 0.3}
+
+# Characters that cannot appear in a package file name
+UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+def _file_name(display_name: str) -> str:
+    return UNSAFE_CHARS.sub("_", display_name).strip() or "_"
+
+def _resource_id(kind: str, display_name: str) -> str:
+    return str(uuid.uuid5(BUNDLE_NAMESPACE, f"{kind}/{display_name}"))
+
+def _route(route: Dict) -> Dict:
+    """A route payload with unset references dropped."""
+    return {k: v for k, v in route.items() if v is not None}
+
+class _Paths:
+    """Package paths by display name, refusing two names that map to one file."""
+
+    def __init__(self):
+        self.owners = {}
+
+    def claim(self, path: str, display_name: str) -> str:
+        owner = self.owners.setdefault(path.lower(), display_name)
+        if owner != display_name:
+            raise ValueError(f"'{display_name}' and '{owner}' map to the same bundle file {path}")
+        return path
+
+def build_bundle(flows: Iterable[Tuple[Flow, str]], agent: Optional[Dict] = None,
+                 dispatcher_url: Optional[str] = None,
+                 dispatcher_headers: Optional[Dict[str, str]] = None,
+                 intent_phrases: Optional[Dict[str, List[str]]] = None) -> Dict[str, Dict]:
+    """
+    Package (flow, flow display name) pairs as an agent export. agent
+    supplies the agent settings (e.g. the live agent resource); the
+    dispatcher webhook is included if any flow uses it. An intent shared
+    by several flows gets the training phrases of all of them, or those
+    given in intent_phrases (e.g. merged across more flows than these).
+    Returns package path -> JSON document.
+    """
+    intent_phrases = intent_phrases or {}
+    agent = {k: v for k, v in (agent or DEFAULT_AGENT).items() if k in AGENT_SETTINGS}
+    agent = dict(DEFAULT_AGENT, **agent, startFlow=DEFAULT_START_FLOW)
+    language = agent["defaultLanguageCode"]
+    bundle = {"agent.json": agent}
+    paths = _Paths()
+
+    intents = {name: OrderedSet(phrases) for name, (_, _, phrases) in DEFAULT_INTENTS.items()}
+    flow_names = set()
+    needs_dispatcher = False
+    for flow, flow_name in flows:
+        if flow_name in flow_names:
+            raise ValueError(f"More than one flow named '{flow_name}'")
+        flow_names.add(flow_name)
+        needs_dispatcher = needs_dispatcher or DialogflowUploader._needs_dispatcher(flow)
+        flow_dir = paths.claim(f"flows/{_file_name(flow_name)}", flow_name)
+
+        pages = {name: name for name in flow.pages}
+        routes_by_page = DialogflowUploader._routes_by_page(flow)
+        for name, page in flow.pages.items():
+            body = DialogflowUploader._page_body(name, page.prompts.to_list(), page.chips.to_list())
+            # Routes name the dispatcher even without a URL for it; validate_bundle then reports it missing
+            routes = DialogflowUploader._transition_routes(routes_by_page.get(name, []), pages,
+                                                           {i: i for i in flow.intents}, DISPATCHER)
+            if routes:
+                body["transitionRoutes"] = [_route(r) for r in routes]
+            path = paths.claim(f"{flow_dir}/pages/{_file_name(name)}.json", f"{flow_name}/{name}")
+            bundle[path] = {"name": _resource_id(f"flows/{flow_name}/pages", name), **body}
+
+        flow_body = {"name": _resource_id("flows", flow_name), "displayName": flow_name,
+                     "nluSettings": DEFAULT_NLU_SETTINGS}
+        if flow.first_page:
+            flow_body["transitionRoutes"] = [{"condition": "true", "targetPage": flow.first_page}]
+        bundle[f"{flow_dir}/{_file_name(flow_name)}.json"] = flow_body
+
+        for name, intent in flow.intents.items():
+            intents.setdefault(name, OrderedSet()).update(intent_phrases.get(name) or intent.training_phrases)
+
+    if DEFAULT_START_FLOW not in flow_names:
+        flow_dir = paths.claim(f"flows/{DEFAULT_START_FLOW}", DEFAULT_START_FLOW)
+        bundle[f"{flow_dir}/{DEFAULT_START_FLOW}.json"] = {
+            "name": "00000000-0000-0000-0000-000000000000", "displayName": DEFAULT_START_FLOW,
+            "transitionRoutes": [{"intent": "Default Welcome Intent"}],
+            "nluSettings": DEFAULT_NLU_SETTINGS,
+        }
+
+    for name, phrases in intents.items():
+        intent_id, extra, _ = DEFAULT_INTENTS.get(name, (_resource_id("intents", name), {}, ()))
+        body = DialogflowUploader._intent_body(name, phrases.to_list())
+        intent_dir = paths.claim(f"intents/{_file_name(name)}", name)
+        bundle[f"{intent_dir}/{_file_name(name)}.json"] = {
+            "name": intent_id, "displayName": name, "priority": 500000, **extra,
+            "numTrainingPhrases": len(body["trainingPhrases"]),
+        }
+        if body["trainingPhrases"]:
+            bundle[f"{intent_dir}/trainingPhrases/{language}.json"] = {
+                "trainingPhrases": [dict(tp, languageCode=language) for tp in body["trainingPhrases"]]
+            }
+
+    if needs_dispatcher and dispatcher_url:
+        service = {"uri": dispatcher_url}
+        if dispatcher_headers:
+            service["requestHeaders"] = dispatcher_headers
+        bundle[f"webhooks/{DISPATCHER}.json"] = {"name": _resource_id("webhooks", DISPATCHER),
+                                                 "displayName": DISPATCHER, "genericWebService": service}
+    return bundle
+
+def bundle_from_files(json_files: Iterable, agent: Optional[Dict] = None,
+                      dispatcher_url: Optional[str] = None,
+                      dispatcher_headers: Optional[Dict[str, str]] = None) -> Dict[str, Dict]:
+    """build_bundle for dialogflow_*.json files, naming flows as the uploader does."""
+    flows = [DialogflowUploader._load_flow(str(f))[:2] for f in json_files]
+    return build_bundle(flows, agent, dispatcher_url, dispatcher_headers)
+
+def build_flow_package(flow: Flow, flow_name: str, dispatcher_url: Optional[str] = None,
+                       dispatcher_headers: Optional[Dict[str, str]] = None,
+                       intent_phrases: Optional[Dict[str, List[str]]] = None) -> Dict[str, Dict]:
+    """
+    Package one flow for flows:import: its flow and page files, the intents
+    it uses and the dispatcher webhook, laid out as in build_bundle. Raises
+    ValueError if the package would not validate.
+    """
+    bundle = build_bundle([(flow, flow_name)], None, dispatcher_url, dispatcher_headers, intent_phrases)
+    problems = validate_bundle(bundle)
+    if problems:
+        raise ValueError(f"{len(problems)} problem(s) in the flow package: {'; '.join(problems[:5])}")
+    keep = (f"flows/{_file_name(flow_name)}/", "webhooks/", *(f"intents/{_file_name(name)}/" for name in flow.intents))
+    return {path: doc for path, doc in bundle.items() if path.startswith(keep)}
+
+def export_flows(json_files: Iterable, path: str, dispatcher_url: Optional[str] = None,
+                 dispatcher_header: Optional[str] = None) -> List[str]:
+    """
+    Write the bundle of json_files to path if it validates. Returns the
+    problems found; nothing is written if there are any.
+    """
+    bundle = bundle_from_files(json_files, dispatcher_url=dispatcher_url,
+                               dispatcher_headers=parse_header(dispatcher_header))
+    problems = validate_bundle(bundle)
+    if not problems:
+        write_bundle(bundle, path)
+    return problems
+
+def validate_bundle(bundle: Dict[str, Dict]) -> List[str]:
+    """Problems that would make a restore fail or lose routes; empty if the bundle is consistent."""
+    problems = []
+    agent = bundle.get("agent.json")
+    if not agent:
+        return ["agent.json is missing"]
+    for field in ("displayName", "defaultLanguageCode", "timeZone"):
+        if not agent.get(field):
+            problems.append(f"agent.json has no {field}")
+    languages = {agent.get("defaultLanguageCode"), *agent.get("supportedLanguageCodes", [])}
+
+    flows, pages, intents, webhooks, ids = {}, {}, set(), set(), {}
+    for path, doc in bundle.items():
+        parts = path.split("/")
+        if path == "agent.json":
+            continue
+        if parts[0] == "intents" and parts[2:3] == ["trainingPhrases"]:
+            if parts[3][:-len(".json")] not in languages:
+                problems.append(f"{path}: language is not one of the agent's")
+            continue
+        name = doc.get("displayName")
+        if not name or not doc.get("name"):
+            problems.append(f"{path}: missing name or displayName")
+            continue
+        if parts[-1] != f"{_file_name(name)}.json":
+            problems.append(f"{path}: file name does not match displayName '{name}'")
+        if doc["name"] in ids.setdefault(parts[0], set()):
+            problems.append(f"{path}: duplicate resource id {doc['name']}")
+        ids[parts[0]].add(doc["name"])
+        if parts[0] == "flows" and len(parts) == 3:
+            flows[parts[1]] = doc
+        elif parts[0] == "flows" and parts[2:3] == ["pages"]:
+            pages.setdefault(parts[1], {})[name] = (path, doc)
+        elif parts[0] == "intents":
+            intents.add(name)
+        elif parts[0] == "webhooks":
+            webhooks.add(name)
+            if not doc.get("genericWebService", {}).get("uri"):
+                problems.append(f"{path}: webhook has no uri")
+        else:
+            problems.append(f"{path}: not a known resource path")
+
+    missing_webhooks = {}
+    if agent.get("startFlow") not in {doc["displayName"] for doc in flows.values()}:
+        problems.append(f"agent.json: start flow '{agent.get('startFlow')}' is not in the bundle")
+    for flow_dir, flow in flows.items():
+        flow_pages = pages.get(flow_dir, {})
+        sources = [(f"flows/{flow_dir}", route) for route in flow.get("transitionRoutes", [])]
+        sources += [(path, route) for path, doc in flow_pages.values()
+                    for route in doc.get("transitionRoutes", [])]
+        for path, route in sources:
+            if not route.get("intent") and not route.get("condition"):
+                problems.append(f"{path}: route with neither intent nor condition")
+            if route.get("intent") and route["intent"] not in intents:
+                problems.append(f"{path}: route intent '{route['intent']}' is not in the bundle")
+            if route.get("targetPage") and route["targetPage"] not in flow_pages:
+                problems.append(f"{path}: route target '{route['targetPage']}' is not a page of the flow")
+            webhook = route.get("triggerFulfillment", {}).get("webhook")
+            if webhook and webhook not in webhooks:
+                missing_webhooks.setdefault(webhook, set()).add(path)
+    for webhook, paths in missing_webhooks.items():
+        problems.append(f"webhook '{webhook}' is not in the bundle (used by {len(paths)} files; "
+                        f"is the dispatcher URL set?)")
+    return list(dict.fromkeys(problems))
+
+def bundle_bytes(bundle: Dict[str, Dict]) -> bytes:
+    """The bundle as a zip archive; the same bundle always gives the same bytes."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path in sorted(bundle):
+            info = zipfile.ZipInfo(path, date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, json.dumps(bundle[path], indent=2, ensure_ascii=False))
+    return buffer.getvalue()
+
+def write_bundle(bundle: Dict[str, Dict], path: str):
+    """Write the bundle's zip archive to path."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(bundle_bytes(bundle))
+    os.replace(tmp_path, path)
+
+def read_bundle(path: str) -> Dict[str, Dict]:
+    """Load a bundle written by write_bundle (or an agent's JSON package export)."""
+    with zipfile.ZipFile(path) as archive:
+        return {name: json.loads(archive.read(name)) for name in archive.namelist()
+                if name.endswith(".json")}
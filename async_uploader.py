@@ -0,0 +1,509 @@
+"""
+asyncio engine for uploading flows to Dialogflow CX.
+
+AsyncDialogflowUploader performs the same operations as DialogflowUploader
+(flow, page, intent and webhook upserts, route patches, the start-route
+patch) as coroutines on an aiohttp client. Two bounded semaphores cap the
+work in flight: max_workers flows at a time and max_connections concurrent
+requests. Within a flow, pages and intents are upserted concurrently, and
+each page's routes are patched as soon as the page, its target pages and its
+intents exist. Requests still go through the uploader's shared rate limiter.
+
+aiohttp is only needed for this engine (the --async option):
+
+    pip install aiohttp
+"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:  # Optional dependency; only the async engine needs it
+    aiohttp = None
+
+from flow_model import Flow
+from retry_policy import UncertainWrite, operation_kind
+from sync_planner import MANAGED_FIELDS, canonical
+from upload_to_dialogflow import LIST_PAGE_SIZE, REVALIDATED_KINDS, THROTTLE_STATUSES, DialogflowUploader, logger
+
+class AsyncDialogflowUploader(DialogflowUploader):
+    """DialogflowUploader whose API operations are coroutines sharing one aiohttp session."""
+
+    def __init__(self, *args, max_connections: int = 20, **kwargs):
+        """
+        Takes the DialogflowUploader arguments, plus max_connections: the
+        number of API requests allowed in flight at once across all flows.
+        """
+        if aiohttp is None:
+            raise ImportError("The async upload engine requires aiohttp (pip install aiohttp)")
+        super().__init__(*args, **kwargs)
+        self.max_connections = max(1, max_connections)
+        self._http = None
+        self._request_slots = None
+        self._async_locks = {}
+
+    async def _client(self) -> "aiohttp.ClientSession":
+        """The shared aiohttp session, created inside the running event loop."""
+        if self._http is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._http = aiohttp.ClientSession(connector=connector)
+            self._request_slots = asyncio.Semaphore(self.max_connections)
+        return self._http
+
+    async def aclose(self):
+        """Close the aiohttp session and the inherited requests session."""
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _async_lock(self, kind: str, key: str) -> asyncio.Lock:
+        """Lock serializing work on one resource key across flows."""
+        return self._async_locks.setdefault((kind, key), asyncio.Lock())
+
+    async def _cached_async(self, kind: str, key: str, create: Callable[[], Awaitable[str]]) -> str:
+        """Return self.cache[kind][key], awaiting create() once per key to fill it."""
+        if key in self.cache[kind]:
+            return self.cache[kind][key]
+        async with self._async_lock(kind, key):
+            if key not in self.cache[kind]:
+                self.cache[kind][key] = await create()
+            return self.cache[kind][key]
+
+    @staticmethod
+    async def _gather(coros: Iterable[Awaitable]) -> List:
+        """Run coroutines concurrently; if one fails, cancel the rest and re-raise."""
+        tasks = [asyncio.ensure_future(c) for c in coros]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _request_headers(self) -> Dict[str, str]:
+        """Authentication headers, without blocking the event loop on the token."""
+        token = await self.credentials.token_async()
+        return {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+    async def _send(self, client: "aiohttp.ClientSession", method: str, url: str,
+                    **kwargs) -> "aiohttp.ClientResponse":
+        """
+        Send one request with the current token and read its body. A 401
+        refreshes the token and resends once, as part of the same attempt.
+        """
+        headers = await self._request_headers()
+        response = await client.request(method, url, headers=headers, **kwargs)
+        await response.read()
+        if response.status == 401:
+            logger.info("Refreshing authentication token...")
+            await asyncio.to_thread(self._refresh_auth, headers)
+            await self.rate_limiter.acquire_async()
+            response = await client.request(method, url, headers=await self._request_headers(), **kwargs)
+            await response.read()
+        return response
+
+    async def _api_request(self, method: str, url: str, **kwargs) -> Dict:
+        """Make an API request with the same retry policies as the sync engine; returns the JSON body."""
+        client = await self._client()
+        policy = self.retry_policies[operation_kind(method)]
+        self.retry_budget.deposit()
+        failures = throttles = 0
+        while True:
+            await self.rate_limiter.acquire_async()
+            try:
+                async with self._request_slots:
+                    sent = time.monotonic()
+                    response = await self._send(client, method, url, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Nothing reached the server if the connection was never made
+                unsent = isinstance(e, aiohttp.ClientConnectorError)
+                failures += 1
+                await asyncio.sleep(self._retry_delay(policy, method, url, e, None, failures, unsent))
+                continue
+
+            status = response.status
+            if status in THROTTLE_STATUSES:
+                # The shared limiter slows down and holds every caller for Retry-After
+                retry_after = self._throttled(status, response.headers.get('Retry-After'), sent)
+                if throttles < policy.max_throttled and (status == 429 or retry_after):
+                    throttles += 1
+                    logger.warning(f"Rate limited ({status}). Waiting {retry_after:g} seconds...")
+                    continue
+            else:
+                self.rate_limiter.succeeded()
+            if status < 400:
+                return await response.json(content_type=None) or {}
+
+            # Log error details for debugging
+            if status == 400:
+                logger.error(f"Bad request details: {await response.text()}")
+            try:
+                response.raise_for_status()
+            except aiohttp.ClientResponseError as e:
+                failures += 1
+                await asyncio.sleep(self._retry_delay(policy, method, url, e, status, failures))
+
+    @staticmethod
+    def _http_status(error: Exception) -> Optional[int]:
+        """HTTP status of a failed request, if the server answered."""
+        return getattr(error, "status", None)
+
+    async def iter_list(self, url: str, key: str, params: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """Yield every resource of a list endpoint as its page arrives, following nextPageToken."""
+        params = dict(params or {}, pageSize=LIST_PAGE_SIZE)
+        while True:
+            data = await self._api_request('GET', url, params=params)
+            for item in data.get(key, []):
+                yield item
+            token = data.get("nextPageToken")
+            if not token:
+                return
+            params["pageToken"] = token
+
+    async def list_by_name(self, url: str, key: str) -> Dict:
+        """List all resources (every page) and index by display name."""
+        return self.index_by_name([item async for item in self.iter_list(url, key)])
+
+    async def find_by_name(self, url: str, key: str, display_name: str) -> Optional[Dict]:
+        """The resource with display_name, listing only as many pages as needed to find it."""
+        async for item in self.iter_list(url, key):
+            if item["displayName"] == display_name:
+                return item
+        return None
+
+    async def load_index(self, refresh: bool = False):
+        """
+        Load the agent-wide index of flows, intents and webhooks, listing them
+        concurrently (only flows and webhooks when the resource cache has a saved index).
+        """
+        async with self._async_lock('index', self.agent_id):
+            if self._index_loaded and not refresh:
+                return
+            saved = None if refresh or self.sync else self._saved_index()
+            listings = self._index_listings()
+            if saved:
+                listings = {kind: listings[kind] for kind in REVALIDATED_KINDS}
+
+            async def list_all(url, key, params):
+                return [item async for item in self.iter_list(url, key, params)]
+
+            results = await self._gather([list_all(*args) for args in listings.values()])
+            self._apply_index(dict(zip(listings, results)), saved, self._saved_ledger() if saved else None)
+            self._index_loaded = True
+            self._log_index(saved)
+
+    async def page_index(self, flow_url: str) -> Dict[str, str]:
+        """Display name -> resource name for a flow's pages, listed at most once per flow."""
+        flow_resource = self._flow_resource(flow_url)
+        async with self._async_lock('page_index', flow_resource):
+            if flow_resource not in self.cache['pages']:
+                items = [item async for item in self.iter_list(f"{flow_url}/pages", "pages")]
+                self._record_remote('pages', items)
+                self.cache['pages'][flow_resource] = {item["displayName"]: item["name"] for item in items}
+            return self.cache['pages'][flow_resource]
+
+    async def _create(self, kind: str, url: str, body: Dict) -> str:
+        """POST a new resource; after an UncertainWrite, looks it up before sending it again."""
+        failures = 1
+        while True:
+            try:
+                name = (await self._api_request('POST', url, json=body))["name"]
+                break
+            except UncertainWrite as e:
+                name = await self._find_name(url, kind, body["displayName"])
+                if name is not None:
+                    logger.info(f"{kind} '{body['displayName']}' was created despite the error")
+                    break
+                policy = self.retry_policies['create']
+                if failures >= policy.max_attempts or not self.retry_budget.withdraw():
+                    raise
+                failures += 1
+                logger.warning(f"Creating {kind} '{body['displayName']}' again: {e}")
+                await asyncio.sleep(policy.backoff(failures - 1))
+        self._record_remote(kind, [dict(body, name=name)])
+        for field in MANAGED_FIELDS.get(kind, ()):
+            self._remember(name, field, canonical(body.get(field)))
+        self._count('created')
+        return name
+
+    async def _patch_field(self, resource: str, field: str, value) -> bool:
+        """PATCH one field with an update mask unless the write would change nothing; True if sent."""
+        value_key = canonical(value)
+        if self._unchanged(resource, field, value_key):
+            self._count('unchanged')
+            return False
+        await self._api_request('PATCH', f"{self.api_prefix}/{resource}",
+                                params={"updateMask": field}, json={field: value})
+        self._remember(resource, field, value_key)
+        self._count('updated')
+        return True
+
+    async def prune_pages(self, flow_url: str, keep: Iterable[str]) -> int:
+        """Delete the flow's pages whose display names are not in keep; returns how many were deleted."""
+        pages_index = await self.page_index(flow_url)
+        keep = set(keep)
+        stale = [(display_name, name) for display_name, name in pages_index.items()
+                 if display_name not in keep]
+
+        async def delete(display_name, page_name):
+            try:
+                await self._api_request('DELETE', f"{self.api_prefix}/{page_name}", params={"force": "true"})
+            except aiohttp.ClientResponseError as e:
+                if e.status != 404:
+                    raise
+            pages_index.pop(display_name, None)
+            self._forget(page_name)
+            self._count('deleted')
+            logger.info(f"Deleted page no longer in the sheet: {display_name}")
+
+        await self._gather([delete(*page) for page in stale])
+        return len(stale)
+
+    async def _find_name(self, url: str, key: str, display_name: str) -> Optional[str]:
+        """Resource name for display_name, looked up on the server."""
+        return (await self.find_by_name(url, key, display_name) or {}).get("name")
+
+    async def _upsert(self, kind: str, display_name: str, known: Optional[str],
+                      patch: Callable[[str], Awaitable[Any]], create: Callable[[], Awaitable[str]],
+                      find: Callable[[], Awaitable[Optional[str]]]) -> str:
+        """DialogflowUploader._upsert for coroutines: recovers from stale index entries (404, 409)."""
+        if known:
+            try:
+                await patch(known)
+                return known
+            except aiohttp.ClientResponseError as e:
+                if e.status != 404:
+                    raise
+                logger.info(f"Cached {kind} '{display_name}' no longer exists, creating it again")
+                self._forget(known)
+        try:
+            return await create()
+        except aiohttp.ClientResponseError as e:
+            if e.status != 409:
+                raise
+            known = await find()
+            if not known:
+                raise
+            logger.info(f"{kind.capitalize()} '{display_name}' already exists as {known}, updating it")
+            await patch(known)
+            return known
+
+    async def upsert_flow(self, display_name: str) -> str:
+        """Create or update a flow."""
+        await self.load_index()
+
+        async def create():
+            flow_resource = await self._create('flows', f"{self.base_url}/flows", {"displayName": display_name})
+            # A new flow has no pages to list
+            self.cache['pages'][flow_resource] = {}
+            self._checkpoint('flow', flow_resource, key=display_name)
+            return flow_resource
+
+        return await self._cached_async('flows', display_name, create)
+
+    async def upsert_webhook(self, display_name: str, uri: str, headers_map: Optional[Dict] = None) -> str:
+        """Create a webhook unless the agent already has one with this name."""
+        await self.load_index()
+
+        async def create():
+            payload = {"displayName": display_name, "genericWebService": {"uri": uri}}
+            if headers_map:
+                payload["genericWebService"]["requestHeaders"] = headers_map
+            webhook_name = await self._create('webhooks', f"{self.base_url}/webhooks", payload)
+            self._checkpoint('webhook', webhook_name, key=display_name)
+            return webhook_name
+
+        return await self._cached_async('webhooks', display_name, create)
+
+    async def upsert_intent(self, display_name: str, training_phrases: List[str]) -> str:
+        """Create or update an intent."""
+        await self.load_index()
+        body = self._intent_body(display_name, training_phrases)
+
+        # Intents are agent-wide; flows uploading at the same time may share one
+        async with self._async_lock('intents', display_name):
+            intent_name = await self._upsert(
+                "intent", display_name, self.cache['intents'].get(display_name),
+                patch=lambda name: self._patch_field(name, "trainingPhrases", body["trainingPhrases"]),
+                create=lambda: self._create('intents', f"{self.base_url}/intents", body),
+                find=lambda: self._find_name(f"{self.base_url}/intents", "intents", display_name))
+            self.cache['intents'][display_name] = intent_name
+        self._checkpoint('intent', intent_name, key=display_name,
+                         field="trainingPhrases", value=body["trainingPhrases"])
+        return intent_name
+
+    async def upsert_page(self, flow_url: str, display_name: str, prompts: List[str],
+                          chips: List[str], is_end_state: bool = False) -> str:
+        """Create or update a page."""
+        pages_index = await self.page_index(flow_url)
+        body = self._page_body(display_name, prompts, chips)
+
+        page_name = pages_index[display_name] = await self._upsert(
+            "page", display_name, pages_index.get(display_name),
+            patch=lambda name: self._patch_field(name, "entryFulfillment", body["entryFulfillment"]),
+            create=lambda: self._create('pages', f"{flow_url}/pages", body),
+            find=lambda: self._find_name(f"{flow_url}/pages", "pages", display_name))
+        self._checkpoint('page', page_name, key=display_name, parent=self._flow_resource(flow_url),
+                         field="entryFulfillment", value=body["entryFulfillment"])
+        return page_name
+
+    async def patch_page_routes(self, page_resource: str, transition_routes: List[Dict]) -> bool:
+        """Replace a page's transition routes; False if they were unchanged and not sent."""
+        sent = await self._patch_field(page_resource, "transitionRoutes", transition_routes)
+        self._checkpoint('routes', page_resource, field="transitionRoutes", value=transition_routes)
+        return sent
+
+    async def patch_flow_start_route(self, flow_url: str, first_page_name: str):
+        """Set the flow's start route to the first page."""
+        page_name = (await self.page_index(flow_url)).get(first_page_name)
+        if not page_name:
+            raise RuntimeError(f"First page '{first_page_name}' not found in flow.")
+
+        routes = [{"condition": "true", "targetPage": page_name}]
+        flow_resource = self._flow_resource(flow_url)
+        await self._patch_field(flow_resource, "transitionRoutes", routes)
+        self._checkpoint('start_route', flow_resource, field="transitionRoutes", value=routes)
+
+    def _flow_operations(self, flow: Flow, flow_url: str) -> List[Awaitable]:
+        """
+        The flow's upload after the flow itself exists, as tasks that wait
+        only for what they need (as in DialogflowUploader._flow_operations):
+        a page's route patch starts once the page, its target pages, its
+        intents and the webhook are done. Pruning still comes after all of them.
+        """
+        end_pages = flow.end_pages
+        page_name_to_id = {}
+        intent_name_to_id = {}
+
+        async def dispatcher():
+            if not self._needs_dispatcher(flow):
+                logger.info("No webhooks needed for this flow")
+                return None
+            name = await self.upsert_webhook("Dispatcher", self.dispatcher_url, self._dispatcher_headers_map())
+            logger.info(f"Webhook configured: Dispatcher -> {self.dispatcher_url}")
+            return name
+
+        async def upsert_page(page, info):
+            page_name_to_id[page] = await self.upsert_page(flow_url, page, info.prompts.to_list(),
+                                                           info.chips.to_list(), page in end_pages)
+
+        async def upsert_intent(name, training_phrases):
+            intent_name_to_id[name] = await self.upsert_intent(name, training_phrases)
+
+        webhook = asyncio.ensure_future(dispatcher())
+        pages = {page: asyncio.ensure_future(upsert_page(page, info)) for page, info in flow.pages.items()}
+        intents = {}
+        for name, info in flow.intents.items():
+            training_phrases = self.shared_phrases.get(name) or info.training_phrases.to_list()
+            intents[name] = asyncio.ensure_future(upsert_intent(name, training_phrases))
+
+        async def patch_routes(page, routes):
+            await asyncio.gather(pages[page], *(pages[r.next_page] for r in routes if r.next_page in pages),
+                                 *(intents[r.intent] for r in routes if r.intent in intents))
+            dispatcher_name = await webhook if any(r.webhook_action for r in routes) else None
+            transition_routes = self._transition_routes(routes, page_name_to_id, intent_name_to_id, dispatcher_name)
+            if not transition_routes:
+                logger.info(f"Page '{page}' is an end state (no outgoing routes)")
+            elif await self.patch_page_routes(page_name_to_id[page], transition_routes):
+                logger.info(f"Updated {len(transition_routes)} routes for page: {page}")
+
+        async def set_start_route():
+            if flow.first_page in pages:
+                await pages[flow.first_page]
+            await self.patch_flow_start_route(flow_url, flow.first_page)
+            logger.info(f"Set flow start route to: {flow.first_page}")
+
+        operations = [webhook, *pages.values(), *intents.values()]
+        for page, routes in self._routes_by_page(flow).items():
+            if page not in pages:
+                logger.warning(f"Page '{page}' not found in created pages, skipping routes")
+                continue
+            operations.append(patch_routes(page, routes))
+        if flow.first_page:
+            operations.append(set_start_route())
+        return operations
+
+    async def upload_single_flow(self, json_path, flow_name: Optional[str] = None) -> Tuple[bool, str]:
+        """Upload a single flow from a JSON file path or an already built Flow."""
+        try:
+            digest = self._file_digest(json_path)
+            flow, flow_name, json_path = self._load_flow(json_path, flow_name)
+            if self._already_uploaded(flow_name, digest):
+                logger.info(f"✓ Flow '{flow_name}' was uploaded before the interruption, skipping")
+                return True, flow_name
+            logger.info(f"Uploading flow '{flow_name}' from {json_path}")
+
+            # Two files mapping to the same flow must not upload its pages concurrently
+            async with self._async_lock('flow_uploads', flow_name):
+                # Validate the transition graph before spending any API calls
+                self._validate_flow(flow)
+
+                flow_resource = await self.upsert_flow(flow_name)
+                flow_url = f"{self.api_prefix}/{flow_resource}"
+
+                await self._gather(self._flow_operations(flow, flow_url))
+
+                if self.prune:
+                    await self.prune_pages(flow_url, flow.pages)
+                self._checkpoint('flow_done', flow_resource, key=flow_name, digest=digest)
+
+            logger.info(f"✓ Successfully uploaded flow '{flow_name}'")
+            return True, flow_name
+
+        except Exception as e:
+            logger.error(f"✗ Failed to upload {json_path}: {e}")
+            return False, str(e)
+
+    async def upload_many(self, json_files: Iterable, max_workers: Optional[int] = None
+                          ) -> AsyncIterator[Tuple[str, bool, str]]:
+        """
+        Upload flows concurrently, up to max_workers (default: the uploader's
+        max_workers) at a time. Yields (json_file, success, flow name or error)
+        as each upload finishes.
+        """
+        json_files = list(json_files)
+        self.merge_shared_intents(json_files)
+        if json_files:
+            await self.load_index()
+        flow_slots = asyncio.Semaphore(max(1, max_workers or self.max_workers))
+
+        async def upload(json_file):
+            async with flow_slots:
+                return (json_file, *await self.upload_single_flow(str(json_file)))
+
+        # Start the tasks in input order; as_completed alone would start them in set order
+        tasks = [asyncio.ensure_future(upload(f)) for f in json_files]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def upload_bulk(self, json_dir: str, max_workers: Optional[int] = None
+                          ) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """Upload multiple flows from a directory of JSON files, max_workers at a time."""
+        json_files = self._find_flow_files(json_dir)
+        successes = []
+        failures = []
+        async for json_file, success, result in self.upload_many(json_files, max_workers):
+            if success:
+                successes.append(result)
+            else:
+                failures.append((Path(json_file).name, result))
+
+        if json_files:
+            self._log_bulk_summary(len(json_files), successes, failures)
+            self._log_write_counts()
+        return successes, failures
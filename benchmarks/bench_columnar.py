@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark the columnar conversion engine against the row engine.
+
+Generates a synthetic sheet, converts it with both engines, checks that the
+JSON output is byte-identical and prints the timings.
+
+    python benchmarks/bench_columnar.py --rows 50000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_to_dialogflow_json import convert_single_csv
+from synthetic import generate_sheet
+
+def time_engine(csv_path, output_path, engine):
+    """Convert once with the given engine and return the elapsed seconds."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        convert_single_csv(csv_path, output_path, engine=engine)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the columnar and row conversion engines")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows in the synthetic sheet")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine (best time is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = str(Path(tmp) / "sheet.csv")
+        generate_sheet(csv_path, args.rows)
+
+        timings = {}
+        outputs = {}
+        for engine in ("rows", "columnar"):
+            outputs[engine] = str(Path(tmp) / f"{engine}.json")
+            timings[engine] = min(time_engine(csv_path, outputs[engine], engine) for _ in range(args.repeat))
+
+        identical = Path(outputs["rows"]).read_bytes() == Path(outputs["columnar"]).read_bytes()
+
+    print(f"Rows: {args.rows}")
+    print(f"  rows engine:     {timings['rows']:.3f}s")
+    print(f"  columnar engine: {timings['columnar']:.3f}s")
+    print(f"  speedup:         {timings['rows'] / timings['columnar']:.1f}x")
+    print(f"  identical output: {identical}")
+    sys.exit(0 if identical else 1)
+
+if __name__ == "__main__":
+    main()
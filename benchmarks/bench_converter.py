@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Converter scaling benchmark.
+
+For each sheet size, generates a synthetic sheet and converts it with each
+engine, recording the read, parse, assemble, end-state and serialize phase
+times from ConversionStats and peak memory. Every conversion runs in a fresh
+interpreter so the peak RSS belongs to that run alone. Results are written
+as JSON.
+
+    python benchmarks/bench_converter.py --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+def run_phases(csv_path, engine, output_path):
+    """Convert csv_path with engine, returning per-phase wall times in seconds."""
+    from conversion_stats import ConversionStats
+    from csv_to_dialogflow_json import convert_single_csv
+    from flow_model import Flow
+
+    stats = ConversionStats()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        convert_single_csv(csv_path, output_path, engine=engine, stats=stats)
+
+    timings = {phase: round(seconds, 4) for phase, seconds in stats.phases.items()}
+    timings["total"] = round(sum(stats.phases.values()), 4)
+    peak_rss_mb = _peak_rss_mb()  # Before loading the output back for the counts
+    flow = Flow.load(output_path)
+    return {
+        "phases": timings,
+        "counters": stats.counters,
+        "peak_rss_mb": peak_rss_mb,
+        "pages": len(flow.pages),
+        "intents": len(flow.intents),
+        "routes": len(flow.routes),
+    }
+
+def run_isolated(csv_path, engine, output_path):
+    """Run one conversion in a fresh interpreter and return its result dict."""
+    proc = subprocess.run(
+        [sys.executable, __file__, "--worker", csv_path, "--engine", engine, "--output", output_path],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{engine} conversion of {csv_path} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark converter phases at several sheet sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Row counts to benchmark")
+    parser.add_argument("--engines", nargs="+", default=["columnar", "stream"],
+                        help="Engines to benchmark (columnar, rows, stream)")
+    parser.add_argument("--chip-fanout", type=int, default=3)
+    parser.add_argument("--empty-density", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--worker", metavar="CSV", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_phases(args.worker, args.engine, args.output)))
+        return
+
+    from synthetic import generate_sheet
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            csv_path = str(Path(tmp) / f"sheet_{rows}.csv")
+            start = time.perf_counter()
+            generate_sheet(csv_path, rows, chip_fanout=args.chip_fanout,
+                           empty_density=args.empty_density, seed=args.seed)
+            print(f"{rows} rows: generated in {time.perf_counter() - start:.1f}s "
+                  f"({os.path.getsize(csv_path) / (1 << 20):.1f} MB)")
+
+            for engine in args.engines:
+                result = run_isolated(csv_path, engine, str(Path(tmp) / f"out_{rows}_{engine}.json"))
+                result.update({"rows": rows, "engine": engine})
+                results.append(result)
+                phases = result["phases"]
+                print(f"  {engine:<9} total {phases['total']:8.2f}s  "
+                      f"(read {phases['read']:.2f}, parse {phases['parse']:.2f}, "
+                      f"assemble {phases['assemble']:.2f}, end states {phases['end_states']:.2f}, "
+                      f"serialize {phases['serialize']:.2f})  peak {result['peak_rss_mb']} MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
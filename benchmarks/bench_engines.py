@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+End-to-end comparison of the threaded and asyncio upload engines.
+
+Converts a few synthetic sheets, uploads them with each engine to a fresh
+local stand-in server (benchmarks/fake_dialogflow.py), checks that both
+leave the agent in the same state (resource ids aside) and prints timings.
+
+    python benchmarks/bench_engines.py --flows 8 --rows 500 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_uploader import AsyncDialogflowUploader
+from bench_uploader import BenchUploader
+from csv_to_dialogflow_json import convert_single_csv
+from fake_dialogflow import FakeDialogflowServer
+from synthetic import generate_sheet
+from upload_to_dialogflow import logger
+
+class BenchAsyncUploader(AsyncDialogflowUploader):
+    """Async uploader with a fixed token, since the stand-in server does not check credentials."""
+
+    _auth_headers = BenchUploader._auth_headers
+
+    async def _request_headers(self):
+        return self._auth_headers()
+
+UPLOADER_ARGS = ("benchmark.json", "bench-project", "us-central1", "bench-agent",
+                 "https://dispatcher.invalid/hook")
+
+def normalized_state(server):
+    """Server resources keyed by display-name path, with resource ids replaced the same way."""
+    paths = {}
+    for name in sorted(server.resources, key=lambda n: n.count("/")):
+        parent, _, _ = name.rpartition("/")
+        parent = parent.rpartition("/")[0]
+        prefix = paths.get(parent, "")
+        paths[name] = f"{prefix}/{server.resources[name].get('displayName')}"
+
+    def rename(value):
+        if isinstance(value, dict):
+            return {k: rename(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [rename(v) for v in value]
+        return paths.get(value, value)
+
+    return {paths[name]: rename(resource) for name, resource in server.resources.items()}
+
+def run_threaded(endpoint, json_dir, args):
+    with BenchUploader(*UPLOADER_ARGS, api_endpoint=endpoint, max_workers=args.workers,
+                       rate_limit=args.rate_limit) as uploader:
+        return uploader.upload_bulk(json_dir)
+
+def run_async(endpoint, json_dir, args):
+    async def upload():
+        async with BenchAsyncUploader(*UPLOADER_ARGS, api_endpoint=endpoint, max_workers=args.workers,
+                                      rate_limit=args.rate_limit,
+                                      max_connections=args.connections) as uploader:
+            return await uploader.upload_bulk(json_dir)
+    return asyncio.run(upload())
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the threaded and asyncio upload engines")
+    parser.add_argument("--flows", type=int, default=6, help="Flows to upload")
+    parser.add_argument("--rows", type=int, default=300, help="Rows per synthetic sheet")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Simulated server time per request")
+    parser.add_argument("--workers", type=int, default=3, help="Flows uploaded at once")
+    parser.add_argument("--connections", type=int, default=20, help="Requests in flight (async engine)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Requests per second, 0 for none")
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.flows):
+            csv_path = str(Path(tmp) / f"sheet{i}.csv")
+            generate_sheet(csv_path, args.rows, pages=max(2, args.rows // 10), seed=i)
+            with contextlib.redirect_stdout(io.StringIO()):
+                convert_single_csv(csv_path, str(Path(tmp) / f"dialogflow_sheet{i}.json"))
+
+        for engine, run in (("threaded", run_threaded), ("async", run_async)):
+            server = FakeDialogflowServer(latency_ms=args.latency_ms).start()
+            try:
+                start = time.perf_counter()
+                successes, failures = run(server.endpoint, tmp, args)
+                elapsed = time.perf_counter() - start
+                results[engine] = (elapsed, len(successes), failures, sum(server.requests.values()),
+                                   normalized_state(server))
+            finally:
+                server.stop()
+
+    print(f"Flows: {args.flows} x {args.rows} rows, simulated latency {args.latency_ms:g} ms/request")
+    for engine, (elapsed, ok, failures, calls, _) in results.items():
+        print(f"  {engine:<9} {elapsed:7.2f}s  {ok}/{args.flows} flows  {calls} requests")
+        for name, error in failures:
+            print(f"    failed {name}: {error}")
+    identical = results["threaded"][4] == results["async"][4]
+    print(f"  identical agent state: {identical}")
+    sys.exit(0 if identical and not any(r[2] for r in results.values()) else 1)
+
+if __name__ == "__main__":
+    main()
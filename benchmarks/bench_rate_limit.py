@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Fixed and adaptive request rates against an API quota.
+
+Uploads the same synthetic flows to benchmarks/fake_dialogflow.py while it
+enforces --quota requests per second (429 with Retry-After beyond that):
+with a fixed rate well below the quota, a fixed rate above it, and the
+adaptive limiter starting from the low rate. Prints the time, the requests
+sent, the 429s received and the rate each limiter ended at.
+
+    python benchmarks/bench_rate_limit.py --quota 40 --flows 4
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_engines import UPLOADER_ARGS
+from bench_uploader import BenchUploader
+from csv_to_dialogflow_json import convert_single_csv
+from fake_dialogflow import FakeDialogflowServer
+from rate_limiter import AdaptiveRateLimiter, RateLimiter
+from synthetic import generate_sheet
+from upload_to_dialogflow import logger
+
+def run(json_dir, limiter, args):
+    """Upload json_dir under limiter to a fresh quota-enforcing server."""
+    server = FakeDialogflowServer(latency_ms=args.latency_ms, quota_rps=args.quota).start()
+    try:
+        with BenchUploader(*UPLOADER_ARGS, api_endpoint=server.endpoint, max_workers=args.flows,
+                           rate_limiter=limiter) as uploader:
+            start = time.perf_counter()
+            successes, failures = uploader.upload_bulk(json_dir)
+            elapsed = time.perf_counter() - start
+        return elapsed, len(successes), sum(server.requests.values()), server.throttled
+    finally:
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed and adaptive request rates under a quota")
+    parser.add_argument("--quota", type=float, default=40, help="Requests per second the server allows")
+    parser.add_argument("--flows", type=int, default=4, help="Flows to upload (all at once)")
+    parser.add_argument("--rows", type=int, default=200, help="Rows per synthetic sheet")
+    parser.add_argument("--latency-ms", type=float, default=10, help="Simulated server time per request")
+    args = parser.parse_args()
+
+    logger.setLevel("ERROR")
+    low, high = args.quota / 4, args.quota * 2
+    limiters = {
+        f"fixed {low:g}/s": RateLimiter(low),
+        f"fixed {high:g}/s": RateLimiter(high),
+        f"adaptive from {low:g}/s": AdaptiveRateLimiter(low),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.flows):
+            csv_path = str(Path(tmp) / f"sheet{i}.csv")
+            generate_sheet(csv_path, args.rows, pages=max(2, args.rows // 10), seed=i)
+            with contextlib.redirect_stdout(io.StringIO()):
+                convert_single_csv(csv_path, str(Path(tmp) / f"dialogflow_sheet{i}.json"))
+        results = {name: run(tmp, limiter, args) for name, limiter in limiters.items()}
+
+    print(f"Quota: {args.quota:g} requests/s, {args.flows} flows x {args.rows} rows")
+    for name, (elapsed, ok, calls, throttled) in results.items():
+        print(f"  {name:<20} {elapsed:7.2f}s  {ok}/{args.flows} flows  {calls} requests  "
+              f"{throttled} x 429  ({calls / elapsed:.1f} req/s, final rate {limiters[name].rate:.1f}/s)")
+
+if __name__ == "__main__":
+    main()
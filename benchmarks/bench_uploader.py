@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Uploader connection benchmark against a local stand-in server.
+
+Uploads a synthetic flow to benchmarks/fake_dialogflow.py twice: once with
+the uploader's pooled keep-alive session, and once opening a new connection
+per call the way module-level requests.request() does. The server delays
+every new connection by --handshake-ms to stand in for the TCP + TLS
+handshake with the real endpoint.
+
+    python benchmarks/bench_uploader.py --rows 2000 --handshake-ms 30
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_to_dialogflow_json import convert_single_csv
+from fake_dialogflow import FakeDialogflowServer
+from synthetic import generate_sheet
+from upload_to_dialogflow import DialogflowUploader, logger
+
+class BenchUploader(DialogflowUploader):
+    """Uploader with a fixed token, since the stand-in server does not check credentials."""
+
+    def _auth_headers(self):
+        return {"Authorization": "Bearer benchmark", "Content-Type": "application/json"}
+
+class SessionPerCall:
+    """Session stand-in that sends each request on a new connection, like requests.request()."""
+
+    def __init__(self, headers):
+        self.headers = headers
+
+    def request(self, method, url, headers=None, **kwargs):
+        return requests.request(method, url, headers=headers or self.headers, **kwargs)
+
+    def close(self):
+        pass
+
+def make_uploader(endpoint, pooled):
+    uploader = BenchUploader("benchmark.json", "bench-project", "us-central1", "bench-agent",
+                             "https://dispatcher.invalid/hook", api_endpoint=endpoint, rate_limit=0)
+    if not pooled:
+        uploader.session.close()
+        uploader.session = SessionPerCall(uploader.headers)
+    return uploader
+
+def time_upload(json_path, handshake_ms, latency_ms, pooled):
+    """Upload json_path to a fresh server; return (seconds, requests made, connections opened)."""
+    server = FakeDialogflowServer(handshake_ms=handshake_ms, latency_ms=latency_ms).start()
+    try:
+        with make_uploader(server.endpoint, pooled) as uploader:
+            start = time.perf_counter()
+            ok, result = uploader.upload_single_flow(json_path, "Benchmark")
+            elapsed = time.perf_counter() - start
+        if not ok:
+            raise RuntimeError(f"Upload failed: {result}")
+        return elapsed, sum(server.requests.values()), server.connections
+    finally:
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pooled and per-call connections for uploads")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows in the synthetic sheet")
+    parser.add_argument("--handshake-ms", type=float, default=30, help="Simulated handshake per new connection")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated server time per request")
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = str(Path(tmp) / "sheet.csv")
+        json_path = str(Path(tmp) / "dialogflow_bench.json")
+        generate_sheet(csv_path, args.rows, pages=max(2, args.rows // 20))
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert_single_csv(csv_path, json_path)
+
+        results = {mode: time_upload(json_path, args.handshake_ms, args.latency_ms, mode == "pooled")
+                   for mode in ("per-call", "pooled")}
+
+    print(f"Rows: {args.rows}, simulated handshake: {args.handshake_ms:g} ms")
+    for mode, (seconds, calls, connections) in results.items():
+        print(f"  {mode:<9} {seconds:7.2f}s  {calls} requests over {connections} connection(s)  "
+              f"({seconds / calls * 1000:.2f} ms/request)")
+    print(f"  speedup:  {results['per-call'][0] / results['pooled'][0]:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Local stand-in for the Dialogflow CX v3 REST API, for uploader benchmarks.
+
+Implements the calls the uploader makes against an in-memory store: list
+(paginated with pageSize/pageToken), get, create, patch and delete of flows,
+pages, intents and webhooks, getting the agent, and agents:restore and
+flows:import of export packages (agent_bundle.py) as long-running
+operations. Connections
+are kept alive (HTTP/1.1), and a per-connection delay can stand in for the
+TCP + TLS handshake of the real endpoint, so connection reuse shows up in
+timings. A request quota can be enforced, answering 429 with Retry-After
+once it is used up, like a project's per-minute quota. A fraction of
+requests can fail with 500 after they were applied, like a response lost
+on the way back, to exercise the uploader's retry policies.
+
+    python benchmarks/fake_dialogflow.py --port 8080 --handshake-ms 30 --quota-rps 20 --error-rate 0.05
+"""
+
+import argparse
+import base64
+import io
+import itertools
+import json
+import random
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_VERSION = "v3"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+COLLECTIONS = {"flows", "pages", "intents", "webhooks"}
+
+class FakeDialogflowServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the fake agent state and request counters."""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), handshake_ms=0, latency_ms=0, quota_rps=0, retry_after=1,
+                 error_rate=0, seed=None):
+        super().__init__(address, FakeDialogflowHandler)
+        self.handshake = handshake_ms / 1000
+        self.latency = latency_ms / 1000
+        self.quota = quota_rps
+        self.retry_after = retry_after
+        self.allowance = float(quota_rps)  # Requests left in the current second's quota
+        self.allowance_updated = time.monotonic()
+        self.throttled = 0
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.error_lock = threading.Lock()  # Separate: responses are sent while holding self.lock
+        self.failed = 0  # Requests applied but answered with 500
+        self.resources = {}  # resource name -> resource dict
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.connections = 0
+        self.requests = {}  # method -> count
+        self.operations = {}  # operation name -> finished operation
+
+    @property
+    def endpoint(self):
+        """Base URL to pass as the uploader's api_endpoint."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a daemon thread; returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, method):
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def over_quota(self):
+        """True if a request now would exceed the quota (and should get a 429)."""
+        if not self.quota:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.quota, self.allowance + (now - self.allowance_updated) * self.quota)
+            self.allowance_updated = now
+            if self.allowance < 1:
+                self.throttled += 1
+                return True
+            self.allowance -= 1
+            return False
+
+    def lose_response(self):
+        """True if this (already applied) request should be answered with a 500."""
+        if not self.error_rate:
+            return False
+        with self.error_lock:
+            if self.random.random() < self.error_rate:
+                self.failed += 1
+                return True
+            return False
+
+    def children(self, parent, collection):
+        """Resources directly under parent/collection, in creation order."""
+        prefix = f"{parent}/{collection}/"
+        return [r for name, r in self.resources.items()
+                if name.startswith(prefix) and "/" not in name[len(prefix):]]
+
+    def restore(self, agent, content):
+        """
+        Replace the agent's resources with those of a JSON package export,
+        resolving display-name references to resource names. Returns the
+        finished operation.
+        """
+        operation = {"name": f"{agent.rsplit('/agents/', 1)[0]}/operations/{next(self.ids):08d}", "done": True}
+        try:
+            with zipfile.ZipFile(io.BytesIO(base64.b64decode(content))) as archive:
+                files = {path: json.loads(archive.read(path)) for path in archive.namelist()}
+            resources = self._restored(agent, files)
+        except (KeyError, ValueError, zipfile.BadZipFile) as e:
+            operation["error"] = {"code": 3, "message": f"Invalid agent content: {e}"}
+        else:
+            for name in [n for n in self.resources if n.startswith(agent + "/")]:
+                del self.resources[name]
+            self.resources.update(resources)
+            operation["response"] = {}
+        self.operations[operation["name"]] = operation
+        return operation
+
+    def import_flow(self, agent, content):
+        """
+        Add the flow of a flow package to the agent. Intents and webhooks
+        take the place of the agent's ones of the same display name; a flow
+        whose display name is taken fails. Returns the finished operation.
+        """
+        operation = {"name": f"{agent.rsplit('/agents/', 1)[0]}/operations/{next(self.ids):08d}", "done": True}
+        try:
+            with zipfile.ZipFile(io.BytesIO(base64.b64decode(content))) as archive:
+                files = {path: json.loads(archive.read(path)) for path in archive.namelist()}
+            resources = self._restored(agent, files)
+        except (KeyError, ValueError, zipfile.BadZipFile) as e:
+            operation["error"] = {"code": 3, "message": f"Invalid flow content: {e}"}
+            self.operations[operation["name"]] = operation
+            return operation
+        flows = [name for name in resources if name.startswith(f"{agent}/flows/") and name.count("/") == 7]
+        taken = {r.get("displayName") for r in self.children(agent, "flows")}
+        if len(flows) != 1 or resources[flows[0]].get("displayName") in taken:
+            operation["error"] = {"code": 6, "message": "Flow content must hold one flow not in the agent"}
+        else:
+            existing = {(collection, r.get("displayName")): r["name"]
+                        for collection in ("intents", "webhooks") for r in self.children(agent, collection)}
+            renamed = {}
+            for name in list(resources):
+                collection = name[len(agent) + 1:].split("/")[0]
+                key = (collection, resources[name].get("displayName"))
+                if collection != "flows" and key in existing:
+                    renamed[name] = existing[key]
+                    self.resources[existing[key]] = dict(resources.pop(name), name=existing[key])
+
+            def rename(value):
+                if isinstance(value, dict):
+                    return {k: rename(v) for k, v in value.items()}
+                if isinstance(value, list):
+                    return [rename(v) for v in value]
+                return renamed.get(value, value)
+
+            self.resources.update({name: rename(resource) for name, resource in resources.items()})
+            operation["response"] = {"flow": flows[0]}
+        self.operations[operation["name"]] = operation
+        return operation
+
+    def _restored(self, agent, files):
+        """Resources described by the package files; raises KeyError on a dangling reference."""
+        resources, names = {}, {"flows": {}, "intents": {}, "webhooks": {}}
+        pages = {}  # flow directory -> page display name -> resource name
+
+        def create(parent, collection, doc):
+            body = {k: v for k, v in doc.items() if k not in ("name", "numTrainingPhrases")}
+            name = f"{parent}/{collection}/{next(self.ids):08d}"
+            resources[name] = dict(body, name=name)
+            return name
+
+        for path in sorted(files):
+            parts = path.split("/")
+            doc = files[path]
+            if len(parts) == 3 and parts[0] in names and parts[2] == parts[1] + ".json":
+                names[parts[0]][doc["displayName"]] = create(agent, parts[0], doc)
+                if parts[0] == "flows":
+                    pages[parts[1]] = {}
+            elif parts[0] == "webhooks" and len(parts) == 2:
+                names["webhooks"][doc["displayName"]] = create(agent, "webhooks", doc)
+        for path in sorted(files):
+            parts = path.split("/")
+            doc = files[path]
+            if parts[0] == "flows" and parts[2:3] == ["pages"]:
+                flow = names["flows"][files[f"flows/{parts[1]}/{parts[1]}.json"]["displayName"]]
+                pages[parts[1]][doc["displayName"]] = create(flow, "pages", doc)
+            elif parts[0] == "intents" and parts[2:3] == ["trainingPhrases"]:
+                intent = names["intents"][files[f"intents/{parts[1]}/{parts[1]}.json"]["displayName"]]
+                resources[intent].setdefault("trainingPhrases", []).extend(doc["trainingPhrases"])
+
+        def resolve(routes, flow_dir):
+            for route in routes:
+                if "intent" in route:
+                    route["intent"] = names["intents"][route["intent"]]
+                if "targetPage" in route:
+                    route["targetPage"] = pages[flow_dir][route["targetPage"]]
+                fulfillment = route.get("triggerFulfillment", {})
+                if "webhook" in fulfillment:
+                    fulfillment["webhook"] = names["webhooks"][fulfillment["webhook"]]
+
+        for flow_dir, flow_pages in pages.items():
+            flow = names["flows"][files[f"flows/{flow_dir}/{flow_dir}.json"]["displayName"]]
+            resolve(resources[flow].get("transitionRoutes", []), flow_dir)
+            for page in flow_pages.values():
+                resolve(resources[page].get("transitionRoutes", []), flow_dir)
+        return resources
+
+class FakeDialogflowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        if self.server.handshake:
+            time.sleep(self.server.handshake)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        if status < 400 and self.server.lose_response():
+            status, body = 500, {"error": {"code": 500, "message": "Internal error"}}
+        data = json.dumps(body if body is not None else {}).encode()
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message, headers=None):
+        self._send(status, {"error": {"code": status, "message": message}}, headers)
+
+    def _route(self):
+        """Split the request into (resource path, query dict, JSON body)."""
+        parts = urlsplit(self.path)
+        path = parts.path.lstrip("/")
+        prefix = f"{API_VERSION}/"
+        if not path.startswith(prefix):
+            return None, {}, None
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        return path[len(prefix):], query, body
+
+    def _handle(self, method):
+        path, query, body = self._route()
+        self.server.count(method)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if path is None:
+            return self._error(404, "Unknown API version")
+        if "Bearer" not in (self.headers.get("Authorization") or ""):
+            return self._error(401, "Missing credentials")
+        if self.server.over_quota():
+            return self._error(429, "Quota exceeded", {"Retry-After": str(self.server.retry_after)})
+        parent, _, last = path.rpartition("/")
+        is_collection = last in COLLECTIONS
+        server = self.server
+
+        with server.lock:
+            if method == "POST" and last.endswith(":restore"):
+                operation = server.restore(f"{parent}/{last[:-len(':restore')]}", body["agentContent"])
+                return self._send(200, {"name": operation["name"]})  # Finished by the first poll
+            if method == "POST" and path.endswith("/flows:import"):
+                operation = server.import_flow(parent, body["flowContent"])
+                return self._send(200, {"name": operation["name"]})
+            if method == "GET" and path in server.operations:
+                return self._send(200, server.operations[path])
+            if method == "GET" and parent.endswith("/agents") and path not in server.resources:
+                return self._send(200, {"name": path, "displayName": last, "defaultLanguageCode": "en",
+                                        "timeZone": "America/New_York"})
+            if method == "GET" and is_collection:
+                items = server.children(parent, last)
+                size = min(int(query.get("pageSize", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+                start = int(query.get("pageToken") or 0)
+                page = {last: items[start:start + size]}
+                if start + size < len(items):
+                    page["nextPageToken"] = str(start + size)
+                return self._send(200, page)
+            if method == "POST" and is_collection:
+                names = {r.get("displayName") for r in server.children(parent, last)}
+                if body.get("displayName") in names:
+                    return self._error(409, f"Resource '{body.get('displayName')}' already exists")
+                name = f"{parent}/{last}/{next(server.ids):08d}"
+                server.resources[name] = dict(body, name=name)
+                return self._send(200, server.resources[name])
+            if is_collection:
+                return self._error(405, "Method not allowed")
+
+            resource = server.resources.get(path)
+            if resource is None:
+                return self._error(404, f"Resource '{path}' not found")
+            if method == "GET":
+                return self._send(200, resource)
+            if method == "PATCH":
+                mask = query.get("updateMask")
+                fields = mask.split(",") if mask else list(body)
+                for field in fields:
+                    if field in body:
+                        resource[field] = body[field]
+                return self._send(200, resource)
+            if method == "DELETE":
+                prefix = path + "/"
+                for name in [n for n in server.resources if n == path or n.startswith(prefix)]:
+                    del server.resources[name]
+                return self._send(200, {})
+        return self._error(405, "Method not allowed")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Dialogflow CX REST API")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--handshake-ms", type=float, default=0, help="Delay per new connection")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay per request")
+    parser.add_argument("--quota-rps", type=float, default=0, help="Requests per second before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered 500 after applying")
+    args = parser.parse_args()
+
+    server = FakeDialogflowServer(("127.0.0.1", args.port), args.handshake_ms, args.latency_ms, args.quota_rps,
+                                  error_rate=args.error_rate)
+    print(f"Serving fake Dialogflow CX API at {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
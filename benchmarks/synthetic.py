@@ -0,0 +1,115 @@
+"""
+Synthetic sheet generator for converter benchmarks.
+
+Produces CSVs shaped like real flow sheets: pages revisited across rows,
+shared Yes/No/Back style menus, slash- and newline-separated transitions,
+parameter sets, webhook actions and empty markers ("—", "__", "N/A", ...).
+
+    python benchmarks/synthetic.py sheet.csv --rows 100000
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_to_dialogflow_json import REQUIRED_COLUMNS
+
+EMPTY_MARKERS = ["", "—", "-", "__", "_", "N/A"]
+
+MENU_CHIPS = [
+    ["Yes", "No"],
+    ["Back", "Main menu"],
+    ["Yes", "No", "Back"],
+    ["Talk to an advisor", "Book an appointment", "Something else"],
+]
+
+WEBHOOK_ACTIONS = [
+    "Fetch upcoming assignments for the student",
+    "Create a study block in the calendar",
+    "Log the session start",
+    "Look up the advisor for the student",
+]
+
+PARAMETER_SETS = ["topic=advising", "urgent=true, channel=chat", "term=fall, year=2025", "flag"]
+
+def generate_sheet(path, rows, pages=None, chip_fanout=3, slash_transitions=0.5,
+                   parameter_density=0.3, webhook_density=0.2, empty_density=0.1,
+                   unique_chip_density=0.2, seed=0):
+    """
+    Write a synthetic flow sheet to path.
+
+    rows               number of data rows
+    pages              distinct page names (default: rows // 10, at least 2)
+    chip_fanout        maximum chips per row (0 disables chips)
+    slash_transitions  share of chip rows whose targets are slash-separated per chip
+    parameter_density  share of rows with a Parameter Set
+    webhook_density    share of rows with a Webhook Action
+    empty_density      share of optional cells filled with an empty marker
+    unique_chip_density share of chip cells with row-specific options instead of a shared menu
+    """
+    rng = random.Random(seed)
+    page_count = pages or max(2, rows // 10)
+    page_names = [f"Page {i}" for i in range(page_count)]
+
+    def optional(value, density):
+        if rng.random() < density:
+            return value
+        return rng.choice(EMPTY_MARKERS) if rng.random() < empty_density else ""
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUIRED_COLUMNS)
+        for i in range(rows):
+            page = page_names[i % page_count] if i < page_count else rng.choice(page_names)
+
+            chips = []
+            if chip_fanout and rng.random() < 0.7:
+                if rng.random() < unique_chip_density:
+                    chips = [f"Option {i}-{n}" for n in range(rng.randint(1, chip_fanout))]
+                else:
+                    chips = rng.choice(MENU_CHIPS)[:chip_fanout]
+
+            if chips and len(chips) > 1 and rng.random() < slash_transitions:
+                transition = "/".join(rng.choice(page_names + ["—"]) for _ in chips)
+            elif rng.random() < 0.1:
+                transition = rng.choice(EMPTY_MARKERS)
+            else:
+                transition = rng.choice(page_names)
+
+            writer.writerow([
+                page,
+                optional(f"intent_{i % 200}", 0.3),
+                optional(rng.choice(["Intent: User says 'help me'", "Intent: User responds with 'yes'",
+                                     "Event: session start"]), 0.6),
+                f"Prompt {i % 500} for {page}",
+                transition,
+                optional(rng.choice(PARAMETER_SETS), parameter_density),
+                optional(rng.choice(WEBHOOK_ACTIONS), webhook_density),
+                "\n".join(f'"{c}"' for c in chips) if chips else optional("", 0),
+            ])
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic flow sheet")
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--pages", type=int, help="Distinct pages (default: rows / 10)")
+    parser.add_argument("--chip-fanout", type=int, default=3)
+    parser.add_argument("--slash-transitions", type=float, default=0.5)
+    parser.add_argument("--parameter-density", type=float, default=0.3)
+    parser.add_argument("--webhook-density", type=float, default=0.2)
+    parser.add_argument("--empty-density", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_sheet(args.output, args.rows, pages=args.pages, chip_fanout=args.chip_fanout,
+                   slash_transitions=args.slash_transitions, parameter_density=args.parameter_density,
+                   webhook_density=args.webhook_density, empty_density=args.empty_density, seed=args.seed)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+if __name__ == "__main__":
+    main()
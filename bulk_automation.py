@@ -4,6 +4,7 @@ Complete Bulk Automation Pipeline for Google Sheets to Dialogflow CX
 This script handles the entire pipeline from CSV conversion to Dialogflow upload.
 """
 
+import asyncio
 import os
 import sys
 import json
@@ -19,8 +20,13 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from csv_to_dialogflow_json import convert_single_csv, convert_bulk
+    from csv_to_dialogflow_json import (
+        iter_conversions, find_sheet_files
+    )
+    from conversion_stats import ConversionStats
     from upload_to_dialogflow import DialogflowUploader
+    from resource_cache import CACHE_NAME
+    from upload_journal import JOURNAL_NAME
 except ImportError:
     print("Error: Required modules not found. Make sure csv_to_dialogflow_json.py and upload_to_dialogflow.py are in the same directory.")
     sys.exit(1)
@@ -50,13 +56,39 @@ class DialogflowAutomation:
         
         # Initialize uploader if credentials provided
         if all(k in config for k in ['service_account', 'project_id', 'agent_id', 'dispatcher_url']):
-            self.uploader = DialogflowUploader(
+            uploader_class = DialogflowUploader
+            extra = {}
+            if config.get('plan'):
+                from upload_plan import PlanningUploader
+                uploader_class = PlanningUploader
+            elif config.get('async_upload') and not config.get('restore'):  # Restores run on the threaded engine
+                from async_uploader import AsyncDialogflowUploader
+                uploader_class = AsyncDialogflowUploader
+                extra['max_connections'] = int(config.get('max_connections', 20))
+            # Plans, restores and conversion-only runs do not upload resource by resource,
+            # so there is nothing to journal (and an earlier run's journal must survive them)
+            journaled = not (config.get('no_journal') or config.get('plan') or config.get('restore')
+                             or config.get('skip_upload'))
+            self.uploader = uploader_class(
                 service_account_file=config['service_account'],
                 project_id=config['project_id'],
                 location=config.get('location', 'us-central1'),
                 agent_id=config['agent_id'],
                 dispatcher_url=config['dispatcher_url'],
-                dispatcher_header=config.get('dispatcher_header')
+                dispatcher_header=config.get('dispatcher_header'),
+                allow_dangling=bool(config.get('allow_dangling')),
+                max_workers=int(config.get('max_workers', 3)),
+                ops_per_flow=int(config.get('ops_per_flow', 8)),
+                api_endpoint=config.get('api_endpoint'),
+                rate_limit=float(config.get('rate_limit', 10.0)),
+                max_rate=float(config['max_rate']) if config.get('max_rate') else None,
+                resource_cache=None if config.get('no_resource_cache') else config.get('resource_cache', CACHE_NAME),
+                sync=bool(config.get('sync')),
+                prune=bool(config.get('prune')),
+                force=bool(config.get('force')),
+                journal=config.get('journal', JOURNAL_NAME) if journaled else None,
+                resume=bool(config.get('resume')),
+                **extra
             )
         else:
             self.uploader = None
@@ -77,17 +109,17 @@ class DialogflowAutomation:
         if not input_dir.exists():
             issues.append(f"Input directory not found: {input_dir}")
         
-        # Check for CSV files
-        csv_files = list(input_dir.glob("*.csv"))
+        # Check for CSV files and workbooks
+        csv_files = find_sheet_files(input_dir)
         if not csv_files:
-            issues.append(f"No CSV files found in {input_dir}")
+            issues.append(f"No CSV or XLSX files found in {input_dir}")
         
         if issues:
             for issue in issues:
                 logger.error(issue)
             return False
         
-        logger.info(f"Environment validation passed. Found {len(csv_files)} CSV files.")
+        logger.info(f"Environment validation passed. Found {len(csv_files)} CSV/XLSX files.")
         return True
     
     def convert_csvs(self) -> Tuple[List[str], List[Tuple[str, str]]]:
@@ -100,28 +132,39 @@ class DialogflowAutomation:
         output_dir = Path(self.config.get('json_dir', input_dir / 'dialogflow_json'))
         output_dir.mkdir(exist_ok=True)
         
-        csv_files = list(input_dir.glob("*.csv"))
+        csv_files = find_sheet_files(input_dir)
         successes = []
         failures = []
         
-        for i, csv_file in enumerate(csv_files, 1):
-            logger.info(f"Converting {i}/{len(csv_files)}: {csv_file.name}")
-            
-            try:
-                output_file = output_dir / f"dialogflow_{csv_file.stem}.json"
-                convert_single_csv(str(csv_file), str(output_file))
-                successes.append(str(output_file))
+        stats = ConversionStats()
+        conversions = iter_conversions(csv_files, output_dir,
+                                       jobs=self.config.get('jobs', 1),
+                                       use_cache=not self.config.get('no_cache'),
+                                       stats=stats, quiet=self.config.get('quiet', False))
+        for i, (csv_file, output_file, error, cached) in enumerate(conversions, 1):
+            if error is None:
+                if cached:
+                    logger.info(f"Unchanged {i}/{len(csv_files)}: {csv_file.name} (cache hit)")
+                else:
+                    logger.info(f"Converted {i}/{len(csv_files)}: {csv_file.name}")
+                if isinstance(output_file, list):
+                    successes.extend(output_file)  # One flow per worksheet
+                else:
+                    successes.append(output_file)
                 self.results['csv_conversions']['success'].append(csv_file.name)
-                
-            except Exception as e:
-                logger.error(f"Failed to convert {csv_file.name}: {e}")
-                failures.append((csv_file.name, str(e)))
+            else:
+                logger.error(f"Failed to convert {csv_file.name}: {error}")
+                failures.append((csv_file.name, error))
                 self.results['csv_conversions']['failed'].append({
                     'file': csv_file.name,
-                    'error': str(e)
+                    'error': error
                 })
         
-        logger.info(f"Conversion complete: {len(successes)}/{len(csv_files)} successful")
+        cache_hits = stats.counters['cache_hits']
+        self.results['csv_conversions']['cache_hits'] = cache_hits
+        self.results['csv_conversions']['stats'] = stats
+        logger.info(f"Conversion complete: {len(successes)}/{len(csv_files)} successful "
+                    f"({cache_hits} unchanged)")
         return successes, failures
     
     def upload_flows(self, json_files: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
@@ -137,12 +180,23 @@ class DialogflowAutomation:
         successes = []
         failures = []
         
-        for i, json_file in enumerate(json_files, 1):
-            logger.info(f"Uploading {i}/{len(json_files)}: {Path(json_file).name}")
+        if self.config.get('upload_delay'):
+            logger.warning("upload_delay is no longer used; uploads are paced by rate_limit (requests/second)")
+        
+        try:
+            if self.config.get('plan'):
+                return self._plan_uploads(json_files)
+            if self.config.get('restore'):
+                return self._restore_agent(json_files)
             
-            try:
-                success, result = self.uploader.upload_single_flow(json_file)
+            # Flows upload concurrently (max_workers at a time) under the uploader's shared rate limiter
+            if self.config.get('async_upload'):
+                uploads = asyncio.run(self._upload_async(json_files))
+            else:
+                uploads = self.uploader.upload_many(json_files)
+            for i, (json_file, success, result) in enumerate(uploads, 1):
                 if success:
+                    logger.info(f"Uploaded {i}/{len(json_files)}: {Path(json_file).name}")
                     successes.append(result)
                     self.results['uploads']['success'].append(Path(json_file).name)
                 else:
@@ -151,22 +205,75 @@ class DialogflowAutomation:
                         'file': Path(json_file).name,
                         'error': result
                     })
-                
-                # Rate limiting
-                if i < len(json_files):
-                    time.sleep(self.config.get('upload_delay', 2))
-                    
-            except Exception as e:
-                logger.error(f"Failed to upload {Path(json_file).name}: {e}")
-                failures.append((Path(json_file).name, str(e)))
-                self.results['uploads']['failed'].append({
-                    'file': Path(json_file).name,
-                    'error': str(e)
-                })
+        finally:
+            # Saves the resource index for the next run and releases the session, journal and token refresh
+            self.uploader.close()
         
         logger.info(f"Upload complete: {len(successes)}/{len(json_files)} successful")
+        self.uploader._log_write_counts()
         return successes, failures
     
+    def write_bundle(self, json_files: List[str]) -> bool:
+        """Write the converted flows as an agent export bundle (config 'bundle')."""
+        from agent_bundle import export_flows
+        problems = export_flows(json_files, self.config['bundle'], self.config.get('dispatcher_url'),
+                                self.config.get('dispatcher_header'))
+        if problems:
+            logger.error(f"Agent bundle not written, {len(problems)} problem(s):")
+            for problem in problems[:20]:
+                logger.error(f"  - {problem}")
+            return False
+        logger.info(f"Agent bundle written to {self.config['bundle']} ({len(json_files)} flows)")
+        return True
+    
+    def _restore_agent(self, json_files: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Upload json_files with one flows:import call per flow instead of
+        per-resource calls; with replace_agent, replace the whole agent with
+        a single agents:restore call.
+        """
+        if not self.config.get('replace_agent'):
+            successes = []
+            failures = []
+            for json_file, success, result in self.uploader.import_flows(json_files):
+                if success:
+                    successes.append(result)
+                    self.results['uploads']['success'].append(Path(json_file).name)
+                else:
+                    failures.append((Path(json_file).name, result))
+                    self.results['uploads']['failed'].append({'file': Path(json_file).name, 'error': result})
+            logger.info(f"Upload complete: {len(successes)}/{len(json_files)} flows imported")
+            return successes, failures
+        try:
+            successes = self.uploader.restore_flows(json_files, self.config.get('bundle'))
+        except Exception as e:
+            logger.error(f"Agent restore failed: {e}")
+            failures = [(Path(f).name, str(e)) for f in json_files]
+            self.results['uploads']['failed'].extend({'file': name, 'error': error} for name, error in failures)
+            return [], failures
+        self.results['uploads']['success'].extend(Path(f).name for f in json_files)
+        logger.info(f"Upload complete: {len(successes)}/{len(json_files)} flows restored")
+        return successes, []
+    
+    def _plan_uploads(self, json_files: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """Write the upload plan for json_files instead of uploading them."""
+        from upload_plan import print_plan, write_plan
+        plan = self.uploader.plan(json_files)
+        write_plan(plan, self.config['plan'])
+        print_plan(plan, float(self.config.get('rate_limit', 10.0)), int(self.config.get('max_workers', 3)),
+                   float(self.config.get('plan_latency_ms', 150)))
+        logger.info(f"Upload plan written to {self.config['plan']}")
+        
+        successes = [flow['flow'] for flow in plan['flows'] if not flow.get('error')]
+        failures = [(Path(flow['file']).name, flow['error']) for flow in plan['flows'] if flow.get('error')]
+        self.results['uploads']['failed'].extend({'file': name, 'error': error} for name, error in failures)
+        return successes, failures
+    
+    async def _upload_async(self, json_files: List[str]) -> List[Tuple[str, bool, str]]:
+        """Upload with the async engine, returning (json_file, success, result) per flow."""
+        async with self.uploader:
+            return [upload async for upload in self.uploader.upload_many(json_files)]
+    
     def generate_report(self) -> str:
         """Generate a detailed report of the automation results."""
         report = []
@@ -179,6 +286,12 @@ class DialogflowAutomation:
         report.append("\nCSV CONVERSION RESULTS:")
         report.append(f"  Successful: {len(self.results['csv_conversions']['success'])}")
         report.append(f"  Failed: {len(self.results['csv_conversions']['failed'])}")
+        report.append(f"  Unchanged (cache hits): {self.results['csv_conversions'].get('cache_hits', 0)}")
+        
+        stats = self.results['csv_conversions'].get('stats')
+        if stats:
+            for line in stats.summary_lines():
+                report.append(f"  {line}")
         
         if self.results['csv_conversions']['failed']:
             report.append("\n  Failed conversions:")
@@ -231,6 +344,11 @@ class DialogflowAutomation:
             self.generate_report()
             return False
         
+        # Replacing the agent, the uploader writes the bundle it sends, with the live agent's settings
+        replaces_agent = self.config.get('restore') and self.config.get('replace_agent')
+        if self.config.get('bundle') and (self.config.get('skip_upload') or not replaces_agent):
+            self.write_bundle(json_files)
+        
         # Phase 2: Upload to Dialogflow (if configured)
         if self.config.get('skip_upload'):
             logger.info("Skipping upload phase (skip_upload=True)")
@@ -241,7 +359,7 @@ class DialogflowAutomation:
         elapsed_time = time.time() - start_time
         self.results['statistics'] = {
             'Total processing time': f"{elapsed_time:.2f} seconds",
-            'CSV files processed': len(list(Path(self.config['input_dir']).glob("*.csv"))),
+            'CSV/XLSX files processed': len(find_sheet_files(self.config['input_dir'])),
             'JSON files created': len(json_files),
             'Flows uploaded': len(self.results['uploads']['success'])
         }
@@ -300,8 +418,49 @@ def main():
     parser.add_argument('--dispatcher-header', help='Optional header for dispatcher (format: Key=Value)')
     
     # Processing options
-    parser.add_argument('--skip-upload', action='store_true', help='Only convert CSVs, skip upload')
-    parser.add_argument('--upload-delay', type=int, default=2, help='Delay between uploads in seconds')
+    parser.add_argument('--skip-upload', action='store_true', default=None, help='Only convert CSVs, skip upload')
+    parser.add_argument('--upload-delay', type=int, help=argparse.SUPPRESS)  # Superseded by --rate-limit
+    parser.add_argument('--max-workers', type=int, help='Flows to upload in parallel (default: 3)')
+    parser.add_argument('--ops-per-flow', type=int,
+                        help='API operations of one flow run in parallel once their dependencies are done (default: 8)')
+    parser.add_argument('--rate-limit', type=float,
+                        help='Starting API requests per second across all uploads; adapts to 429/503 responses (default: 10)')
+    parser.add_argument('--max-rate', type=float,
+                        help='Ceiling for the adaptive request rate; equal to --rate-limit for a fixed rate (default: none)')
+    parser.add_argument('--async', dest='async_upload', action='store_true', default=None,
+                        help='Upload with the asyncio engine (requires aiohttp)')
+    parser.add_argument('--max-connections', type=int, help='Concurrent API requests with --async (default: 20)')
+    parser.add_argument('--jobs', help="CSV files to convert in parallel, or 'auto' for one per core (default: 1)")
+    parser.add_argument('--no-cache', action='store_true', default=None,
+                        help='Reconvert every CSV, ignoring the conversion cache')
+    parser.add_argument('--quiet', action='store_true', default=None, help='Do not echo per-file converter output')
+    parser.add_argument('--resource-cache', help=f'File keeping the agent\'s resource names between runs (default: {CACHE_NAME})')
+    parser.add_argument('--no-resource-cache', action='store_true', default=None,
+                        help='Discover every resource by listing instead of using the resource cache')
+    parser.add_argument('--sync', action='store_true', default=None,
+                        help="Read the agent's current state once and only write what differs")
+    parser.add_argument('--prune', action='store_true', default=None,
+                        help='Delete pages of uploaded flows that are no longer in their sheet')
+    parser.add_argument('--force', action='store_true', default=None,
+                        help='Write every resource, even if the upload ledger shows it unchanged')
+    parser.add_argument('--plan', metavar='PLAN_JSON',
+                        help='Write the API calls the upload would make to PLAN_JSON, with a time estimate, instead of uploading')
+    parser.add_argument('--plan-latency-ms', type=float,
+                        help='Assumed time per API request for --plan estimates (default: 150)')
+    parser.add_argument('--bundle', metavar='BUNDLE_ZIP',
+                        help='Write the converted flows as a Dialogflow CX agent export bundle (works with --skip-upload)')
+    parser.add_argument('--restore', action='store_true', default=None,
+                        help='Upload each converted flow with one flows:import call instead of per-resource calls, '
+                             'replacing flows of the same name; other flows are left alone')
+    parser.add_argument('--replace-agent', action='store_true', default=None,
+                        help='With --restore, replace the whole agent with the converted flows in one agents:restore '
+                             'call; refused if the agent has flows they do not cover')
+    parser.add_argument('--allow-dangling', action='store_true', default=None,
+                        help='Upload flows whose routes target missing pages, skipping those routes')
+    parser.add_argument('--journal', help=f'Checkpoint file recording each completed upload operation (default: {JOURNAL_NAME})')
+    parser.add_argument('--no-journal', action='store_true', default=None, help='Do not write a checkpoint journal')
+    parser.add_argument('--resume', action='store_true', default=None,
+                        help='Continue an interrupted upload: skip the operations and flows in the journal')
     parser.add_argument('--config', help='JSON config file with all settings')
     
     args = parser.parse_args()
@@ -309,7 +468,7 @@ def main():
     # Load configuration
     config = load_config(args.config)
     
-    # Override with command line arguments
+    # Override with command line arguments; flags default to None, so only those given override the config
     for key, value in vars(args).items():
         if value is not None and key != 'config':
             config[key] = value
@@ -0,0 +1,141 @@
+"""
+Instrumentation for the CSV conversion pipeline.
+
+A ConversionStats collects wall time per phase, row counters, warnings by
+category and cache hit counts. Hot loops only bump counters and keep a few
+raw examples per category; messages are formatted once, when summarized.
+"""
+
+import time
+from contextlib import contextmanager
+
+PHASES = ("read", "parse", "assemble", "end_states", "serialize")
+
+# Warning categories and how they read in summaries
+WARNING_LABELS = {
+    "end_state_row": "rows with no next page (end states)",
+    "end_state_chip": "chips leading to an end state",
+    "target_count_mismatch": "rows whose Next Page count doesn't match the chip count",
+    "isolated_page": "pages with no incoming or outgoing routes (end states)",
+    "row_error": "rows that failed to process",
+}
+
+# Examples kept per warning category
+MAX_EXAMPLES = 3
+
+class ConversionStats:
+    """Per-phase wall time, counters and aggregated warnings for one or more conversions."""
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = {
+            "flows": 0,
+            "rows": 0,
+            "rows_skipped": 0,
+            "rows_errored": 0,
+            "cache_hits": 0,
+        }
+        self.warnings = {}  # category -> [count, examples]
+        self.parser_cache = {}  # parser name -> {"hits": n, "misses": n}
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block and add it to the named phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.phases[name] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def warn(self, category, detail):
+        """Count a warning; detail is only kept for the first few of each category."""
+        entry = self.warnings.get(category)
+        if entry is None:
+            entry = self.warnings[category] = [0, []]
+        entry[0] += 1
+        if len(entry[1]) < MAX_EXAMPLES:
+            entry[1].append(detail)
+
+    def add_parser_cache(self, stats):
+        """Add parser cache hit/miss counts (as from parser_cache_stats deltas)."""
+        for name, counts in stats.items():
+            entry = self.parser_cache.setdefault(name, {"hits": 0, "misses": 0})
+            entry["hits"] += counts["hits"]
+            entry["misses"] += counts["misses"]
+
+    def merge(self, other):
+        """Add another ConversionStats (or its to_dict()) into this one."""
+        if isinstance(other, dict):
+            other = ConversionStats.from_dict(other)
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for category, (n, examples) in other.warnings.items():
+            entry = self.warnings.setdefault(category, [0, []])
+            entry[0] += n
+            entry[1].extend(examples[:MAX_EXAMPLES - len(entry[1])])
+        self.add_parser_cache(other.parser_cache)
+        return self
+
+    def to_dict(self):
+        """Plain-data form, for passing between processes and writing reports."""
+        return {
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "warnings": {category: [n, list(examples)] for category, (n, examples) in self.warnings.items()},
+            "parser_cache": {name: dict(counts) for name, counts in self.parser_cache.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.phases.update(data.get("phases", {}))
+        stats.counters.update(data.get("counters", {}))
+        stats.warnings = {category: [n, list(examples)] for category, (n, examples) in data.get("warnings", {}).items()}
+        stats.parser_cache = {name: dict(counts) for name, counts in data.get("parser_cache", {}).items()}
+        return stats
+
+    def warning_lines(self):
+        """One line per warning category: count, label and examples."""
+        lines = []
+        for category, (n, examples) in self.warnings.items():
+            label = WARNING_LABELS.get(category, category)
+            shown = ", ".join(str(e) for e in examples)
+            more = ", ..." if n > len(examples) else ""
+            lines.append(f"{n} {label}: {shown}{more}")
+        return lines
+
+    def parser_cache_lines(self):
+        """One line per memoized parser: hit rate and counts."""
+        lines = []
+        for name, counts in self.parser_cache.items():
+            calls = counts["hits"] + counts["misses"]
+            if calls:
+                lines.append(f"{name}: {counts['hits'] / calls:.1%} hit rate "
+                             f"({counts['hits']}/{calls} calls)")
+        return lines
+
+    def summary_lines(self):
+        """Phase timings, counters, warnings and cache statistics as report lines."""
+        total = sum(self.phases.values())
+        lines = [f"Phase times (total {total:.2f}s):"]
+        for name, seconds in self.phases.items():
+            share = f" ({seconds / total:.0%})" if total else ""
+            lines.append(f"  {name}: {seconds:.3f}s{share}")
+        lines.append("Counters:")
+        for name, n in self.counters.items():
+            lines.append(f"  {name}: {n}")
+        if self.warnings:
+            lines.append("Warnings:")
+            lines.extend(f"  {line}" for line in self.warning_lines())
+        if self.parser_cache_lines():
+            lines.append("Parser cache:")
+            lines.extend(f"  {line}" for line in self.parser_cache_lines())
+        return lines
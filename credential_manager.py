@@ -0,0 +1,125 @@
+"""
+Access tokens for the Dialogflow uploader.
+
+A CredentialManager loads the service account key once and hands out the
+current access token to every thread and task of an uploader. A daemon
+thread refreshes the token a few minutes before it expires, so requests
+neither wait on a refresh in the middle of a deploy nor get a 401 for an
+expired token. A request that is still rejected (e.g. a revoked token)
+calls invalidate() with the token it sent; only the first such caller
+refreshes, and the others pick up the new token.
+"""
+
+import asyncio
+import datetime
+import logging
+import threading
+from typing import Any, Optional, Tuple
+
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+
+class CredentialManager:
+    """Thread-safe holder of service account credentials with background refresh."""
+
+    def __init__(self, service_account_file: Optional[str] = None, credentials: Optional[Any] = None,
+                 refresh_margin: float = 300, min_validity: float = 60, retry_delay: float = 30):
+        """
+        Load the key from service_account_file, or use credentials (any
+        google.auth credentials object). The background refresh runs
+        refresh_margin seconds before expiry; a caller finding less than
+        min_validity seconds left refreshes in its own thread instead.
+        A failed background refresh is retried after retry_delay seconds.
+        """
+        self.credentials = credentials or service_account.Credentials.from_service_account_file(
+            service_account_file, scopes=SCOPES)
+        self.refresh_margin = refresh_margin
+        self.min_validity = min_validity
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+        # (token, expiry), replaced as a whole after each refresh so coroutines can read it without the lock
+        self.current = (self.credentials.token, self.credentials.expiry)
+        self.refreshes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _seconds_left(self, current: Optional[Tuple[Optional[str], Any]] = None) -> Optional[float]:
+        """Seconds until the token of current (default: self.current) expires; None if it never expires."""
+        token, expiry = current or self.current
+        if not token:
+            return 0.0
+        if expiry is None:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds()
+
+    def fresh(self, current: Optional[Tuple[Optional[str], Any]] = None) -> bool:
+        """True if the token of current (default: self.current) can be used without refreshing first."""
+        left = self._seconds_left(current)
+        return left is None or left > self.min_validity
+
+    def _refresh(self):
+        """Fetch a new token; the caller holds the lock."""
+        self.credentials.refresh(Request())
+        self.current = (self.credentials.token, self.credentials.expiry)
+        self.refreshes += 1
+
+    def token(self) -> str:
+        """A valid access token, refreshed first only if it is (nearly) expired."""
+        with self.lock:
+            if not self.fresh():
+                self._refresh()
+            return self.current[0]
+
+    async def token_async(self) -> str:
+        """
+        token() for coroutines. A fresh token is read without the lock, which
+        the background refresh holds for a whole OAuth round trip; a refresh,
+        if one is needed, runs off the event loop.
+        """
+        current = self.current
+        if self.fresh(current):
+            return current[0]
+        return await asyncio.to_thread(self.token)
+
+    def invalidate(self, rejected: Optional[str]):
+        """Refresh after the API rejected the token `rejected`, unless it was already replaced."""
+        with self.lock:
+            if rejected is None or self.current[0] == rejected:
+                self._refresh()
+
+    def start(self) -> "CredentialManager":
+        """Start the background refresh thread (idempotent); returns self."""
+        with self.lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background refresh thread."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        delay = 0.0
+        while not self._stop.wait(delay):
+            try:
+                with self.lock:
+                    left = self._seconds_left()
+                    if left is not None and left <= self.refresh_margin:
+                        self._refresh()
+                        left = self._seconds_left()
+                if left is None:
+                    return  # Nothing to keep fresh
+                delay = max(1.0, left - self.refresh_margin)
+            except Exception as e:
+                logger.warning(f"Background token refresh failed, retrying in {self.retry_delay:g}s: {e}")
+                delay = self.retry_delay
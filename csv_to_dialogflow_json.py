@@ -1,11 +1,23 @@
 import pandas as pd
+from openpyxl import load_workbook
+import contextlib
+import csv
+import functools
+import hashlib
+import io
 import json
 import sys
 import argparse
 import re
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from conversion_stats import ConversionStats
+from flow_graph import FlowGraph
+from flow_model import Flow, Route, RouteSpill
+
 # Core required columns
 REQUIRED_COLUMNS = [
     "Page Name",
@@ -25,6 +37,9 @@ OPTIONAL_COLUMNS = [
     "Notes/Comments"
 ]
 
+# Entries kept per memoized cell parser; repeated menu and transition cells hit these
+PARSER_CACHE_SIZE = 4096
+
 def sanitize(value):
     """Clean up cell values, handling various empty indicators."""
     if pd.isna(value) or value is None:
@@ -52,6 +67,7 @@ def parse_params(param_str):
             result[pair] = ""
     return result
 
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
 def strip_wrapping_quotes(s: str) -> str:
     """Remove wrapping quotes from a string."""
     s = s.strip()
@@ -71,9 +87,14 @@ def parse_chips(chips_cell) -> list[str]:
     """
     if chips_cell is None:
         return []
-    raw = str(chips_cell).strip()
+    return list(_parse_chips_text(str(chips_cell)))
+
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
+def _parse_chips_text(text):
+    """Memoized body of parse_chips(), keyed on the cell text; returns a tuple."""
+    raw = text.strip()
     if not raw or raw in {"—", "-", "__", "_", ""}:
-        return []
+        return ()
     
     chips = []
     
@@ -100,14 +121,7 @@ def parse_chips(chips_cell) -> list[str]:
             chips.append(p)
     
     # Remove duplicates while preserving order
-    seen = set()
-    out = []
-    for c in chips:
-        if c not in seen:
-            out.append(c)
-            seen.add(c)
-    
-    return out
+    return tuple(dict.fromkeys(chips))
 
 def parse_next_pages(cell, chips_count):
     """
@@ -121,10 +135,21 @@ def parse_next_pages(cell, chips_count):
         # No next page = end state (this is valid!)
         return [None] * chips_count
     
-    s = str(cell).strip()
+    targets, mismatch = _parse_next_pages_text(str(cell), chips_count)
+    if mismatch is not None:
+        print(f"  Warning: Next Page count ({mismatch}) doesn't match chip count ({chips_count})")
+    return list(targets)
+
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
+def _parse_next_pages_text(text, chips_count):
+    """
+    Memoized body of parse_next_pages(), keyed on the cell text and chip count.
+    Returns (targets tuple, target count if it mismatched the chip count else None).
+    """
+    s = text.strip()
     if not s or s in {"—", "-", "__", "_", "N/A", "n/a"}:
         # These all indicate end states
-        return [None] * chips_count
+        return (None,) * chips_count, None
     
     # Check for newline separation first
     if '\n' in s:
@@ -134,7 +159,7 @@ def parse_next_pages(cell, chips_count):
         targets = [t.strip() for t in s.split('/') if t.strip()]
     else:
         # Single target for all chips
-        return [s] * chips_count
+        return (s,) * chips_count, None
     
     # Clean targets - convert empty strings to None
     cleaned_targets = []
@@ -147,17 +172,17 @@ def parse_next_pages(cell, chips_count):
     # Handle target count vs chip count mismatch
     if len(cleaned_targets) == 1:
         # Single target for all chips
-        return cleaned_targets * chips_count
+        return tuple(cleaned_targets) * chips_count, None
     elif len(cleaned_targets) == chips_count:
         # Perfect match
-        return cleaned_targets
+        return tuple(cleaned_targets), None
     else:
-        # Mismatch - log warning but try to handle gracefully
-        print(f"  Warning: Next Page count ({len(cleaned_targets)}) doesn't match chip count ({chips_count})")
+        # Mismatch - the caller logs a warning, but try to handle gracefully
+        mismatch = len(cleaned_targets)
         # If we have fewer targets than chips, pad with the last target (or None)
         while len(cleaned_targets) < chips_count:
             cleaned_targets.append(cleaned_targets[-1] if cleaned_targets else None)
-        return cleaned_targets[:chips_count]
+        return tuple(cleaned_targets[:chips_count]), mismatch
 
 def parse_trigger_and_example(trigger_raw):
     """
@@ -186,6 +211,7 @@ def parse_trigger_and_example(trigger_raw):
     # No colon - treat entire string as example
     return "Intent", strip_wrapping_quotes(trigger_raw)
 
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
 def slugify(s: str) -> str:
     """Convert string to valid Dialogflow identifier."""
     s = s.lower().strip()
@@ -194,6 +220,7 @@ def slugify(s: str) -> str:
     s = re.sub(r"_+", "_", s)
     return s.strip("_")
 
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
 def generate_webhook_tag(action_text: str) -> str:
     """
     Generate a webhook tag from plain English description.
@@ -220,214 +247,816 @@ def generate_webhook_tag(action_text: str) -> str:
     
     return tag.strip('_')
 
-def convert_single_csv(csv_path, output_path=None):
-    """Convert a single CSV file to Dialogflow JSON."""
+# Memoized cell parsers, by the name reported in cache statistics
+PARSER_CACHES = {
+    "parse_chips": _parse_chips_text,
+    "parse_next_pages": _parse_next_pages_text,
+    "strip_wrapping_quotes": strip_wrapping_quotes,
+    "slugify": slugify,
+    "generate_webhook_tag": generate_webhook_tag,
+}
+
+def parser_cache_stats():
+    """Cumulative hit and miss counts of the memoized cell parsers in this process."""
+    stats = {}
+    for name, parser in PARSER_CACHES.items():
+        info = parser.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses}
+    return stats
+
+def add_cache_stats(total, stats, baseline=None):
+    """Add stats (minus baseline, if given) into total, in place."""
+    for name, counts in stats.items():
+        entry = total.setdefault(name, {"hits": 0, "misses": 0})
+        for key in ("hits", "misses"):
+            entry[key] += counts[key] - (baseline[name][key] if baseline else 0)
+    return total
+
+# Values that sanitize() treats as "no value"
+EMPTY_MARKERS = {"—", "-", "__", "_", "", "N/A", "n/a", "nan", "None"}
+
+# Phrases stripped from user examples by parse_trigger_and_example()
+EXAMPLE_PREFIXES = ['User says ', 'User responds with ', 'User denies ', 'User accepts ']
+
+ENGINES = ("columnar", "rows", "stream")
+
+# Cell values pd.read_csv reads as NaN by default; the stream engine mirrors them
+PANDAS_NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+def _parse_row(row, has_step, has_next_step):
+    """
+    Parse one DataFrame row into the field tuple consumed by _add_row().
+    Returns None for rows without a page name.
+    """
+    page = sanitize(row.get("Page Name"))
+    if not page:
+        return None
     
-    print(f"\nProcessing: {csv_path}")
+    intent_name_raw = sanitize(row.get("Intent Name"))
+    trigger_raw = sanitize(row.get("Trigger Type & User Example"))
+    bot_prompt = sanitize(row.get("Bot Prompt"))
+    next_page_cell = sanitize(row.get("Next Page / Transition"))
+    param_set = parse_params(sanitize(row.get("Parameter Set")))
+    webhook_action_raw = sanitize(row.get("Webhook Action"))
+    chips = parse_chips(row.get("Suggested Chips"))
     
-    # Read CSV
-    df = pd.read_csv(csv_path)
+    # Get step info if available
+    step_info = {}
+    if has_step:
+        step = sanitize(row.get("Step"))
+        if step:
+            step_info["step"] = step
+    if has_next_step:
+        next_step = sanitize(row.get("Next Step"))
+        if next_step:
+            step_info["next_step"] = next_step
     
-    # Check for required columns
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
-    if missing:
-        print(f"  Warning: Missing columns: {missing}")
-        print(f"  Available columns: {list(df.columns)}")
+    # Parse trigger type and user example
+    trigger_type, user_example = parse_trigger_and_example(trigger_raw)
     
-    # Check for optional columns
-    has_step = "Step" in df.columns
-    has_next_step = "Next Step" in df.columns
-    if has_step or has_next_step:
-        print(f"  Found Step/Next Step columns - will include in metadata")
+    # Generate webhook tag from plain English
+    webhook_tag = generate_webhook_tag(webhook_action_raw) if webhook_action_raw else None
     
-    # Output structure
-    data = {
-        "pages": {},
-        "intents": {},
-        "routes": [],
-        "end_pages": [],  # Track pages that are end states
-        "first_page": None,
-        "webhooks": {},
-        "metadata": {
-            "source_file": os.path.basename(csv_path),
-            "has_step_info": has_step or has_next_step
-        }
-    }
+    return (page, slugify(page), intent_name_raw, user_example, bot_prompt,
+            next_page_cell, param_set, webhook_action_raw, webhook_tag, chips, step_info)
+
+def _add_row(flow, row_idx, fields, stats):
+    """
+    Add one parsed row to the flow: page content, intents and routes.
+    End states and target count mismatches are counted in stats, not printed.
+    """
+    (page, page_slug, intent_name_raw, user_example, bot_prompt,
+     next_page_cell, param_set, webhook_action_raw, webhook_tag, chips, step_info) = fields
     
-    # Track which pages have no outgoing routes (end states)
-    pages_with_routes = set()
-    all_pages = set()
+    if webhook_tag:
+        flow.add_webhook(webhook_tag, webhook_action_raw)
     
-    # Process each row
-    for row_idx, row in df.iterrows():
-        try:
-            page = sanitize(row.get("Page Name"))
-            if not page:
-                continue
-            
-            all_pages.add(page)
-            
-            intent_name_raw = sanitize(row.get("Intent Name"))
-            trigger_raw = sanitize(row.get("Trigger Type & User Example"))
-            bot_prompt = sanitize(row.get("Bot Prompt"))
-            next_page_cell = sanitize(row.get("Next Page / Transition"))
-            param_set = parse_params(sanitize(row.get("Parameter Set")))
-            webhook_action_raw = sanitize(row.get("Webhook Action"))
-            chips = parse_chips(row.get("Suggested Chips"))
-            
-            # Get step info if available
-            step_info = {}
-            if has_step:
-                step = sanitize(row.get("Step"))
-                if step:
-                    step_info["step"] = step
-            if has_next_step:
-                next_step = sanitize(row.get("Next Step"))
-                if next_step:
-                    step_info["next_step"] = next_step
-            
-            # Parse trigger type and user example
-            trigger_type, user_example = parse_trigger_and_example(trigger_raw)
-            
-            # Generate webhook tag from plain English
-            webhook_tag = None
-            if webhook_action_raw:
-                webhook_tag = generate_webhook_tag(webhook_action_raw)
-                if webhook_tag:
-                    data["webhooks"][webhook_tag] = webhook_action_raw
-            
-            # Initialize page
-            pg = data["pages"].setdefault(page, {
-                "prompts": [], 
-                "chips": [],
-                "metadata": {}
-            })
-            
-            if bot_prompt and bot_prompt not in pg["prompts"]:
-                pg["prompts"].append(bot_prompt)
-            
-            for c in chips:
-                if c not in pg["chips"]:
-                    pg["chips"].append(c)
+    # Initialize page
+    pg = flow.page(page)
+    
+    if bot_prompt:
+        pg.prompts.add(bot_prompt)
+    
+    pg.chips.update(chips)
+    
+    # Add step info to page metadata
+    if step_info:
+        pg.metadata.update(step_info)
+    
+    # Set first page (excluding StartPage)
+    if not flow.first_page and page.lower() not in ["startpage", "start_page", "start"]:
+        flow.first_page = page
+    
+    # Parse next pages (may be multiple if chips have different targets)
+    chips_count = len(chips) if chips else 1
+    if next_page_cell is None:
+        next_pages = (None,) * chips_count
+    else:
+        next_pages, mismatch = _parse_next_pages_text(str(next_page_cell), chips_count)
+        if mismatch is not None:
+            stats.warn("target_count_mismatch", f"'{page}' ({mismatch} targets, {chips_count} chips)")
+    
+    # Track if this page has any outgoing routes
+    has_valid_route = False
+    
+    # Create routes
+    if not chips:
+        # No chips - create single route with user example (if there's a next page)
+        intent_name = intent_name_raw or f"Intent_{page_slug}_{row_idx}"
+        
+        intent = flow.intent(intent_name)
+        if user_example:
+            intent.training_phrases.add(user_example)
+        
+        # Check if there's a valid next page
+        if next_pages[0] is not None:
+            flow.routes.append(Route(page, intent_name, next_pages[0], webhook_tag, param_set or None))
+            has_valid_route = True
+        else:
+            # This is an end state - still create the intent but no route
+            stats.warn("end_state_row", f"'{page}'")
+    else:
+        # With chips - create route for each chip
+        for i, chip in enumerate(chips):
+            # Create intent name that includes the chip for clarity
+            base_intent = intent_name_raw or f"Intent_{page_slug}"
+            chip_intent_name = f"{base_intent} :: {chip}"
             
-            # Add step info to page metadata
-            if step_info:
-                pg["metadata"].update(step_info)
+            # Intent training phrases include both chip text and optional user example
+            intent = flow.intent(chip_intent_name)
             
-            # Set first page (excluding StartPage)
-            if not data["first_page"] and page.lower() not in ["startpage", "start_page", "start"]:
-                data["first_page"] = page
+            # Always add chip as training phrase
+            intent.training_phrases.add(chip)
             
-            # Parse next pages (may be multiple if chips have different targets)
-            next_pages = parse_next_pages(next_page_cell, len(chips) if chips else 1)
+            # Add user example if provided
+            if user_example:
+                intent.training_phrases.add(user_example)
             
-            # Track if this page has any outgoing routes
-            has_valid_route = False
+            # Get the next page for this chip
+            next_page_value = next_pages[i] if i < len(next_pages) else next_pages[0]
             
-            # Create routes
-            if not chips:
-                # No chips - create single route with user example (if there's a next page)
-                intent_name = intent_name_raw or f"Intent_{slugify(page)}_{row_idx}"
-                
-                intent = data["intents"].setdefault(intent_name, {"training_phrases": []})
-                if user_example and user_example not in intent["training_phrases"]:
-                    intent["training_phrases"].append(user_example)
-                
-                # Check if there's a valid next page
-                if next_pages[0] is not None:
-                    data["routes"].append({
-                        "page": page,
-                        "intent": intent_name,
-                        "next_page": next_pages[0],
-                        "webhook_action": webhook_tag,
-                        "parameters": param_set or None
-                    })
-                    pages_with_routes.add(page)
-                    has_valid_route = True
-                else:
-                    # This is an end state - still create the intent but no route
-                    print(f"  Page '{page}' is an end state (no next page)")
+            # Create route only if there's a next page
+            if next_page_value is not None:
+                flow.routes.append(Route(page, chip_intent_name, next_page_value, webhook_tag, param_set or None))
+                has_valid_route = True
             else:
-                # With chips - create route for each chip
-                for i, chip in enumerate(chips):
-                    # Create intent name that includes the chip for clarity
-                    base_intent = intent_name_raw or f"Intent_{slugify(page)}"
-                    chip_intent_name = f"{base_intent} :: {chip}"
-                    
-                    # Intent training phrases include both chip text and optional user example
-                    intent = data["intents"].setdefault(chip_intent_name, {"training_phrases": []})
-                    
-                    # Always add chip as training phrase
-                    if chip not in intent["training_phrases"]:
-                        intent["training_phrases"].append(chip)
-                    
-                    # Add user example if provided
-                    if user_example and user_example not in intent["training_phrases"]:
-                        intent["training_phrases"].append(user_example)
-                    
-                    # Get the next page for this chip
-                    next_page_value = next_pages[i] if i < len(next_pages) else next_pages[0]
-                    
-                    # Create route only if there's a next page
-                    if next_page_value is not None:
-                        data["routes"].append({
-                            "page": page,
-                            "intent": chip_intent_name,
-                            "next_page": next_page_value,
-                            "webhook_action": webhook_tag,
-                            "parameters": param_set or None
-                        })
-                        pages_with_routes.add(page)
-                        has_valid_route = True
-                    else:
-                        # This chip leads to an end state
-                        print(f"  Chip '{chip}' from page '{page}' leads to end state")
-            
-            # Mark page as end state if it has no outgoing routes
-            if not has_valid_route and bot_prompt:  # Only if page has content
-                if page not in data["end_pages"]:
-                    data["end_pages"].append(page)
-                    
+                # This chip leads to an end state
+                stats.warn("end_state_chip", f"'{chip}' on '{page}'")
+    
+    # Mark page as end state if it has no outgoing routes
+    if not has_valid_route and bot_prompt:  # Only if page has content
+        flow.end_pages.add(page)
+
+def _analyze_graph(flow, stats):
+    """
+    Index the flow's transitions once, mark pages with neither incoming nor
+    outgoing routes as end states, and record the graph analysis in metadata.
+    """
+    with stats.phase("end_states"):
+        graph = FlowGraph.from_flow(flow)
+        
+        # Any page not referenced and not the first page might be an end state
+        for page in graph.isolated_pages():
+            if page != flow.first_page and flow.end_pages.add(page):
+                stats.warn("isolated_page", f"'{page}'")
+        
+        flow.metadata["graph"] = graph.analysis()
+
+def _convert_rows(df, flow, has_step, has_next_step, stats):
+    """Row engine: parse and assemble the DataFrame one row at a time."""
+    _convert_records(df.iterrows(), flow, has_step, has_next_step, stats)
+
+def _text_column(df, column):
+    """Column as stripped strings, with missing cells as NaN (None if the column is absent)."""
+    if column not in df.columns:
+        return None
+    col = df[column]
+    return col.astype(str).str.strip().astype(object).where(col.notna())
+
+def _sanitize_column(df, column):
+    """Vectorized sanitize(): stripped strings with empty markers as None."""
+    text = _text_column(df, column)
+    if text is None:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    return text.where(text.notna() & ~text.isin(EMPTY_MARKERS), None)
+
+def _strip_wrapping_quotes_column(s):
+    """Vectorized strip_wrapping_quotes() for a string Series."""
+    s = s.str.strip().str.replace('""', '"', regex=False)
+    wrapped = (s.str.len() >= 2) & s.str.startswith('"') & s.str.endswith('"')
+    return s.where(~wrapped, s.str[1:-1])
+
+def _user_example_column(trigger):
+    """Vectorized parse_trigger_and_example(), returning only the user example."""
+    example = pd.Series([None] * len(trigger), index=trigger.index, dtype=object)
+    present = trigger.notna()
+    if not present.any():
+        return example
+    
+    text = trigger[present].astype(str)
+    has_colon = text.str.contains(':', regex=False)
+    
+    after_colon = text[has_colon].str.split(':', n=1).str[1].str.strip()
+    for prefix in EXAMPLE_PREFIXES:
+        after_colon = after_colon.str.replace(prefix, '', regex=False)
+    
+    example[after_colon.index] = _strip_wrapping_quotes_column(after_colon)
+    no_colon = text[~has_colon]
+    example[no_colon.index] = _strip_wrapping_quotes_column(no_colon)
+    return example
+
+def _slugify_column(s):
+    """Vectorized slugify() for a string Series."""
+    s = s.str.lower().str.strip()
+    s = s.str.replace(r"\s+", "_", regex=True)
+    s = s.str.replace(r"[^a-z0-9_]", "", regex=True)
+    s = s.str.replace(r"_+", "_", regex=True)
+    return s.str.strip("_")
+
+def _map_unique(s, func, raw=False):
+    """
+    Apply func once per distinct value of s and broadcast the results.
+    Missing values are passed as None unless raw is set.
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    parsed = [func(u if raw or not pd.isna(u) else None) for u in uniques]
+    return [parsed[c] for c in codes]
+
+def _row_error(stats, row_idx, error):
+    """Count a row that failed to process (row numbers as shown in a spreadsheet)."""
+    stats.count("rows_errored")
+    stats.warn("row_error", f"row {row_idx + 2}: {error}")
+
+def _convert_columnar(df, flow, has_step, has_next_step, stats):
+    """
+    Columnar engine: sanitization, empty-marker detection, trigger splitting
+    and slugging run as whole-column operations; only route assembly is per row.
+    """
+    parse_start = time.perf_counter()
+    pages = _sanitize_column(df, "Page Name")
+    keep = pages.notna() & (pages != "")
+    stats.count("rows", len(df))
+    stats.count("rows_skipped", len(df) - int(keep.sum()))
+    df = df[keep]
+    if df.empty:
+        stats.add_time("parse", time.perf_counter() - parse_start)
+        return
+    pages = pages[keep].astype(str)
+    
+    page_slugs = _slugify_column(pages)
+    intent_names = _sanitize_column(df, "Intent Name")
+    user_examples = _user_example_column(_sanitize_column(df, "Trigger Type & User Example"))
+    bot_prompts = _sanitize_column(df, "Bot Prompt")
+    next_page_cells = _sanitize_column(df, "Next Page / Transition")
+    param_sets = _map_unique(_sanitize_column(df, "Parameter Set"), parse_params)
+    webhook_actions = _sanitize_column(df, "Webhook Action")
+    webhook_tags = _map_unique(webhook_actions, generate_webhook_tag)
+    
+    # parse_chips() sees the raw cell, not the sanitized one
+    if "Suggested Chips" in df.columns:
+        chip_lists = _map_unique(df["Suggested Chips"], parse_chips, raw=True)
+    else:
+        chip_lists = [[]] * len(df)
+    
+    steps = _sanitize_column(df, "Step").tolist() if has_step else None
+    next_steps = _sanitize_column(df, "Next Step").tolist() if has_next_step else None
+    
+    columns = zip(
+        df.index.tolist(), pages.tolist(), page_slugs.tolist(), intent_names.tolist(),
+        user_examples.tolist(), bot_prompts.tolist(), next_page_cells.tolist(), param_sets,
+        webhook_actions.tolist(), webhook_tags, chip_lists,
+    )
+    stats.add_time("parse", time.perf_counter() - parse_start)
+    
+    with stats.phase("assemble"):
+        for i, (row_idx, *fields) in enumerate(columns):
+            try:
+                step_info = {}
+                if steps is not None and steps[i]:
+                    step_info["step"] = steps[i]
+                if next_steps is not None and next_steps[i]:
+                    step_info["next_step"] = next_steps[i]
+                _add_row(flow, row_idx, (*fields, step_info), stats)
+            except Exception as e:
+                _row_error(stats, row_idx, e)
+
+def _read_csv_header(csv_path):
+    """Return the column names from the first line of a CSV file."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+def _iter_csv_records(csv_path, columns):
+    """
+    Yield (row_idx, record) pairs using the stdlib csv reader.
+    
+    Cells are kept as strings; values pandas would read as NaN become NaN so
+    the cell parsers see the same input as with pd.read_csv. Blank lines are
+    skipped without consuming a row index, as pandas does.
+    """
+    na = float("nan")
+    width = len(columns)
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        row_idx = 0
+        for cells in reader:
+            if not cells:
+                continue
+            if len(cells) < width:
+                cells = cells + [""] * (width - len(cells))
+            yield row_idx, {
+                col: na if cell in PANDAS_NA_VALUES else cell
+                for col, cell in zip(columns, cells)
+            }
+            row_idx += 1
+
+def _convert_records(records, flow, has_step, has_next_step, stats):
+    """
+    Record engine: parse and assemble (row_idx, record) pairs as they arrive.
+    Time spent producing the records (e.g. reading a streamed file) counts as parsing.
+    """
+    clock = time.perf_counter
+    rows = skipped = 0
+    assemble = 0.0
+    start = clock()
+    for row_idx, record in records:
+        rows += 1
+        try:
+            fields = _parse_row(record, has_step, has_next_step)
+            if fields is None:
+                skipped += 1
+                continue
+            t = clock()
+            _add_row(flow, row_idx, fields, stats)
+            assemble += clock() - t
         except Exception as e:
-            print(f"  Error processing row {row_idx + 2}: {e}")
+            _row_error(stats, row_idx, e)
+    stats.add_time("parse", clock() - start - assemble)
+    stats.add_time("assemble", assemble)
+    stats.count("rows", rows)
+    stats.count("rows_skipped", skipped)
+
+def _iter_sheet_records(rows, columns):
+    """
+    Yield (row_idx, record) pairs from worksheet value tuples, with the same
+    NaN conventions as _iter_csv_records().
+    """
+    na = float("nan")
+    row_idx = 0
+    for values in rows:
+        if all(v is None for v in values):
             continue
+        record = dict.fromkeys(columns, na)
+        for col, value in zip(columns, values):
+            if value is not None and not (isinstance(value, str) and value in PANDAS_NA_VALUES):
+                record[col] = value
+        yield row_idx, record
+        row_idx += 1
+
+def is_workbook(path):
+    """True if path is an Excel workbook the converter can read."""
+    return Path(path).suffix.lower() == ".xlsx"
+
+def iter_workbook_sheets(xlsx_path):
+    """
+    Yield (sheet title, columns, records) for each worksheet of a workbook.
     
-    # Identify pages that are never referenced as next pages (additional end states)
-    referenced_pages = set()
-    for route in data["routes"]:
-        if route.get("next_page"):
-            referenced_pages.add(route["next_page"])
+    The workbook is opened read-only and rows are read through openpyxl's
+    values-only iterator, so sheets are streamed rather than loaded whole.
+    Each sheet's records must be consumed before moving on to the next sheet.
+    """
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = ["" if h is None else str(h) for h in header]
+            yield sheet.title, columns, _iter_sheet_records(rows, columns)
+    finally:
+        workbook.close()
+
+def _inspect_columns(columns):
+    """Warn about missing required columns; return (has_step, has_next_step)."""
+    # Check for required columns
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        print(f"  Warning: Missing columns: {missing}")
+        print(f"  Available columns: {columns}")
+    
+    # Check for optional columns
+    has_step = "Step" in columns
+    has_next_step = "Next Step" in columns
+    if has_step or has_next_step:
+        print(f"  Found Step/Next Step columns - will include in metadata")
+    return has_step, has_next_step
+
+def build_flow(csv_path, engine="columnar", stats=None):
+    """
+    Parse a CSV file into a Flow.
+    
+    engine selects how rows are parsed: "columnar" (default) runs the cell
+    parsers as whole-column pandas operations, "rows" walks the DataFrame
+    row by row, and "stream" reads the file incrementally with the csv module
+    and spills routes to a temporary file, so memory is bounded by the number
+    of distinct pages and intents rather than the number of rows. All engines
+    build the same flow, except that "stream" keeps numeric cells as written
+    instead of pandas' float formatting (e.g. "1" rather than "1.0").
+    
+    Phase times, row counters and warnings are added to stats (a
+    ConversionStats) if given. Call close() on the returned flow once it is
+    no longer needed.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}' (expected one of {ENGINES})")
+    if stats is None:
+        stats = ConversionStats()
+    
+    # Read CSV
+    if engine == "stream":
+        with stats.phase("read"):
+            columns = _read_csv_header(csv_path)
+        records = _iter_csv_records(csv_path, columns)
+        return _build_flow_from_records(columns, records, {"source_file": os.path.basename(csv_path)}, stats)
+    
+    with stats.phase("read"):
+        df = pd.read_csv(csv_path)
+    has_step, has_next_step = _inspect_columns(list(df.columns))
+    
+    # Output structure
+    flow = Flow(metadata={
+        "source_file": os.path.basename(csv_path),
+        "has_step_info": has_step or has_next_step
+    })
     
-    # Any page not referenced and not the first page might be an end state
-    for page in all_pages:
-        if page not in referenced_pages and page != data["first_page"] and page not in pages_with_routes:
-            if page not in data["end_pages"]:
-                data["end_pages"].append(page)
-                print(f"  Page '{page}' identified as end state (no incoming or outgoing routes)")
+    # Process each row
+    if engine == "columnar":
+        _convert_columnar(df, flow, has_step, has_next_step, stats)
+    else:
+        _convert_rows(df, flow, has_step, has_next_step, stats)
+    
+    _analyze_graph(flow, stats)
+    stats.count("flows")
+    return flow
+
+def _build_flow_from_records(columns, records, metadata, stats):
+    """Build a Flow from (row_idx, record) pairs, spilling routes to disk."""
+    has_step, has_next_step = _inspect_columns(columns)
+    flow = Flow(
+        metadata={**metadata, "has_step_info": has_step or has_next_step},
+        routes=RouteSpill()
+    )
+    try:
+        _convert_records(records, flow, has_step, has_next_step, stats)
+        _analyze_graph(flow, stats)
+    except BaseException:
+        flow.close()
+        raise
+    stats.count("flows")
+    return flow
+
+def _print_summary(source, output_path, flow, stats):
+    """Print the per-flow conversion summary, with its aggregated row diagnostics."""
+    print(f"\n✓ Converted {source} -> {output_path}")
+    print(f"  Pages: {len(flow.pages)} (including {len(flow.end_pages)} end states)")
+    print(f"  Intents: {len(flow.intents)}")
+    print(f"  Routes: {len(flow.routes)}")
+    if flow.webhooks:
+        print(f"  Webhooks: {list(flow.webhooks.keys())[:5]}...")
+    if flow.end_pages:
+        print(f"  End state pages: {', '.join(flow.end_pages.to_list()[:5])}")
+    graph = flow.metadata.get("graph", {})
+    if graph.get("dangling_targets"):
+        targets = list(graph["dangling_targets"])
+        print(f"  Warning: {len(targets)} route target(s) are not pages in this flow: {', '.join(targets[:5])}")
+    if graph.get("unreachable_pages"):
+        pages = graph["unreachable_pages"]
+        print(f"  Warning: {len(pages)} page(s) unreachable from the first page: {', '.join(pages[:5])}")
+    if stats.counters["rows_skipped"]:
+        print(f"  Skipped {stats.counters['rows_skipped']} row(s) without a page name")
+    for line in stats.warning_lines():
+        print(f"  {line}")
+
+def convert_workbook(xlsx_path, output_dir=None, stats=None):
+    """
+    Convert every worksheet of an .xlsx workbook into its own flow.
+    
+    Each sheet with a "Page Name" column is written to
+    output_dir/dialogflow_<workbook>_<sheet>.json (output_dir defaults to the
+    current directory). Returns the list of files written. Sheet statistics
+    are added to stats if given.
+    """
+    print(f"\nProcessing workbook: {xlsx_path}")
+    
+    output_dir = Path(output_dir) if output_dir else Path(".")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = Path(xlsx_path).stem
+    outputs = []
+    used_slugs = set()
+    
+    for index, (title, columns, records) in enumerate(iter_workbook_sheets(xlsx_path), 1):
+        if "Page Name" not in columns:
+            print(f"  Skipping sheet '{title}': no 'Page Name' column")
+            continue
+        
+        print(f"\n  Sheet: {title}")
+        slug = slugify(title) or f"sheet{index}"
+        if slug in used_slugs:
+            slug = f"{slug}_{index}"
+        used_slugs.add(slug)
+        output_path = str(output_dir / f"dialogflow_{stem}_{slug}.json")
+        
+        metadata = {"source_file": os.path.basename(xlsx_path), "sheet": title}
+        sheet_stats = ConversionStats()
+        flow = _build_flow_from_records(columns, records, metadata, sheet_stats)
+        try:
+            with sheet_stats.phase("serialize"):
+                flow.save(output_path)
+        finally:
+            flow.close()
+        
+        _print_summary(f"{xlsx_path} [{title}]", output_path, flow, sheet_stats)
+        if stats is not None:
+            stats.merge(sheet_stats)
+        outputs.append(output_path)
+    
+    if not outputs:
+        print(f"  Warning: No convertible sheets found in {xlsx_path}")
+    return outputs
+
+def find_sheet_files(input_dir):
+    """CSV files and .xlsx workbooks in input_dir, sorted by name."""
+    input_path = Path(input_dir)
+    files = list(input_path.glob("*.csv")) + [
+        f for f in input_path.glob("*.xlsx") if not f.name.startswith("~$")  # Skip Excel lock files
+    ]
+    return sorted(files)
+
+def convert_single_csv(csv_path, output_path=None, engine="columnar", stats=None):
+    """
+    Convert a single CSV file to Dialogflow JSON.
+    
+    See build_flow() for the available engines. An .xlsx workbook is handed
+    to convert_workbook(), with output_path used as the output directory; in
+    that case the list of files written is returned instead of one path.
+    Pass a ConversionStats as stats to collect phase times and counters.
+    """
+    if is_workbook(csv_path):
+        return convert_workbook(csv_path, output_path, stats=stats)
     
-    # Generate output path if not specified
-    if not output_path:
-        base_name = Path(csv_path).stem
-        output_path = f"dialogflow_{base_name}.json"
+    print(f"\nProcessing: {csv_path}")
     
-    # Write JSON
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    file_stats = ConversionStats()
+    flow = build_flow(csv_path, engine=engine, stats=file_stats)
+    try:
+        # Generate output path if not specified
+        if not output_path:
+            base_name = Path(csv_path).stem
+            output_path = f"dialogflow_{base_name}.json"
+        
+        # Write JSON
+        with file_stats.phase("serialize"):
+            flow.save(output_path)
+    finally:
+        flow.close()
     
     # Summary
-    print(f"\n✓ Converted {csv_path} -> {output_path}")
-    print(f"  Pages: {len(data['pages'])} (including {len(data['end_pages'])} end states)")
-    print(f"  Intents: {len(data['intents'])}")
-    print(f"  Routes: {len(data['routes'])}")
-    if data['webhooks']:
-        print(f"  Webhooks: {list(data['webhooks'].keys())[:5]}...")
-    if data["end_pages"]:
-        print(f"  End state pages: {', '.join(data['end_pages'][:5])}")
+    _print_summary(csv_path, output_path, flow, file_stats)
+    if stats is not None:
+        stats.merge(file_stats)
     
     return output_path
 
-def convert_bulk(input_dir, output_dir=None):
-    """Convert all CSV files in a directory."""
+# Name of the conversion cache manifest kept in each JSON output directory
+MANIFEST_NAME = ".conversion_manifest.json"
+
+# Source files whose contents determine the converter output
+CONVERTER_SOURCES = [
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "flow_model.py"),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "flow_graph.py"),
+]
+
+_converter_fingerprint = None
+
+def _file_sha256(path):
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def converter_fingerprint():
+    """
+    Version string for the converter logic: a hash of the converter source
+    files and the pandas version. Any change to either invalidates the cache.
+    """
+    global _converter_fingerprint
+    if _converter_fingerprint is None:
+        digest = hashlib.sha256(pd.__version__.encode())
+        for source in CONVERTER_SOURCES:
+            with open(source, "rb") as f:
+                digest.update(f.read())
+        _converter_fingerprint = digest.hexdigest()[:16]
+    return _converter_fingerprint
+
+class ConversionManifest:
+    """
+    Persistent record of converted files, stored as MANIFEST_NAME in the
+    output directory. Each source file maps to its content hash, the
+    converter fingerprint and engine used, and the hash of every JSON file
+    written from it (one per CSV, one per worksheet for a workbook).
+    
+    Hashes are only recomputed when a file's size or mtime changed since it
+    was recorded, so checking an unchanged tree costs one stat per file.
+    """
+    
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_NAME
+        self.version = converter_fingerprint()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"  Warning: Ignoring unreadable cache manifest {self.path}: {e}")
+    
+    @staticmethod
+    def _stat(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    
+    @classmethod
+    def _matches(cls, path, recorded):
+        """True if the file at path still has the recorded content; refreshes its stat."""
+        if not os.path.exists(path):
+            return False
+        stat = cls._stat(path)
+        if stat != recorded.get("stat"):
+            if _file_sha256(path) != recorded.get("hash"):
+                return False
+            # Content matched; remember the current stat so it is not rehashed next time
+            recorded["stat"] = stat
+        return True
+    
+    @classmethod
+    def _fingerprint(cls, path):
+        return {"hash": _file_sha256(path), "stat": cls._stat(path)}
+    
+    def lookup(self, source, engine):
+        """
+        Return the output paths recorded for source if they are an up-to-date
+        conversion of it, else None.
+        """
+        entry = self.entries.get(Path(source).name)
+        if not entry or not entry.get("outputs"):
+            return None
+        if entry.get("converter_version") != self.version or entry.get("engine") != engine:
+            return None
+        if not self._matches(source, entry["source"]):
+            return None
+        outputs = [str(self.output_dir / name) for name in entry["outputs"]]
+        for path, recorded in zip(outputs, entry["outputs"].values()):
+            if not self._matches(path, recorded):
+                return None
+        return outputs
+    
+    def record(self, source, outputs, engine):
+        """Record a successful conversion of source into the output paths."""
+        self.entries[Path(source).name] = {
+            "source": self._fingerprint(source),
+            "converter_version": self.version,
+            "engine": engine,
+            "outputs": {Path(path).name: self._fingerprint(path) for path in outputs},
+        }
+    
+    def forget(self, source):
+        """Drop the entry for source, e.g. after a failed conversion."""
+        self.entries.pop(Path(source).name, None)
+    
+    def save(self):
+        """Write the manifest atomically."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def resolve_jobs(jobs, task_count):
+    """Turn a jobs setting (a number or "auto") into a worker count for task_count tasks."""
+    if jobs is None:
+        jobs = 1
+    if jobs == "auto":
+        jobs = os.cpu_count() or 1
+    jobs = int(jobs)
+    if jobs < 1:
+        raise ValueError(f"jobs must be a positive integer or 'auto', got {jobs}")
+    return max(1, min(jobs, task_count))
+
+def _convert_job(task, capture=True):
+    """
+    Convert one file, returning (output, error, captured console output,
+    ConversionStats of this file as a dict). Used directly as the process
+    pool worker.
+    """
+    csv_file, output_target, engine = task
+    buffer = io.StringIO()
+    output, error = output_target, None
+    stats = ConversionStats()
+    baseline = parser_cache_stats()
+    with contextlib.redirect_stdout(buffer) if capture else contextlib.nullcontext():
+        try:
+            output = convert_single_csv(csv_file, output_target, engine=engine, stats=stats)
+        except Exception as e:
+            error = str(e)
+    stats.add_parser_cache(add_cache_stats({}, parser_cache_stats(), baseline))
+    return output, error, buffer.getvalue(), stats.to_dict()
+
+def iter_conversions(csv_files, output_dir, engine="columnar", jobs=1, use_cache=True,
+                     stats=None, quiet=False):
+    """
+    Convert csv_files into output_dir, yielding (csv_file, output, error,
+    cached) in input order; error is None on success. output is the JSON path
+    for a CSV and the list of JSON paths for an .xlsx workbook.
+    
+    With use_cache, files whose content, engine and converter version match
+    the ConversionManifest in output_dir (and whose output is intact) are not
+    reconverted and are yielded with cached=True.
+    
+    With more than one job the files are converted in a process pool. Each
+    worker buffers its file's console output, which is printed in one piece
+    when that file's result is yielded, so output never interleaves; with
+    quiet it is not printed at all. Parser caches live per process and
+    persist across files, so a worker converting many similar sheets keeps
+    its hits. If stats is a ConversionStats, every file's phase times,
+    counters, warnings and parser cache counts are added to it.
+    """
+    csv_files = list(csv_files)
+    # Workbooks take the output directory, since they write one file per sheet, and are
+    # always read as a record stream whatever the engine; each task carries the engine that runs
+    tasks = [
+        (str(f), str(output_dir), "stream") if is_workbook(f)
+        else (str(f), str(Path(output_dir) / f"dialogflow_{Path(f).stem}.json"), engine)
+        for f in csv_files
+    ]
+    manifest = ConversionManifest(output_dir) if use_cache else None
+    cached = [manifest.lookup(source, task_engine) if manifest else None for source, _, task_engine in tasks]
+    pending = [task for task, hit in zip(tasks, cached) if hit is None]
+    workers = resolve_jobs(jobs, len(pending))
+    
+    def convert_pending():
+        """Yield _convert_job() results for each pending task, in order."""
+        if workers == 1:
+            for task in pending:
+                yield _convert_job(task, capture=quiet)
+            return
+        chunksize = max(1, len(pending) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_convert_job, pending, chunksize=chunksize)
+    
+    results = convert_pending()
+    try:
+        for csv_file, task, hit in zip(csv_files, tasks, cached):
+            source = task[0]
+            if hit is not None:
+                if stats is not None:
+                    stats.count("cache_hits")
+                yield csv_file, hit if is_workbook(source) else hit[0], None, True
+                continue
+            output, error, console, file_stats = next(results)
+            if not quiet:
+                sys.stdout.write(console)
+            if stats is not None:
+                stats.merge(file_stats)
+            if manifest:
+                if error is None:
+                    manifest.record(source, output if is_workbook(source) else [output], task[2])
+                else:
+                    manifest.forget(source)
+            yield csv_file, output, error, False
+    finally:
+        results.close()
+        if manifest:
+            manifest.save()
+
+def convert_bulk(input_dir, output_dir=None, engine="columnar", jobs=1, use_cache=True,
+                 stats=None, quiet=False, outputs=None):
+    """
+    Convert all CSV files and .xlsx workbooks in a directory.
+    
+    jobs sets how many files are converted in parallel ("auto" uses every core).
+    With use_cache, files unchanged since the last run are skipped. Phase
+    times and counters for the run are collected into stats (a new
+    ConversionStats if not given) and printed with the summary; quiet
+    suppresses the per-file output. If outputs is a list, the JSON path of
+    every flow converted (or unchanged) in this run is appended to it.
+    """
     input_path = Path(input_dir)
     if not input_path.exists():
         raise ValueError(f"Input directory does not exist: {input_dir}")
@@ -439,30 +1068,42 @@ def convert_bulk(input_dir, output_dir=None):
         output_path = input_path / "dialogflow_json"
     output_path.mkdir(exist_ok=True)
     
-    # Find all CSV files
-    csv_files = list(input_path.glob("*.csv"))
+    # Find all CSV files and workbooks
+    csv_files = find_sheet_files(input_path)
     if not csv_files:
-        print(f"No CSV files found in {input_dir}")
+        print(f"No CSV or XLSX files found in {input_dir}")
         return [], []
     
-    print(f"Found {len(csv_files)} CSV files to convert")
+    print(f"Found {len(csv_files)} CSV/XLSX files to convert")
     print("=" * 50)
     
     results = []
     errors = []
+    if stats is None:
+        stats = ConversionStats()
     
-    for csv_file in csv_files:
-        try:
-            output_file = output_path / f"dialogflow_{csv_file.stem}.json"
-            convert_single_csv(str(csv_file), str(output_file))
+    conversions = iter_conversions(csv_files, output_path, engine=engine, jobs=jobs,
+                                   use_cache=use_cache, stats=stats, quiet=quiet)
+    for csv_file, output, error, cached in conversions:
+        if error is None and outputs is not None:
+            outputs.extend(output if isinstance(output, list) else [output])
+        if cached:
+            if not quiet:
+                print(f"\n= Unchanged, skipped {csv_file.name} (cache hit)")
             results.append(csv_file.name)
-        except Exception as e:
-            print(f"✗ Failed to convert {csv_file.name}: {e}")
-            errors.append((csv_file.name, str(e)))
+        elif error is None:
+            results.append(csv_file.name)
+        else:
+            print(f"✗ Failed to convert {csv_file.name}: {error}")
+            errors.append((csv_file.name, error))
     
     # Summary
     print("\n" + "=" * 50)
     print(f"Conversion complete: {len(results)}/{len(csv_files)} successful")
+    if use_cache:
+        print(f"Cache hits: {stats.counters['cache_hits']}/{len(csv_files)}")
+    for line in stats.summary_lines():
+        print(line)
     if errors:
         print("\nFailed conversions:")
         for file, error in errors:
@@ -472,17 +1113,50 @@ def convert_bulk(input_dir, output_dir=None):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convert CSV files to Dialogflow JSON format")
-    parser.add_argument("input", help="CSV file or directory containing CSV files")
+    parser.add_argument("input", help="CSV/XLSX file or directory containing CSV/XLSX files")
     parser.add_argument("--output", help="Output JSON file or directory")
     parser.add_argument("--bulk", action="store_true", help="Process all CSV files in directory")
+    parser.add_argument("--engine", choices=ENGINES, default="columnar",
+                        help="Row parsing engine; 'stream' converts in bounded memory (default: columnar)")
+    parser.add_argument("--jobs", default="1",
+                        help="Files to convert in parallel in bulk mode, or 'auto' for one per core (default: 1)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Reconvert every file in bulk mode, ignoring the conversion cache")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Only print the bulk summary, not per-file output")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print phase timings and counters after a single-file conversion")
+    parser.add_argument("--bundle", metavar="BUNDLE_ZIP",
+                        help="Also write the converted flows as a Dialogflow CX agent export bundle")
+    parser.add_argument("--dispatcher-url", help="Dispatcher webhook URL for --bundle")
+    parser.add_argument("--dispatcher-header", help="Optional header for the dispatcher in --bundle (format: Key=Value)")
     
     args = parser.parse_args()
     
     try:
         if args.bulk or os.path.isdir(args.input):
-            convert_bulk(args.input, args.output)
+            # Only this run's flows: the output directory may hold stale files of renamed or deleted sheets
+            json_files = []
+            convert_bulk(args.input, args.output, engine=args.engine, jobs=args.jobs,
+                         use_cache=not args.no_cache, quiet=args.quiet, outputs=json_files)
         else:
-            convert_single_csv(args.input, args.output)
+            stats = ConversionStats() if args.stats else None
+            with contextlib.redirect_stdout(io.StringIO()) if args.quiet else contextlib.nullcontext():
+                output = convert_single_csv(args.input, args.output, engine=args.engine, stats=stats)
+            if stats:
+                print("\n".join(stats.summary_lines()))
+            json_files = output if isinstance(output, list) else [output]
+        
+        if args.bundle:
+            from agent_bundle import export_flows
+            problems = export_flows(json_files, args.bundle, args.dispatcher_url, args.dispatcher_header)
+            if problems:
+                print(f"\nAgent bundle not written, {len(problems)} problem(s):")
+                for problem in problems[:20]:
+                    print(f"  - {problem}")
+                sys.exit(1)
+            else:
+                print(f"\nAgent bundle written to {args.bundle} ({len(json_files)} flows)")
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Page transition graph of a converted flow.
+
+FlowGraph indexes a Flow's routes as an adjacency list once, then answers
+structural questions (reachability, dangling targets, cycles, terminal
+pages) in O(V+E). The converter records the results in the flow metadata
+and the uploader uses them to reject broken flows before any API calls.
+"""
+
+# Page names treated as entry points in addition to the flow's first page
+START_PAGE_NAMES = {"startpage", "start_page", "start"}
+
+class FlowGraph:
+    """Adjacency-list index of the transitions between a flow's pages."""
+
+    def __init__(self, pages, first_page=None):
+        self.first_page = first_page
+        # Insertion-ordered dicts keep every result in sheet order
+        self.successors = {page: {} for page in pages}
+        self.in_degree = dict.fromkeys(pages, 0)
+        self.dangling = {}  # target -> {source page: None}
+
+    @classmethod
+    def from_flow(cls, flow):
+        """Build the graph from a Flow's pages and routes in one pass over the routes."""
+        graph = cls(flow.pages, flow.first_page)
+        for route in flow.routes:
+            if route.next_page:
+                graph.add_edge(route.page, route.next_page)
+        return graph
+
+    def add_edge(self, page, target):
+        """Record a transition; targets that are not pages are tracked as dangling."""
+        successors = self.successors.setdefault(page, {})
+        self.in_degree.setdefault(page, 0)
+        if target in successors:
+            return
+        successors[target] = None
+        if target in self.in_degree:
+            self.in_degree[target] += 1
+        else:
+            self.dangling.setdefault(target, {})[page] = None
+
+    def _page_successors(self, page):
+        return [t for t in self.successors[page] if t in self.successors]
+
+    def roots(self):
+        """Entry pages: the first page plus any StartPage-style pages."""
+        roots = [self.first_page] if self.first_page in self.successors else []
+        roots.extend(p for p in self.successors if p.lower() in START_PAGE_NAMES and p != self.first_page)
+        return roots
+
+    def reachable(self):
+        """Pages reachable from the entry pages (breadth-first)."""
+        seen = dict.fromkeys(self.roots())
+        queue = list(seen)
+        for page in queue:
+            for target in self._page_successors(page):
+                if target not in seen:
+                    seen[target] = None
+                    queue.append(target)
+        return list(seen)
+
+    def unreachable_pages(self):
+        """Pages that no path from an entry page leads to."""
+        if not self.roots():
+            return []
+        reachable = set(self.reachable())
+        return [p for p in self.successors if p not in reachable]
+
+    def terminal_pages(self):
+        """Pages without outgoing transitions."""
+        return [p for p, targets in self.successors.items() if not targets]
+
+    def isolated_pages(self):
+        """Pages with neither incoming nor outgoing transitions."""
+        return [p for p, targets in self.successors.items() if not targets and not self.in_degree[p]]
+
+    def dangling_targets(self):
+        """Transition targets that are not pages in this flow, with the pages pointing at them."""
+        return {target: list(sources) for target, sources in self.dangling.items()}
+
+    def cycles(self):
+        """
+        Strongly connected components that contain a cycle (Tarjan's
+        algorithm, iterative so large flows do not hit the recursion limit).
+        """
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        cycles = []
+        counter = 0
+
+        for root in self.successors:
+            if root in index:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._page_successors(root)))]
+
+            while work:
+                node, targets = work[-1]
+                descended = False
+                for target in targets:
+                    if target not in index:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(self._page_successors(target))))
+                        descended = True
+                        break
+                    if target in on_stack:
+                        low[node] = min(low[node], index[target])
+                if descended:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        page = stack.pop()
+                        on_stack.discard(page)
+                        component.append(page)
+                        if page == node:
+                            break
+                    if len(component) > 1 or node in self.successors[node]:
+                        cycles.append(component[::-1])
+        return cycles
+
+    def analysis(self):
+        """Summary of the graph for the flow metadata."""
+        return {
+            "reachable_count": len(self.reachable()),
+            "unreachable_pages": self.unreachable_pages(),
+            "dangling_targets": self.dangling_targets(),
+            "cycles": self.cycles(),
+            "terminal_pages": self.terminal_pages()
+        }
@@ -0,0 +1,256 @@
+"""
+Intermediate representation of a converted flow.
+
+csv_to_dialogflow_json builds a Flow from sheet rows and upload_to_dialogflow
+consumes it directly; the dialogflow_*.json files are one serialization of it.
+"""
+
+import json
+import tempfile
+
+class OrderedSet:
+    """Insertion-ordered set backed by a dict, for O(1) dedup of prompts, chips and phrases."""
+    __slots__ = ("_items",)
+
+    def __init__(self, items=()):
+        self._items = dict.fromkeys(items)
+
+    def add(self, item):
+        """Add item if not already present; returns True if it was added."""
+        if item in self._items:
+            return False
+        self._items[item] = None
+        return True
+
+    def update(self, items):
+        for item in items:
+            self._items[item] = None
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return f"OrderedSet({list(self._items)!r})"
+
+    def to_list(self):
+        return list(self._items)
+
+class Page:
+    """A page with its entry prompts, suggestion chips and sheet metadata."""
+    __slots__ = ("name", "prompts", "chips", "metadata")
+
+    def __init__(self, name, prompts=(), chips=(), metadata=None):
+        self.name = name
+        self.prompts = OrderedSet(prompts)
+        self.chips = OrderedSet(chips)
+        self.metadata = metadata if metadata is not None else {}
+
+    def to_dict(self):
+        return {"prompts": self.prompts.to_list(), "chips": self.chips.to_list(), "metadata": self.metadata}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(name, data.get("prompts", []), data.get("chips", []), data.get("metadata", {}))
+
+class Intent:
+    """An intent and its training phrases."""
+    __slots__ = ("name", "training_phrases")
+
+    def __init__(self, name, training_phrases=()):
+        self.name = name
+        self.training_phrases = OrderedSet(training_phrases)
+
+    def to_dict(self):
+        return {"training_phrases": self.training_phrases.to_list()}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(name, data.get("training_phrases", []))
+
+class Route:
+    """A transition from a page to next_page when intent matches."""
+    __slots__ = ("page", "intent", "next_page", "webhook_action", "parameters")
+
+    def __init__(self, page, intent, next_page, webhook_action=None, parameters=None):
+        self.page = page
+        self.intent = intent
+        self.next_page = next_page
+        self.webhook_action = webhook_action
+        self.parameters = parameters
+
+    def to_dict(self):
+        return {
+            "page": self.page,
+            "intent": self.intent,
+            "next_page": self.next_page,
+            "webhook_action": self.webhook_action,
+            "parameters": self.parameters
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("page"), data.get("intent"), data.get("next_page"),
+                   data.get("webhook_action"), data.get("parameters"))
+
+class Webhook:
+    """A webhook tag and the plain-English action it was generated from."""
+    __slots__ = ("tag", "action")
+
+    def __init__(self, tag, action):
+        self.tag = tag
+        self.action = action
+
+class RouteSpill:
+    """
+    Append-only route collection backed by a temporary file, so flows with
+    millions of routes do not hold them all in memory. Iterating yields Routes
+    read back from disk.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile("w+", encoding="utf-8", newline="")
+        self._count = 0
+
+    def append(self, route):
+        self._file.write(json.dumps(route.to_dict(), ensure_ascii=False))
+        self._file.write("\n")
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self._file.flush()
+        self._file.seek(0)
+        for line in self._file:
+            yield Route.from_dict(json.loads(line))
+
+    def close(self):
+        self._file.close()
+
+def _dump_nested(value, indent):
+    """json.dumps(indent=2) output re-indented to sit at the given depth."""
+    return json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n" + indent)
+
+class Flow:
+    """
+    A converted flow: pages, intents, routes and webhooks keyed by display
+    name, plus end-state pages, the first page and source metadata.
+    """
+    __slots__ = ("pages", "intents", "routes", "end_pages", "first_page", "webhooks", "metadata")
+
+    def __init__(self, metadata=None, routes=None):
+        self.pages = {}
+        self.intents = {}
+        self.routes = routes if routes is not None else []
+        self.end_pages = OrderedSet()
+        self.first_page = None
+        self.webhooks = {}
+        self.metadata = metadata if metadata is not None else {}
+
+    def page(self, name):
+        """Get the named page, creating it if needed."""
+        page = self.pages.get(name)
+        if page is None:
+            page = self.pages[name] = Page(name)
+        return page
+
+    def intent(self, name):
+        """Get the named intent, creating it if needed."""
+        intent = self.intents.get(name)
+        if intent is None:
+            intent = self.intents[name] = Intent(name)
+        return intent
+
+    def add_webhook(self, tag, action):
+        self.webhooks[tag] = Webhook(tag, action)
+
+    def close(self):
+        """Release any temporary storage held by the route collection."""
+        if isinstance(self.routes, RouteSpill):
+            self.routes.close()
+
+    def _sections(self):
+        """Top-level JSON members; containers may still hold model objects."""
+        return {
+            "pages": self.pages,
+            "intents": self.intents,
+            "routes": self.routes,
+            "end_pages": self.end_pages.to_list(),
+            "first_page": self.first_page,
+            "webhooks": {tag: hook.action for tag, hook in self.webhooks.items()},
+            "metadata": self.metadata
+        }
+
+    def to_dict(self):
+        """The flow in the dialogflow_*.json layout."""
+        data = self._sections()
+        data["pages"] = {name: page.to_dict() for name, page in self.pages.items()}
+        data["intents"] = {name: intent.to_dict() for name, intent in self.intents.items()}
+        data["routes"] = [route.to_dict() for route in self.routes]
+        return data
+
+    def write_json(self, f):
+        """
+        Write the flow exactly as json.dump(self.to_dict(), f, indent=2,
+        ensure_ascii=False) would, but serialize one item at a time so the
+        document never exists as a single string and spilled routes stream
+        from disk.
+        """
+        sections = self._sections()
+        f.write("{")
+        for n, (key, value) in enumerate(sections.items()):
+            f.write(",\n  " if n else "\n  ")
+            f.write(json.dumps(key, ensure_ascii=False) + ": ")
+
+            if isinstance(value, dict):
+                items = ((json.dumps(k, ensure_ascii=False) + ": ", v) for k, v in value.items())
+                brackets = "{}"
+            elif isinstance(value, (list, RouteSpill)):
+                items = (("", v) for v in value)
+                brackets = "[]"
+            else:
+                f.write(_dump_nested(value, "  "))
+                continue
+
+            if not len(value):
+                f.write(brackets)
+                continue
+            f.write(brackets[0])
+            for i, (prefix, item) in enumerate(items):
+                if hasattr(item, "to_dict"):
+                    item = item.to_dict()
+                f.write(",\n    " if i else "\n    ")
+                f.write(prefix + _dump_nested(item, "    "))
+            f.write("\n  " + brackets[1])
+        f.write("\n}")
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            self.write_json(f)
+
+    @classmethod
+    def from_dict(cls, data):
+        flow = cls(metadata=data.get("metadata", {}))
+        for name, info in data.get("pages", {}).items():
+            flow.pages[name] = Page.from_dict(name, info)
+        for name, info in data.get("intents", {}).items():
+            flow.intents[name] = Intent.from_dict(name, info)
+        flow.routes = [Route.from_dict(r) for r in data.get("routes", [])]
+        flow.end_pages = OrderedSet(data.get("end_pages", []))
+        flow.first_page = data.get("first_page")
+        for tag, action in data.get("webhooks", {}).items():
+            flow.add_webhook(tag, action)
+        return flow
+
+    @classmethod
+    def load(cls, path):
+        """Load a flow from a dialogflow_*.json file."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,82 @@
+"""
+Dependency graph of one flow's upload operations.
+
+An OperationGraph holds operations (callables) and, for each, the
+operations that must finish before it starts. run() starts every operation
+as soon as its dependencies are done, on a thread pool. A flow's pages and
+intents are written together, and each page's routes are patched as soon
+as that page, its target pages and its intents exist, rather than after
+every page and intent of the flow. Requests still wait on the uploader's
+shared rate limiter, so more workers never exceed the quota.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Iterable
+
+class OperationGraph:
+    """Operations keyed by any hashable, added after the operations they depend on."""
+
+    def __init__(self):
+        self.operations = {}  # key -> (callable, dependency keys), in insertion order
+        self.results = {}
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.operations
+
+    def add(self, key: Hashable, operation: Callable[[], Any], deps: Iterable[Hashable] = ()) -> Hashable:
+        """Add an operation; its dependencies must already be in the graph, so it stays acyclic."""
+        deps = set(deps)
+        unknown = [dep for dep in deps if dep not in self.operations]
+        if key in self.operations or unknown:
+            raise ValueError(f"Cannot add {key!r}: " + (f"unknown dependencies {unknown}" if unknown else "duplicate key"))
+        self.operations[key] = (operation, deps)
+        return key
+
+    def depth(self) -> int:
+        """Operations on the longest dependency chain: the rounds of calls run() needs at best."""
+        depths = {}
+        for key, (_, deps) in self.operations.items():
+            depths[key] = 1 + max((depths[dep] for dep in deps), default=0)
+        return max(depths.values(), default=0)
+
+    def run(self, max_workers: int = 1) -> Dict[Hashable, Any]:
+        """
+        Run every operation once its dependencies have finished, up to
+        max_workers at a time; with one worker, in insertion order on the
+        calling thread. Once an operation fails, no more are started; those
+        running finish and the first error is raised. Returns the results by key.
+        """
+        if max_workers <= 1:
+            for key, (operation, _) in self.operations.items():
+                self.results[key] = operation()
+            return self.results
+
+        waiting = {key: set(deps) for key, (_, deps) in self.operations.items()}
+        dependents = {key: [] for key in self.operations}
+        for key, deps in waiting.items():
+            for dep in deps:
+                dependents[dep].append(key)
+        error = None
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="operation") as pool:
+            running = {pool.submit(operation): key
+                       for key, (operation, deps) in self.operations.items() if not deps}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    self.results[key] = future.result()
+                    if error is not None:
+                        continue
+                    for dependent in dependents[key]:
+                        waiting[dependent].discard(key)
+                        if not waiting[dependent]:
+                            running[pool.submit(self.operations[dependent][0])] = dependent
+        if error is not None:
+            raise error
+        return self.results
@@ -0,0 +1,143 @@
+"""
+Request rate limiting for the Dialogflow uploader.
+
+A single RateLimiter is shared by every thread of an uploader, so the total
+request rate stays within the API quota however many flows upload at once.
+A throttled response's Retry-After pauses the whole limiter, not just the
+caller that got it. AdaptiveRateLimiter (the uploader's default) also
+adjusts the rate to the quota the API actually grants: additive increase
+while requests succeed, multiplicative decrease on 429 and 503 responses.
+"""
+
+import asyncio
+import email.utils
+import math
+import threading
+import time
+from typing import Optional
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait per a Retry-After header (delay-seconds or HTTP-date); None if absent or invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: up to `rate` requests per second on average,
+    with bursts of up to `burst` requests. A rate of None or 0 disables limiting.
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[int] = None):
+        self.rate = rate or None
+        self.capacity = float(burst or max(1, int(rate or 1)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.saturated = False  # Whether the last caller had to wait for a token
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        # No tokens accrue while paused
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+            self.updated = now
+
+    def _reserve(self) -> float:
+        """Claim one token and return how long the caller must wait before using it."""
+        now = time.monotonic()
+        if not self.rate and now >= self.paused_until:
+            return 0.0
+        with self.lock:
+            hold = max(0.0, self.paused_until - now)
+            if not self.rate:
+                return hold
+            self._refill(now)
+            # Claim the token now, even if that leaves the bucket in debt; the
+            # debt is the time this caller has to wait, so waiters queue fairly
+            self.tokens -= 1
+            debt = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.saturated = debt > 0
+            return hold + debt
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the seconds waited."""
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """acquire() for coroutines: waits without blocking the event loop."""
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _pause(self, now: float, seconds: float):
+        """Hold every caller for seconds, without a burst of saved-up tokens afterwards."""
+        if self.rate:
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def succeeded(self):
+        """Report a response that was not throttled."""
+
+    def throttled(self, retry_after: Optional[float] = None, sent_at: Optional[float] = None) -> Optional[float]:
+        """
+        Report a throttled (429/503) response to a request sent at sent_at
+        (time.monotonic()). A retry_after pauses all callers that long.
+        Returns the new rate if it was lowered.
+        """
+        if retry_after:
+            with self.lock:
+                self._pause(time.monotonic(), retry_after)
+        return None
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    RateLimiter whose rate follows the quota (AIMD). While callers are
+    waiting on the bucket and requests succeed, the rate grows by about
+    `increase` requests/second for every second of such traffic. Each
+    throttled response cuts it by the factor `decrease`, once per round:
+    responses to requests sent before the last cut do not cut it again.
+    The rate stays between min_rate and max_rate (None for no ceiling).
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[int] = None, min_rate: float = 0.5,
+                 max_rate: Optional[float] = None, increase: float = 1.0, decrease: float = 0.5):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or math.inf
+        self.increase = increase
+        self.decrease = decrease
+        self.last_cut = -math.inf
+
+    def succeeded(self):
+        # Only a rate that is actually holding callers back needs to grow
+        if not self.rate or not self.saturated:
+            return
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def throttled(self, retry_after: Optional[float] = None, sent_at: Optional[float] = None) -> Optional[float]:
+        with self.lock:
+            now = time.monotonic()
+            if retry_after:
+                self._pause(now, retry_after)
+            if not self.rate or (sent_at is not None and sent_at < self.last_cut):
+                return None
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.last_cut = now
+            return self.rate
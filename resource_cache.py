@@ -0,0 +1,67 @@
+"""
+Persistent resource-name cache for the Dialogflow uploader.
+
+Stores each agent's index of display names to resource names (flows,
+intents, webhooks, and pages per flow) in a JSON file, so a later run can
+start from it instead of listing the whole agent again. Next to the index
+is the upload ledger: a hash of the last value written to each field of
+each resource, so identical writes can be skipped without reading anything
+back. Entries are keyed by the agent's API URL, so one file can serve
+several agents.
+
+The uploader does not trust the cache blindly: on a warm start it relists
+the small collections (flows and webhooks), drops the pages of flows that
+no longer exist, and evicts any intent or page entry that answers 404.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# Default cache file, kept in the working directory
+CACHE_NAME = ".dialogflow_cache.json"
+
+class ResourceCache:
+    """Per-agent display name -> resource name index, persisted as JSON."""
+
+    def __init__(self, path: str = CACHE_NAME):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.agents = self._read()
+
+    def _read(self) -> Dict[str, Dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("agents", {})
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"  Warning: Ignoring unreadable resource cache {self.path}: {e}")
+            return {}
+
+    def load(self, agent: str) -> Optional[Dict]:
+        """The saved index for agent, or None."""
+        with self.lock:
+            entry = self.agents.get(agent)
+            return json.loads(json.dumps(entry["index"])) if entry else None
+
+    def load_ledger(self, agent: str) -> Dict[str, str]:
+        """The saved upload ledger for agent ("resource:field" -> payload hash)."""
+        with self.lock:
+            return dict(self.agents.get(agent, {}).get("ledger", {}))
+
+    def store(self, agent: str, index: Dict, ledger: Optional[Dict[str, str]] = None):
+        """Replace the saved index and ledger for agent and write the file."""
+        with self.lock:
+            # Keep other agents' entries written by other processes since we read the file
+            agents = self._read()
+            agents[agent] = {"saved": time.time(), "index": index, "ledger": ledger or {}}
+            self.agents = agents
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"agents": agents}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
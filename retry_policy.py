@@ -0,0 +1,93 @@
+"""
+Retry policies for the Dialogflow uploader.
+
+Each kind of operation (list, create, patch, delete; see operation_kind)
+has a RetryPolicy: how many attempts a transient failure (5xx, timeout,
+dropped connection) gets, and the jittered exponential backoff between
+them. Throttled responses (429, or 503 with Retry-After) are different: the
+rate limiter already holds every caller for Retry-After, so waiting them
+out does not use up attempts, up to max_throttled times.
+
+Creates are not idempotent: a POST that timed out may still have created
+the resource, and sending it again would fail with 409 or, for resources
+without unique display names, duplicate it. Their ambiguous failures raise
+UncertainWrite instead of being retried, and the uploader looks the
+resource up before creating it again.
+
+A RetryBudget shared by all requests of an uploader caps retries at a
+fraction of the traffic, so an outage fails fast instead of multiplying
+the load with retries.
+"""
+
+import random
+import threading
+
+class UncertainWrite(Exception):
+    """A non-idempotent request failed in a way that leaves open whether it was applied."""
+
+class RetryPolicy:
+    """Retry rules for one kind of operation."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 idempotent: bool = True, max_throttled: int = 20):
+        """
+        A transient failure is tried up to max_attempts times in all, waiting
+        a random time up to base_delay * 2**(retry - 1) (at most max_delay)
+        before each retry ("full jitter", so callers that failed together do
+        not retry together). Up to max_throttled throttled responses are
+        waited out on top of that.
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idempotent = idempotent
+        self.max_throttled = max_throttled
+
+    def backoff(self, retry: int) -> float:
+        """Seconds to wait before the retry-th retry (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+# Listing and reading can always be repeated; a field-masked PATCH writes the
+# same value again; a repeated DELETE finds nothing to delete (404)
+DEFAULT_POLICIES = {
+    'list': RetryPolicy(max_attempts=5),
+    'create': RetryPolicy(max_attempts=3, idempotent=False),
+    'patch': RetryPolicy(max_attempts=4),
+    'delete': RetryPolicy(max_attempts=4),
+}
+
+# Server errors worth retrying; other statuses will not change on retry
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+
+def operation_kind(method: str) -> str:
+    """Policy key for an HTTP method; unknown methods are treated as creates."""
+    return {'GET': 'list', 'POST': 'create', 'PATCH': 'patch', 'DELETE': 'delete'}.get(method.upper(), 'create')
+
+class RetryBudget:
+    """
+    Thread-safe retry allowance shared by an uploader's requests. Every
+    request adds `ratio` of a retry and every retry spends one, with at most
+    `reserve` saved up (and available from the start): over time, retries
+    stay within ratio of the requests sent, plus a burst of reserve.
+    """
+
+    def __init__(self, ratio: float = 0.1, reserve: float = 20):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = float(reserve)
+        self.exhausted = 0  # Retries refused
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        """Account for one request."""
+        with self.lock:
+            self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Spend one retry; False (and no retry) if the budget is used up."""
+        with self.lock:
+            if self.balance < 1:
+                self.exhausted += 1
+                return False
+            self.balance -= 1
+            return True
@@ -0,0 +1,49 @@
+"""
+Canonical resource state for diff-based uploads.
+
+The uploader writes a few fields of each resource with field-masked PATCH
+calls. To tell whether a write would change anything, both the local
+payload and the state read back from the API are reduced to one canonical
+form per field: server-assigned ids are dropped, as are empty and default
+values (the API omits those from responses), and the rest is serialized as
+sorted-key JSON. Two payloads with equal canonical forms are the same
+configuration. The upload ledger keeps hashes of these canonical forms.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict
+
+# Fields the uploader manages, per collection; everything else is left alone
+MANAGED_FIELDS = {
+    "flows": ("transitionRoutes",),
+    "pages": ("entryFulfillment", "transitionRoutes"),
+    "intents": ("trainingPhrases",),
+}
+
+# Keys the server assigns inside managed fields (route and training phrase ids)
+SERVER_KEYS = {"name", "id"}
+
+def _strip(value: Any) -> Any:
+    """Drop server-assigned keys and empty or default values, recursively."""
+    if isinstance(value, dict):
+        stripped = {k: _strip(v) for k, v in value.items() if k not in SERVER_KEYS}
+        return {k: v for k, v in stripped.items() if v not in (None, "", [], {}, False, 0)}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    return value
+
+def canonical(value: Any) -> str:
+    """Canonical form of one field's value; missing and empty values compare equal."""
+    stripped = _strip(value)
+    if stripped in (None, "", [], {}):
+        stripped = None
+    return json.dumps(stripped, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def payload_hash(value_key: str) -> str:
+    """Hash of a canonical value, as kept in the upload ledger."""
+    return hashlib.sha256(value_key.encode("utf-8")).hexdigest()
+
+def snapshot(kind: str, resource: Dict) -> Dict[str, str]:
+    """Canonical form of each managed field of a resource of the given collection."""
+    return {field: canonical(resource.get(field)) for field in MANAGED_FIELDS[kind]}
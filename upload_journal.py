@@ -0,0 +1,105 @@
+"""
+Checkpoint journal for resumable uploads.
+
+An UploadJournal is an append-only JSON Lines file of the upload operations
+that completed: flow created, webhook created, page and intent upserted,
+page routes patched, start route set, and flow finished. Each entry holds
+the resource name and, for writes, the hash of the value written. Lines are
+flushed as they are written, so a run that is killed or crashes keeps every
+operation that finished before it.
+
+A resumed run (--resume) replays the journal into the uploader: resource
+names go into its index and written values into its upload ledger, so
+finished operations are skipped without API calls, and flows that finished
+(with unchanged files) are not uploaded again. Every operation is an
+upsert, so work done but not yet journaled when the run died is simply
+redone.
+"""
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_NAME = ".dialogflow_journal.jsonl"
+JOURNAL_VERSION = 1
+
+class UploadJournal:
+    """Thread-safe append-only journal of one agent's completed upload operations."""
+
+    def __init__(self, path: str, agent: str, resume: bool = False):
+        """
+        Journal at path for the agent (its base URL). With resume, the
+        entries of an earlier run against the same agent are loaded into
+        self.entries and new ones are appended; otherwise the journal starts
+        over. The file is not touched until the first record().
+        """
+        self.path = Path(path)
+        self.agent = agent
+        self.lock = threading.Lock()
+        self.torn = False  # Whether the file ends in a line cut short
+        self.entries = self._read() if resume else []
+        self.file = None  # Opened by the first record(), so a run that records nothing keeps the old journal
+        self.closed = False
+        if resume and not self.entries:
+            logger.warning(f"Nothing to resume from {self.path}; uploading everything")
+        if self.entries:
+            logger.info(f"Resuming from {self.path}: {len(self.entries)} completed operations")
+
+    def _read(self) -> List[Dict]:
+        """Entries of the journal file for this agent; [] if there is none or it is for another agent."""
+        try:
+            text = self.path.read_text(encoding="utf-8")
+        except OSError:
+            return []
+        self.torn = bool(text) and not text.endswith("\n")
+        lines = text.splitlines()
+        entries = []
+        for number, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Only the last line can be cut short by a crash
+                if number != len(lines) - 1:
+                    logger.warning(f"Skipping unreadable line {number + 1} of {self.path}")
+                continue
+            if number == 0:
+                if entry.get("journal") != JOURNAL_VERSION or entry.get("agent") != self.agent:
+                    logger.warning(f"{self.path} is for another agent or version; not resuming")
+                    return []
+                continue
+            entries.append(entry)
+        return entries
+
+    def _write(self, entry: Dict):
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def _open(self):
+        """Append to the journal being resumed, or start it over."""
+        if self.entries:
+            self.file = open(self.path, "a", encoding="utf-8")
+            if self.torn:
+                self.file.write("\n")
+        else:
+            self.file = open(self.path, "w", encoding="utf-8")
+            self._write({"journal": JOURNAL_VERSION, "agent": self.agent})
+
+    def record(self, op: str, name: str, **fields):
+        """Append a completed operation on the resource name; fields with None values are left out."""
+        entry = {"op": op, "name": name, **{k: v for k, v in fields.items() if v is not None}}
+        with self.lock:
+            if self.closed:
+                return
+            if self.file is None:
+                self._open()
+            self._write(entry)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if self.file is not None:
+                self.file.close()
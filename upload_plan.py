@@ -0,0 +1,295 @@
+"""
+Dry-run planning for Dialogflow uploads.
+
+PlanningUploader runs the uploader's own upload code against a recorder
+instead of the API, so a plan holds exactly the calls an upload would make:
+the same index listings, upserts, route patches and ledger skips. Listings
+are answered from the resource cache (an empty agent without one), and each
+resource the plan creates gets a placeholder id, {{ref:N}}, where N is the
+number of the POST creating it (e.g. .../flows/{{ref:3}}/pages/{{ref:7}}).
+execute_plan later sends the recorded calls in order and substitutes the
+real ids as resources are created.
+
+    python upload_to_dialogflow.py ... --json-dir out --plan plan.json
+    python upload_to_dialogflow.py ... --execute-plan plan.json
+"""
+
+import json
+import logging
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from upload_to_dialogflow import DialogflowUploader, logger
+
+PLAN_VERSION = 1
+
+# Stands in for the id of a resource created by operation N
+PLACEHOLDER = re.compile(r"\{\{ref:(\d+)\}\}")
+
+class _PlannedResponse:
+    """The part of requests.Response the uploader uses."""
+
+    def __init__(self, data: Dict):
+        self.data = data
+
+    def json(self) -> Dict:
+        return self.data
+
+class PlanningUploader(DialogflowUploader):
+    """DialogflowUploader that records API calls instead of sending them."""
+
+    def __init__(self, *args, **kwargs):
+        """
+        Takes the DialogflowUploader arguments. No credentials are loaded and
+        no requests are sent; rate_limit, max_workers and ops_per_flow are
+        only recorded for the time estimate (operations are planned in
+        order). sync is not supported, since it needs to read the agent.
+        """
+        self.planned_rate = kwargs.get("rate_limit", 10.0)
+        self.planned_ops_per_flow = kwargs.get("ops_per_flow", 8)
+        kwargs.update(rate_limit=None, sync=False, ops_per_flow=1)
+        super().__init__(*args, **kwargs)
+        self.operations = []
+        self.setup = []
+        self.flows = []
+        self._current = self.setup
+        self._ops_lock = threading.Lock()
+        self._saved = self._saved_index() or {}
+
+    def _auth_headers(self) -> Dict[str, str]:
+        return {'Content-Type': 'application/json'}
+
+    def save_index(self):
+        """Planned names are placeholders; never write them to the resource cache."""
+
+    def _listing(self, path: str) -> List[Dict]:
+        """What a list call is assumed to return: the saved index, or nothing."""
+        agent = self._flow_resource(self.base_url)
+        parent, _, collection = path.rpartition("/")
+        if collection == "pages":
+            names = self._saved.get("pages", {}).get(parent, {})
+        elif parent == agent:
+            names = self._saved.get(collection, {})
+        else:
+            names = {}
+        return [{"displayName": display_name, "name": name} for display_name, name in names.items()]
+
+    def _api_request(self, method: str, url: str, params: Optional[Dict] = None,
+                     json: Optional[Any] = None, **kwargs) -> _PlannedResponse:
+        path = self._flow_resource(url)
+        with self._ops_lock:
+            op = {"id": len(self.operations), "method": method, "path": path}
+            if params:
+                op["params"] = {k: v for k, v in params.items() if k != "pageToken"}
+            if json is not None:
+                op["body"] = json
+            self.operations.append(op)
+            self._current.append(op)
+
+        if method == "GET":
+            return _PlannedResponse({path.rpartition("/")[2]: self._listing(path)})
+        if method == "POST":
+            return _PlannedResponse(dict(json or {}, name=f"{path}/{{{{ref:{op['id']}}}}}"))
+        return _PlannedResponse({})
+
+    def plan(self, json_files: Iterable, flow_name: Optional[str] = None) -> Dict:
+        """
+        Plan the upload of json_files (flow_name only applies to a single
+        file). Returns the plan as a JSON-serializable dict.
+        """
+        json_files = [str(f) for f in json_files]
+        # Per-call progress messages would read as if the upload had happened
+        level = logger.level
+        logger.setLevel(logging.WARNING)
+        try:
+            self.merge_shared_intents(json_files)
+            if json_files:
+                self.load_index()
+            for json_file in json_files:
+                entry = {"file": json_file, "flow": None, "operations": []}
+                self._current = entry["operations"]
+                success, result = self.upload_single_flow(json_file, flow_name)
+                if success:
+                    entry["flow"] = result
+                else:
+                    entry["error"] = result
+                self.flows.append(entry)
+        finally:
+            self._current = self.setup
+            logger.setLevel(level)
+
+        return {
+            "version": PLAN_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "agent": self._flow_resource(self.base_url),
+            "assumes_cache": bool(self._saved),
+            "settings": {"rate_limit": self.planned_rate, "max_workers": self.max_workers,
+                         "ops_per_flow": self.planned_ops_per_flow, "force": self.force, "prune": self.prune},
+            "setup": self.setup,
+            "flows": self.flows,
+            # Index and ledger as they will be once the plan has run
+            "index": self.cache,
+            "ledger": self.ledger,
+        }
+
+def write_plan(plan: Dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+
+def load_plan(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version {plan.get('version')} in {path}")
+    return plan
+
+def plan_operations(plan: Dict) -> Iterator[Dict]:
+    """Every operation of the plan, in order."""
+    yield from plan["setup"]
+    for flow in plan["flows"]:
+        yield from flow["operations"]
+
+def endpoint(op: Dict, agent: str) -> str:
+    """Method and endpoint pattern of an operation, e.g. 'PATCH flows/*/pages/* [transitionRoutes]'."""
+    path = op["path"][len(agent) + 1:] if op["path"].startswith(agent + "/") else op["path"]
+    parts = [part if i % 2 == 0 else "*" for i, part in enumerate(path.split("/"))]
+    label = f"{op['method']} {'/'.join(parts)}"
+    mask = op.get("params", {}).get("updateMask")
+    return f"{label} [{mask}]" if mask else label
+
+def estimate_seconds(plan: Dict, rate: Optional[float], workers: int, latency_ms: float) -> Dict[str, float]:
+    """
+    Estimated wall time of running the plan: the larger of the time the
+    quota allows for its requests and the time workers flows at a time
+    take when each request costs latency_ms. A flow's calls are assumed
+    to overlap ops_per_flow (from the plan settings) at a time, as in an
+    upload; --execute-plan sends them in order.
+    """
+    latency = latency_ms / 1000
+    overlap = max(1, plan["settings"].get("ops_per_flow", 1))
+    requests = sum(1 for _ in plan_operations(plan))
+    # Setup listings run in parallel
+    setup = latency if plan["setup"] else 0.0
+    lanes = [0.0] * max(1, workers)
+    for cost in sorted((math.ceil(len(f["operations"]) / overlap) * latency for f in plan["flows"]), reverse=True):
+        lanes[lanes.index(min(lanes))] += cost
+    latency_bound = setup + max(lanes)
+    rate_bound = requests / rate if rate else 0.0
+    return {"requests": requests, "latency_bound": latency_bound, "rate_bound": rate_bound,
+            "seconds": max(latency_bound, rate_bound)}
+
+def _duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+def print_plan(plan: Dict, rate: Optional[float], workers: int, latency_ms: float):
+    """Print per-flow and per-endpoint call counts and the time estimate."""
+    agent = plan["agent"]
+    flows = plan["flows"]
+    estimate = estimate_seconds(plan, rate, workers, latency_ms)
+    print(f"Upload plan: {len(flows)} flow(s), {estimate['requests']} API calls")
+    if not plan.get("assumes_cache"):
+        print("  (no resource cache: planned against an empty agent)")
+    print(f"  setup: {len(plan['setup'])} calls")
+    for flow in flows:
+        if flow.get("error"):
+            print(f"  {Path(flow['file']).name}: not uploadable: {flow['error']}")
+            continue
+        methods = {}
+        for op in flow["operations"]:
+            methods[op["method"]] = methods.get(op["method"], 0) + 1
+        counts = ", ".join(f"{method} {n}" for method, n in sorted(methods.items()))
+        print(f"  {flow['flow']} ({Path(flow['file']).name}): {len(flow['operations'])} calls"
+              f"{'  ' + counts if counts else ''}")
+
+    endpoints = {}
+    for op in plan_operations(plan):
+        label = endpoint(op, agent)
+        endpoints[label] = endpoints.get(label, 0) + 1
+    print("By endpoint:")
+    width = max((len(label) for label in endpoints), default=0)
+    for label, n in sorted(endpoints.items(), key=lambda item: -item[1]):
+        print(f"  {label:<{width}}  {n}")
+
+    bound = "quota" if estimate["rate_bound"] >= estimate["latency_bound"] else "latency"
+    quota = f"{rate:g} req/s" if rate else "no rate limit"
+    print(f"Estimated time: {_duration(estimate['seconds'])} at {quota}, {workers} worker(s), "
+          f"{latency_ms:g} ms/request ({bound}-bound)")
+
+def _resolve(value: Any, lookup) -> Any:
+    """value with every placeholder (in strings and dict keys) replaced by lookup(id)."""
+    if isinstance(value, str):
+        return PLACEHOLDER.sub(lambda m: lookup(int(m.group(1))), value)
+    if isinstance(value, dict):
+        return {_resolve(k, lookup): _resolve(v, lookup) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v, lookup) for v in value]
+    return value
+
+def execute_plan(uploader: DialogflowUploader, plan: Dict, max_workers: Optional[int] = None
+                 ) -> Iterator[Tuple[str, bool, str]]:
+    """
+    Send a plan's calls through uploader: setup first, then up to
+    max_workers flows at a time, each flow's calls in order. A call using a
+    name created by another flow waits for it. Yields (json_file, success,
+    flow name or error) per flow. Once every flow succeeded, the uploader's
+    index and ledger are set to the plan's, so closing it saves them.
+    """
+    if uploader.base_url[len(uploader.api_prefix) + 1:] != plan["agent"]:
+        raise ValueError(f"Plan is for {plan['agent']}, not this uploader's agent")
+    refs = {}
+    state = {"aborted": False}
+    ready = threading.Condition()
+
+    def lookup(op_id):
+        with ready:
+            ready.wait_for(lambda: op_id in refs or state["aborted"])
+            if op_id not in refs:
+                raise RuntimeError(f"Operation {op_id} this call depends on did not run")
+            return refs[op_id]
+
+    def run(op):
+        response = uploader._api_request(op["method"], f"{uploader.api_prefix}/{_resolve(op['path'], lookup)}",
+                                         params=op.get("params"), json=_resolve(op.get("body"), lookup))
+        if op["method"] == "POST":
+            with ready:
+                refs[op["id"]] = response.json()["name"].rpartition("/")[2]
+                ready.notify_all()
+
+    def run_flow(flow):
+        try:
+            for op in flow["operations"]:
+                run(op)
+            logger.info(f"✓ Executed plan for flow '{flow['flow']}' ({len(flow['operations'])} calls)")
+            return True, flow["flow"]
+        except Exception as e:
+            with ready:
+                state["aborted"] = True
+                ready.notify_all()
+            logger.error(f"✗ Plan for {flow['file']} failed: {e}")
+            return False, str(e)
+
+    for op in plan["setup"]:
+        run(op)
+    flows = [flow for flow in plan["flows"] if not flow.get("error")]
+    workers = max(1, min(max_workers or uploader.max_workers, len(flows) or 1))
+    uploader._ensure_pool(workers)
+    failed = False
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan") as pool:
+        futures = {pool.submit(run_flow, flow): flow for flow in flows}
+        for future in as_completed(futures):
+            success, result = future.result()
+            failed = failed or not success
+            yield futures[future]["file"], success, result
+
+    if not failed:
+        with uploader._cache_lock:
+            uploader.cache = _resolve(plan["index"], lookup)
+            uploader.ledger = _resolve(plan["ledger"], lookup)
+        uploader._index_loaded = True
@@ -1,59 +1,249 @@
-import json
+import asyncio
+import base64
+import functools
+import hashlib
 import re
+import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import argparse
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
 import logging
 
+from credential_manager import CredentialManager
+from flow_graph import FlowGraph
+from flow_model import Flow, OrderedSet
+from operation_graph import OperationGraph
+from rate_limiter import AdaptiveRateLimiter, RateLimiter, parse_retry_after
+from resource_cache import CACHE_NAME, ResourceCache
+from retry_policy import (DEFAULT_POLICIES, TRANSIENT_STATUSES, RetryBudget, RetryPolicy, UncertainWrite,
+                          operation_kind)
+from sync_planner import MANAGED_FIELDS, canonical, payload_hash, snapshot
+from upload_journal import JOURNAL_NAME, UploadJournal
+
+# Largest pageSize the Dialogflow CX list methods accept
+LIST_PAGE_SIZE = 1000
+
+# Responses telling the client to slow down
+THROTTLE_STATUSES = (429, 503)
+
+# Collections relisted on a warm start from the resource cache; they are small,
+# unlike intents and pages, which are trusted until a call shows them stale
+REVALIDATED_KINDS = ('flows', 'webhooks')
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def parse_header(value: Optional[str]) -> Optional[Dict[str, str]]:
+    """Request headers for a Key=Value setting such as --dispatcher-header."""
+    if value and "=" in value:
+        k, v = value.split("=", 1)
+        return {k.strip(): v.strip()}
+    return None
+
 class DialogflowUploader:
     def __init__(self, service_account_file: str, project_id: str, location: str, 
-                 agent_id: str, dispatcher_url: str, dispatcher_header: Optional[str] = None):
-        """Initialize the Dialogflow uploader with configuration."""
+                 agent_id: str, dispatcher_url: str, dispatcher_header: Optional[str] = None,
+                 allow_dangling: bool = False, max_workers: int = 3,
+                 api_endpoint: Optional[str] = None, rate_limit: Optional[float] = 10.0,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 resource_cache: Optional[str] = None, sync: bool = False,
+                 prune: bool = False, force: bool = False,
+                 credentials: Optional[CredentialManager] = None,
+                 max_rate: Optional[float] = None,
+                 retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 journal: Optional[str] = None, resume: bool = False,
+                 ops_per_flow: int = 8):
+        """
+        Initialize the Dialogflow uploader with configuration.
+        
+        Flows with routes to pages that do not exist are rejected before any
+        API call unless allow_dangling is set, in which case those routes are
+        skipped as before.
+        
+        Bulk uploads run up to max_workers flows at once. Within a flow, up
+        to ops_per_flow operations whose dependencies are done run at once
+        (see operation_graph.py); one runs them in order. All share one
+        keep-alive connection pool. Every API call waits on a shared rate
+        limiter starting at rate_limit requests per second (None or 0 for no
+        limit). The rate adapts to the quota: it rises while calls succeed,
+        up to max_rate, and drops on 429/503 responses (see rate_limiter.py).
+        Pass rate_limiter to share one between uploaders.
+        Failed calls are retried per the policy of their kind (list, create,
+        patch, delete), overriding retry_policy.DEFAULT_POLICIES with
+        retry_policies, within a retry_budget shared by all calls.
+        api_endpoint overrides the regional endpoint (e.g. a local stand-in
+        server for benchmarks).
+        
+        The service account key is loaded once into a CredentialManager that
+        keeps the token fresh in the background; pass credentials to share
+        one between uploaders.
+        
+        resource_cache names a JSON file (see resource_cache.py) where the
+        agent's resource names are kept between runs; None disables it.
+        The same file holds the upload ledger: a hash of the last value
+        written to each resource field, so a write identical to the last
+        one is skipped without reading the agent. force writes everything.
+        
+        With sync set, the agent's current state is read once (full intents,
+        and each flow's pages) and a field-masked PATCH is only sent when it
+        would change the remote value (see sync_planner.py). prune deletes
+        pages of uploaded flows that are no longer in their sheet.
+        
+        journal names a checkpoint file (see upload_journal.py) where each
+        completed operation is appended. With resume, the operations an
+        earlier run journaled are not repeated, and flows it finished are
+        skipped unless their file changed.
+        """
         self.service_account_file = service_account_file
         self.project_id = project_id
         self.location = location
         self.agent_id = agent_id
         self.dispatcher_url = dispatcher_url
         self.dispatcher_header = dispatcher_header
+        self.allow_dangling = allow_dangling
+        self.max_workers = max(1, max_workers)
+        self.ops_per_flow = max(1, ops_per_flow)
         
         # Setup API URLs
-        self.api_prefix = f"https://{location}-dialogflow.googleapis.com/v3"
+        endpoint = (api_endpoint or f"https://{location}-dialogflow.googleapis.com").rstrip("/")
+        self.api_prefix = f"{endpoint}/v3"
         self.base_url = f"{self.api_prefix}/projects/{project_id}/locations/{location}/agents/{agent_id}"
         
+        # Pooled session: connections (and their TLS handshakes) are reused across calls
+        self.pool_size = self.max_workers * self.ops_per_flow
+        self.session = self._build_session(self.pool_size)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(rate_limit, max_rate=max_rate)
+        self.retry_policies = dict(DEFAULT_POLICIES, **(retry_policies or {}))
+        self.retry_budget = retry_budget or RetryBudget()
+        
         # Setup authentication
+        self.credentials = credentials
+        self._owns_credentials = credentials is None
         self.headers = self._auth_headers()
+        self.session.headers.update(self.headers)
         
-        # Cache for existing resources
+        # Agent-wide index of existing resources (display name -> resource name;
+        # pages per flow resource), loaded once by load_index and shared by upload threads
         self.cache = {
             'flows': {},
             'intents': {},
             'pages': {},
             'webhooks': {}
         }
+        self._cache_lock = threading.Lock()
+        self._key_locks = {}
+        # Training phrases of intents shared by several flows of a run, merged by merge_shared_intents
+        self.shared_phrases = {}
+        self._index_lock = threading.Lock()
+        self._index_loaded = False
+        self.resource_cache = ResourceCache(resource_cache) if resource_cache else None
+        
+        # Canonical remote state of managed fields, by resource name (sync mode)
+        self.sync = sync
+        self.prune = prune
+        self.force = force
+        self.remote = {}
+        self.ledger = {}  # "resource:field" -> payload_hash of the last value written
+        self.write_counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        
+        # Checkpoint journal; the replayed entries are applied with the index
+        self.journal = UploadJournal(journal, self.base_url, resume) if journal else None
+        self._journal_replay = self.journal.entries if self.journal else []
+        self.finished = {entry["key"]: entry["digest"] for entry in self._journal_replay
+                         if entry["op"] == "flow_done" and "digest" in entry}  # flow display name -> file digest
         
     def _auth_headers(self) -> Dict[str, str]:
-        """Generate authentication headers."""
-        credentials = service_account.Credentials.from_service_account_file(
-            self.service_account_file, 
-            scopes=['https://www.googleapis.com/auth/cloud-platform']
-        )
-        credentials.refresh(Request())
+        """Authentication headers with the current token; sent with every request."""
+        if self.credentials is None:
+            self.credentials = CredentialManager(self.service_account_file).start()
         return {
-            'Authorization': f'Bearer {credentials.token}',
+            'Authorization': f'Bearer {self.credentials.token()}',
             'Content-Type': 'application/json'
         }
     
-    def _refresh_auth(self):
-        """Refresh authentication token."""
+    def _refresh_auth(self, rejected: Optional[Dict[str, str]] = None):
+        """Refresh the token after the API rejected the one in the rejected headers."""
+        if self.credentials is not None:
+            token = (rejected or {}).get('Authorization', '').replace('Bearer ', '', 1) or None
+            self.credentials.invalidate(token)
         self.headers = self._auth_headers()
+        self.session.headers.update(self.headers)
+    
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send one request with the current token. A 401 refreshes the token
+        and resends once, as part of the same attempt.
+        """
+        headers = self._auth_headers()
+        response = self.session.request(method, url, headers=headers, **kwargs)
+        if response.status_code == 401:
+            logger.info("Refreshing authentication token...")
+            self._refresh_auth(headers)
+            self.rate_limiter.acquire()
+            response = self.session.request(method, url, headers=self._auth_headers(), **kwargs)
+        return response
+    
+    @staticmethod
+    def _build_session(pool_size: int) -> requests.Session:
+        """Session with a keep-alive connection pool of pool_size per host."""
+        session = requests.Session()
+        # Retries stay in _api_request, which knows about auth refresh and rate limits
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def _ensure_pool(self, size: int):
+        """Grow the connection pool to at least size connections."""
+        if size > self.pool_size:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+            self.pool_size = size
+    
+    def _key_lock(self, kind: str, key: str) -> threading.Lock:
+        """Lock serializing work on one resource key across upload threads."""
+        with self._cache_lock:
+            return self._key_locks.setdefault((kind, key), threading.Lock())
+    
+    def _cached(self, kind: str, key: str, create: Callable[[], str]) -> str:
+        """
+        Return self.cache[kind][key], calling create() to fill it. Concurrent
+        callers for the same key wait for the first one instead of creating
+        the resource again.
+        """
+        with self._cache_lock:
+            if key in self.cache[kind]:
+                return self.cache[kind][key]
+        with self._key_lock(kind, key):
+            with self._cache_lock:
+                if key in self.cache[kind]:
+                    return self.cache[kind][key]
+            value = create()
+            with self._cache_lock:
+                self.cache[kind][key] = value
+            return value
+    
+    def close(self):
+        """Save the resource index, close the pooled connections and journal, and stop our token refresh."""
+        self.save_index()
+        self.session.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self._owns_credentials and self.credentials is not None:
+            self.credentials.stop()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
     
     @staticmethod
     def slugify(s: str) -> str:
@@ -65,120 +255,507 @@ class DialogflowUploader:
         return s.strip("_")
     
     def _api_request(self, method: str, url: str, **kwargs) -> requests.Response:
-        """Make API request with retry logic."""
-        max_retries = 3
-        for attempt in range(max_retries):
+        """
+        Make an API request, retrying failures per the retry policy of its
+        kind (see retry_policy.py). Returns the successful response or
+        raises the last error.
+        """
+        policy = self.retry_policies[operation_kind(method)]
+        self.retry_budget.deposit()
+        failures = throttles = 0
+        while True:
+            self.rate_limiter.acquire()
+            sent = time.monotonic()
             try:
-                if attempt > 0:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                
-                response = requests.request(method, url, headers=self.headers, **kwargs)
-                
-                # Handle auth refresh
-                if response.status_code == 401 and attempt < max_retries - 1:
-                    logger.info("Refreshing authentication token...")
-                    self._refresh_auth()
-                    continue
-                
-                # Handle rate limiting
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', 5))
-                    logger.warning(f"Rate limited. Waiting {retry_after} seconds...")
-                    time.sleep(retry_after)
+                response = self._send(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                # Nothing reached the server if the connection was never made
+                unsent = isinstance(e, requests.exceptions.ConnectTimeout)
+                failures += 1
+                time.sleep(self._retry_delay(policy, method, url, e, None, failures, unsent))
+                continue
+            
+            status = response.status_code
+            if status in THROTTLE_STATUSES:
+                # The shared limiter slows down and holds every caller for Retry-After
+                retry_after = self._throttled(status, response.headers.get('Retry-After'), sent)
+                if throttles < policy.max_throttled and (status == 429 or retry_after):
+                    throttles += 1
+                    logger.warning(f"Rate limited ({status}). Waiting {retry_after:g} seconds...")
                     continue
-                
-                # Log error details for debugging
-                if response.status_code == 400:
-                    logger.error(f"Bad request details: {response.text}")
-                
-                response.raise_for_status()
+            else:
+                self.rate_limiter.succeeded()
+            if status < 400:
                 return response
-                
-            except requests.exceptions.RequestException as e:
-                if attempt == max_retries - 1:
-                    raise
-                logger.warning(f"Request failed (attempt {attempt + 1}): {e}")
-        
-        return response
+            
+            # Log error details for debugging
+            if status == 400:
+                logger.error(f"Bad request details: {response.text}")
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                failures += 1
+                time.sleep(self._retry_delay(policy, method, url, e, status, failures))
+    
+    def _retry_delay(self, policy: RetryPolicy, method: str, url: str, error: Exception,
+                     status: Optional[int], failures: int, unsent: bool = False) -> float:
+        """
+        Seconds to back off before retrying a request that failed for the
+        failures-th time with error (status, if the server answered). Raises
+        error if the failure is not retried, and UncertainWrite if a
+        non-idempotent request may have been applied.
+        """
+        if status is not None and status not in TRANSIENT_STATUSES:
+            raise error  # A bad request, missing resource or conflict will not change on retry
+        if not policy.idempotent and not unsent:
+            raise UncertainWrite(f"{method} {url} may or may not have been applied: {error}") from error
+        if failures >= policy.max_attempts:
+            raise error
+        if not self.retry_budget.withdraw():
+            logger.warning(f"Retry budget exhausted; not retrying {method} {url}")
+            raise error
+        delay = policy.backoff(failures)
+        logger.warning(f"Request failed (attempt {failures}/{policy.max_attempts}), "
+                       f"retrying in {delay:.1f}s: {error}")
+        return delay
+    
+    def _throttled(self, status: int, retry_after: Optional[str], sent: float) -> float:
+        """
+        Report a throttled response to the rate limiter; returns the seconds
+        every caller now waits (Retry-After, or 5 for a 429 without one).
+        """
+        delay = parse_retry_after(retry_after)
+        if delay is None and status == 429:
+            delay = 5.0
+        rate = self.rate_limiter.throttled(delay, sent)
+        if rate:
+            logger.warning(f"Throttled ({status}); request rate lowered to {rate:.2f}/s")
+        return delay or 0.0
+    
+    @staticmethod
+    def _http_status(error: Exception) -> Optional[int]:
+        """HTTP status of a failed request, if the server answered."""
+        return getattr(getattr(error, "response", None), "status_code", None)
+    
+    def iter_list(self, url: str, key: str, params: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Yield every resource of a list endpoint, following nextPageToken.
+        Pages are requested at the maximum size and items are yielded as each
+        page arrives, so callers that stop early skip the remaining pages.
+        """
+        params = dict(params or {}, pageSize=LIST_PAGE_SIZE)
+        while True:
+            data = self._api_request('GET', url, params=params).json()
+            yield from data.get(key, [])
+            token = data.get("nextPageToken")
+            if not token:
+                return
+            params["pageToken"] = token
+    
+    @staticmethod
+    def index_by_name(items: Iterable[Dict]) -> Dict[str, Dict]:
+        """Index resources by display name."""
+        return {item["displayName"]: item for item in items}
     
     def list_by_name(self, url: str, key: str) -> Dict:
-        """List resources and index by display name."""
-        resp = self._api_request('GET', url)
-        return {item["displayName"]: item for item in resp.json().get(key, [])}
+        """List all resources (every page) and index by display name."""
+        return self.index_by_name(self.iter_list(url, key))
+    
+    def find_by_name(self, url: str, key: str, display_name: str) -> Optional[Dict]:
+        """The resource with display_name, listing only as many pages as needed to find it."""
+        return next((item for item in self.iter_list(url, key) if item["displayName"] == display_name), None)
+    
+    def _index_listings(self) -> Dict[str, Tuple[str, str, Optional[Dict]]]:
+        """(list URL, response key, params) for each agent-wide collection in the index."""
+        return {
+            'flows': (f"{self.base_url}/flows", "flows", None),
+            # Only names are indexed unless syncing, so leave the training phrases out of the listing
+            'intents': (f"{self.base_url}/intents", "intents",
+                        {"intentView": "INTENT_VIEW_FULL" if self.sync else "INTENT_VIEW_PARTIAL"}),
+            'webhooks': (f"{self.base_url}/webhooks", "webhooks", None),
+        }
+    
+    def _apply_index(self, listed: Dict[str, List[Dict]], saved: Optional[Dict] = None,
+                     ledger: Optional[Dict[str, str]] = None):
+        """
+        Fill the index from fresh listings, taking the kinds that were not
+        listed from a saved index. Entries recorded during this run take
+        precedence. Saved ledger entries are kept for resources outside
+        flows and for those of flows that still exist.
+        """
+        saved = saved or {}
+        for kind, items in listed.items():
+            self._record_remote(kind, items)
+        with self._cache_lock:
+            for kind in ('flows', 'intents', 'webhooks'):
+                if kind in listed:
+                    found = {item["displayName"]: item["name"] for item in listed[kind]}
+                else:
+                    found = saved.get(kind, {})
+                self.cache[kind] = {**found, **self.cache[kind]}
+            # Saved pages only count for flows that still exist
+            live_flows = set(self.cache['flows'].values())
+            pages = {flow: p for flow, p in saved.get('pages', {}).items() if flow in live_flows}
+            self.cache['pages'] = {**pages, **self.cache['pages']}
+            for key, digest in (ledger or {}).items():
+                resource = key.rpartition(":")[0]
+                if "/flows/" not in resource or resource.split("/pages/")[0] in live_flows:
+                    self.ledger.setdefault(key, digest)
+            self._replay_journal(listed, live_flows)
+    
+    def _replay_journal(self, listed: Dict[str, List[Dict]], live_flows: set):
+        """
+        Apply the entries of a resumed journal once; the caller holds the
+        cache lock. Names of listed kinds are already current, and pages are
+        only added to page indexes taken from the resource cache (others
+        are listed in full when first needed). Written values go into the
+        ledger unless their flow no longer exists.
+        """
+        kinds = {'flow': 'flows', 'webhook': 'webhooks', 'intent': 'intents'}
+        for entry in self._journal_replay:
+            name, op = entry["name"], entry["op"]
+            if "/flows/" in name and name.split("/pages/")[0] not in live_flows:
+                continue
+            if op in kinds and kinds[op] not in listed:
+                self.cache[kinds[op]][entry["key"]] = name
+            elif op == "page" and entry["parent"] in self.cache['pages']:
+                self.cache['pages'][entry["parent"]][entry["key"]] = name
+            if "field" in entry:
+                self.ledger[f"{name}:{entry['field']}"] = entry["hash"]
+        self._journal_replay = []
+    
+    def _saved_index(self) -> Optional[Dict]:
+        """This agent's index from the resource cache, if any."""
+        return self.resource_cache.load(self.base_url) if self.resource_cache else None
+    
+    def _saved_ledger(self) -> Dict[str, str]:
+        """This agent's upload ledger from the resource cache, if any."""
+        return self.resource_cache.load_ledger(self.base_url) if self.resource_cache else {}
+    
+    def _log_index(self, saved: Optional[Dict]):
+        counts = ", ".join(f"{len(self.cache[k])} {k}" for k in ('flows', 'intents', 'webhooks'))
+        source = " (from resource cache; flows and webhooks relisted)" if saved else ""
+        logger.info(f"Agent index: {counts}{source}")
+    
+    def save_index(self):
+        """Write the index to the resource cache, if one is configured."""
+        if not self.resource_cache or not self._index_loaded:
+            return
+        with self._cache_lock:
+            index = {kind: dict(names) for kind, names in self.cache.items()}
+            index['pages'] = {flow: dict(pages) for flow, pages in self.cache['pages'].items()}
+            ledger = dict(self.ledger)
+        self.resource_cache.store(self.base_url, index, ledger)
+    
+    def _flow_resource(self, flow_url: str) -> str:
+        """Flow resource name for a flow URL."""
+        return flow_url[len(self.api_prefix) + 1:]
+    
+    def load_index(self, refresh: bool = False):
+        """
+        Load the agent-wide index of flows, intents and webhooks, listing the
+        three collections in parallel. Done once per uploader unless refresh
+        is set; upserts keep the index current afterwards, so a bulk run makes
+        the same number of agent-wide list calls however many flows it uploads.
+        With a saved index in the resource cache only flows and webhooks are
+        listed, and intents and pages come from the cache, except in sync
+        mode, which needs the remote state of everything it writes.
+        """
+        with self._index_lock:
+            if self._index_loaded and not refresh:
+                return
+            saved = None if refresh or self.sync else self._saved_index()
+            listings = self._index_listings()
+            if saved:
+                listings = {kind: listings[kind] for kind in REVALIDATED_KINDS}
+            self._ensure_pool(len(listings))
+            with ThreadPoolExecutor(max_workers=len(listings), thread_name_prefix="index") as pool:
+                futures = {kind: pool.submit(lambda args: list(self.iter_list(*args)), args)
+                           for kind, args in listings.items()}
+                listed = {kind: future.result() for kind, future in futures.items()}
+            self._apply_index(listed, saved, self._saved_ledger() if saved else None)
+            self._index_loaded = True
+            self._log_index(saved)
+    
+    def page_index(self, flow_url: str) -> Dict[str, str]:
+        """Display name -> resource name for a flow's pages, listed at most once per flow."""
+        flow_resource = self._flow_resource(flow_url)
+        with self._key_lock('page_index', flow_resource):
+            with self._cache_lock:
+                pages = self.cache['pages'].get(flow_resource)
+            if pages is None:
+                items = list(self.iter_list(f"{flow_url}/pages", "pages"))
+                self._record_remote('pages', items)
+                pages = {item["displayName"]: item["name"] for item in items}
+                with self._cache_lock:
+                    self.cache['pages'][flow_resource] = pages
+        return pages
+    
+    def _record_remote(self, kind: str, items: Iterable[Dict]):
+        """Remember the canonical state of listed or created resources (sync mode)."""
+        if not self.sync or kind not in MANAGED_FIELDS:
+            return
+        with self._cache_lock:
+            for item in items:
+                self.remote[item["name"]] = snapshot(kind, item)
+    
+    def _count(self, outcome: str):
+        with self._cache_lock:
+            self.write_counts[outcome] += 1
+    
+    def _log_write_counts(self):
+        logger.info("Writes: " + ", ".join(f"{n} {outcome}" for outcome, n in self.write_counts.items()))
+    
+    def _unchanged(self, resource: str, field: str, value_key: str) -> bool:
+        """
+        True if writing value_key (a canonical value) to the field would
+        change nothing: in sync mode per the remote state, otherwise per
+        the upload ledger. Always False with force.
+        """
+        if self.force:
+            return False
+        with self._cache_lock:
+            remote = self.remote.get(resource) if self.sync else None
+            if remote is not None:
+                return remote.get(field) == value_key
+            return self.ledger.get(f"{resource}:{field}") == payload_hash(value_key)
+    
+    def _remember(self, resource: str, field: str, value_key: str):
+        """Record a successful write of value_key to the field."""
+        with self._cache_lock:
+            if self.sync:
+                self.remote.setdefault(resource, {})[field] = value_key
+            self.ledger[f"{resource}:{field}"] = payload_hash(value_key)
+    
+    def _forget(self, resource: str):
+        """Drop the remote state and ledger entries of a deleted resource and of the resources under it."""
+        prefixes = (f"{resource}:", f"{resource}/")
+        with self._cache_lock:
+            for name in [n for n in self.remote if n == resource or n.startswith(prefixes[1])]:
+                del self.remote[name]
+            for key in [k for k in self.ledger if k.startswith(prefixes)]:
+                del self.ledger[key]
+    
+    def _checkpoint(self, op: str, name: str, key: Optional[str] = None, parent: Optional[str] = None,
+                    field: Optional[str] = None, value=None, digest: Optional[str] = None):
+        """Journal a completed operation on resource name; field and value are what it wrote."""
+        if self.journal is None:
+            return
+        value_hash = payload_hash(canonical(value)) if field else None
+        self.journal.record(op, name, key=key, parent=parent, field=field, hash=value_hash, digest=digest)
+    
+    @staticmethod
+    def _file_digest(json_path) -> Optional[str]:
+        """Content hash of a flow JSON file; None for an already built Flow."""
+        if isinstance(json_path, Flow):
+            return None
+        return hashlib.sha256(Path(json_path).read_bytes()).hexdigest()
+    
+    def _already_uploaded(self, flow_name: str, digest: Optional[str]) -> bool:
+        """True if a resumed journal shows the flow finished from a file with this digest."""
+        return digest is not None and self.finished.get(flow_name) == digest
+    
+    def _create(self, kind: str, url: str, body: Dict) -> str:
+        """
+        POST a new resource of the given collection; returns its resource
+        name. If the POST may or may not have gone through (UncertainWrite),
+        the resource is looked up by display name before it is sent again,
+        so a retry never creates it twice.
+        """
+        failures = 1
+        while True:
+            try:
+                name = self._api_request('POST', url, json=body).json()["name"]
+                break
+            except UncertainWrite as e:
+                name = self._find_name(url, kind, body["displayName"])
+                if name is not None:
+                    logger.info(f"{kind} '{body['displayName']}' was created despite the error")
+                    break
+                policy = self.retry_policies['create']
+                if failures >= policy.max_attempts or not self.retry_budget.withdraw():
+                    raise
+                failures += 1
+                logger.warning(f"Creating {kind} '{body['displayName']}' again: {e}")
+                time.sleep(policy.backoff(failures - 1))
+        self._record_remote(kind, [dict(body, name=name)])
+        for field in MANAGED_FIELDS.get(kind, ()):
+            self._remember(name, field, canonical(body.get(field)))
+        self._count('created')
+        return name
+    
+    def _patch_field(self, resource: str, field: str, value) -> bool:
+        """
+        PATCH one field of a resource with an update mask, unless the write
+        would change nothing (see _unchanged). Returns True if a request was sent.
+        """
+        value_key = canonical(value)
+        if self._unchanged(resource, field, value_key):
+            self._count('unchanged')
+            return False
+        self._api_request('PATCH', f"{self.api_prefix}/{resource}",
+                          params={"updateMask": field}, json={field: value})
+        self._remember(resource, field, value_key)
+        self._count('updated')
+        return True
+    
+    def prune_pages(self, flow_url: str, keep: Iterable[str]) -> int:
+        """Delete the flow's pages whose display names are not in keep; returns how many were deleted."""
+        pages_index = self.page_index(flow_url)
+        keep = set(keep)
+        with self._cache_lock:
+            stale = [(display_name, name) for display_name, name in pages_index.items()
+                     if display_name not in keep]
+        for display_name, page_name in stale:
+            try:
+                # force also removes routes from other flows that still target the page
+                self._api_request('DELETE', f"{self.api_prefix}/{page_name}", params={"force": "true"})
+            except requests.HTTPError as e:
+                if self._http_status(e) != 404:
+                    raise
+            with self._cache_lock:
+                pages_index.pop(display_name, None)
+            self._forget(page_name)
+            self._count('deleted')
+            logger.info(f"Deleted page no longer in the sheet: {display_name}")
+        return len(stale)
+    
+    def _find_name(self, url: str, key: str, display_name: str) -> Optional[str]:
+        """Resource name for display_name, looked up on the server."""
+        return (self.find_by_name(url, key, display_name) or {}).get("name")
+    
+    def _upsert(self, kind: str, display_name: str, known: Optional[str],
+                patch: Callable[[str], object], create: Callable[[], str],
+                find: Callable[[], Optional[str]]) -> str:
+        """
+        Patch the indexed resource known, or create the resource. Entries
+        restored from the resource cache can be stale: a 404 on the patch
+        means the resource was deleted, so it is created again, and a 409 on
+        the create means it exists under a name the index lacks, so find()
+        looks it up to patch. Returns the resource name.
+        """
+        if known:
+            try:
+                patch(known)
+                return known
+            except requests.HTTPError as e:
+                if self._http_status(e) != 404:
+                    raise
+                logger.info(f"Cached {kind} '{display_name}' no longer exists, creating it again")
+                self._forget(known)
+        try:
+            return create()
+        except requests.HTTPError as e:
+            if self._http_status(e) != 409:
+                raise
+            known = find()
+            if not known:
+                raise
+            logger.info(f"{kind.capitalize()} '{display_name}' already exists as {known}, updating it")
+            patch(known)
+            return known
     
     def upsert_flow(self, display_name: str) -> str:
         """Create or update a flow."""
-        # Check cache first
-        if display_name in self.cache['flows']:
-            return self.cache['flows'][display_name]
-        
-        flows = self.list_by_name(f"{self.base_url}/flows", "flows")
+        self.load_index()
         
-        if display_name in flows:
-            resource_name = flows[display_name]["name"]
-        else:
-            resp = self._api_request('POST', f"{self.base_url}/flows", 
-                                    json={"displayName": display_name})
-            resource_name = resp.json()["name"]
+        def create():
+            flow_resource = self._create('flows', f"{self.base_url}/flows", {"displayName": display_name})
+            # A new flow has no pages to list
+            with self._cache_lock:
+                self.cache['pages'][flow_resource] = {}
+            self._checkpoint('flow', flow_resource, key=display_name)
+            return flow_resource
         
-        self.cache['flows'][display_name] = resource_name
-        return resource_name
+        return self._cached('flows', display_name, create)
     
     def upsert_webhook(self, display_name: str, uri: str, headers_map: Optional[Dict] = None) -> str:
-        """Create or update a webhook."""
-        # Check cache
-        cache_key = f"{display_name}::{uri}"
-        if cache_key in self.cache['webhooks']:
-            return self.cache['webhooks'][cache_key]
-        
-        hooks = self.list_by_name(f"{self.base_url}/webhooks", "webhooks")
+        """Create a webhook unless the agent already has one with this name; existing ones are kept as configured."""
+        self.load_index()
         
-        if display_name in hooks:
-            name = hooks[display_name]["name"]
-            logger.info(f"Webhook '{display_name}' already exists, using existing configuration")
-        else:
+        def create():
             payload = {"displayName": display_name, "genericWebService": {"uri": uri}}
             if headers_map:
                 payload["genericWebService"]["requestHeaders"] = headers_map
             
-            resp = self._api_request('POST', f"{self.base_url}/webhooks", json=payload)
-            name = resp.json()["name"]
+            webhook_name = self._create('webhooks', f"{self.base_url}/webhooks", payload)
+            self._checkpoint('webhook', webhook_name, key=display_name)
+            return webhook_name
         
-        self.cache['webhooks'][cache_key] = name
-        return name
+        return self._cached('webhooks', display_name, create)
     
-    def upsert_intent(self, display_name: str, training_phrases: List[str], 
-                     intents_index: Optional[Dict] = None) -> str:
+    def upsert_intent(self, display_name: str, training_phrases: List[str]) -> str:
         """Create or update an intent."""
-        if not intents_index:
-            intents_index = self.list_by_name(f"{self.base_url}/intents", "intents")
+        self.load_index()
+        body = self._intent_body(display_name, training_phrases)
+        
+        # Intents are agent-wide, so flows uploading in parallel may share one;
+        # whichever creates it first records it for the others to update
+        with self._key_lock('intents', display_name):
+            with self._cache_lock:
+                known = self.cache['intents'].get(display_name)
+            
+            intent_name = self._upsert(
+                "intent", display_name, known,
+                patch=lambda name: self._patch_field(name, "trainingPhrases", body["trainingPhrases"]),
+                create=lambda: self._create('intents', f"{self.base_url}/intents", body),
+                find=lambda: self._find_name(f"{self.base_url}/intents", "intents", display_name))
+            
+            with self._cache_lock:
+                self.cache['intents'][display_name] = intent_name
+        self._checkpoint('intent', intent_name, key=display_name,
+                         field="trainingPhrases", value=body["trainingPhrases"])
+        return intent_name
+    
+    def upsert_page(self, flow_url: str, display_name: str, prompts: List[str], 
+                   chips: List[str], is_end_state: bool = False) -> str:
+        """Create or update a page, marking it as an end state if specified."""
+        pages_index = self.page_index(flow_url)
+        body = self._page_body(display_name, prompts, chips)
+        
+        page_name = self._upsert(
+            "page", display_name, pages_index.get(display_name),
+            patch=lambda name: self._patch_field(name, "entryFulfillment", body["entryFulfillment"]),
+            create=lambda: self._create('pages', f"{flow_url}/pages", body),
+            find=lambda: self._find_name(f"{flow_url}/pages", "pages", display_name))
         
-        body = {
+        with self._cache_lock:
+            pages_index[display_name] = page_name
+        self._checkpoint('page', page_name, key=display_name, parent=self._flow_resource(flow_url),
+                         field="entryFulfillment", value=body["entryFulfillment"])
+        return page_name
+    
+    def patch_page_routes(self, page_resource: str, transition_routes: List[Dict]) -> bool:
+        """Replace a page's transition routes; False if they were unchanged and not sent."""
+        sent = self._patch_field(page_resource, "transitionRoutes", transition_routes)
+        self._checkpoint('routes', page_resource, field="transitionRoutes", value=transition_routes)
+        return sent
+    
+    def patch_flow_start_route(self, flow_url: str, first_page_name: str):
+        """Set the flow's start route to the first page."""
+        page_name = self.page_index(flow_url).get(first_page_name)
+        if not page_name:
+            raise RuntimeError(f"First page '{first_page_name}' not found in flow.")
+        
+        routes = [{"condition": "true", "targetPage": page_name}]
+        flow_resource = self._flow_resource(flow_url)
+        self._patch_field(flow_resource, "transitionRoutes", routes)
+        self._checkpoint('start_route', flow_resource, field="transitionRoutes", value=routes)
+    
+    @staticmethod
+    def _intent_body(display_name: str, training_phrases: List[str]) -> Dict:
+        """Intent resource body with one training phrase per non-empty phrase."""
+        return {
             "displayName": display_name,
             "trainingPhrases": [
                 {"repeatCount": 1, "parts": [{"text": tp}]} 
                 for tp in training_phrases if tp
             ]
         }
-        
-        if display_name in intents_index:
-            intent_name = intents_index[display_name]["name"]
-            self._api_request('PATCH', f"{self.api_prefix}/{intent_name}",
-                            params={"updateMask": "trainingPhrases"},
-                            json={"trainingPhrases": body["trainingPhrases"]})
-        else:
-            resp = self._api_request('POST', f"{self.base_url}/intents", json=body)
-            intent_name = resp.json()["name"]
-        
-        return intent_name
     
-    def upsert_page(self, flow_url: str, display_name: str, prompts: List[str], 
-                   chips: List[str], pages_index: Optional[Dict] = None, 
-                   is_end_state: bool = False) -> str:
-        """Create or update a page, marking it as an end state if specified."""
-        if not pages_index:
-            pages_index = self.list_by_name(f"{flow_url}/pages", "pages")
-        
+    @staticmethod
+    def _page_body(display_name: str, prompts: List[str], chips: List[str]) -> Dict:
+        """Page resource body: prompts as text, chips as a rich content payload."""
         # Build entry fulfillment
         messages = []
         if prompts:
@@ -191,246 +768,517 @@ class DialogflowUploader:
                 }
             })
         
-        body = {
+        return {
             "displayName": display_name,
             "entryFulfillment": {"messages": messages}
         }
-        
-        if display_name in pages_index:
-            page_name = pages_index[display_name]["name"]
-            self._api_request('PATCH', f"{self.api_prefix}/{page_name}",
-                            params={"updateMask": "entryFulfillment"},
-                            json={"entryFulfillment": body["entryFulfillment"]})
+    
+    @staticmethod
+    def _load_flow(json_path, flow_name: Optional[str] = None) -> Tuple[Flow, str, str]:
+        """Return (flow, flow display name, source label) for a JSON path or a Flow."""
+        if isinstance(json_path, Flow):
+            flow = json_path
+            json_path = flow.metadata.get("source_file", "<flow>")
+            default_name = Path(json_path).stem
         else:
-            resp = self._api_request('POST', f"{flow_url}/pages", json=body)
-            page_name = resp.json()["name"]
+            flow = Flow.load(json_path)
+            default_name = Path(json_path).stem.replace("dialogflow_", "")
         
-        return page_name
+        # Determine flow name
+        if not flow_name:
+            flow_name = default_name.replace("_", " ").title()
+        return flow, flow_name, str(json_path)
     
-    def patch_flow_start_route(self, flow_url: str, first_page_name: str):
-        """Set the flow's start route to the first page."""
-        pages_resp = self._api_request('GET', f"{flow_url}/pages")
-        pages = pages_resp.json().get("pages", [])
-        page_map = {p["displayName"]: p["name"] for p in pages}
+    def merge_shared_intents(self, json_files: Iterable):
+        """
+        Merge the training phrases of intents that several of json_files
+        use, so each is written once with the union of its phrases instead
+        of every flow overwriting the others' (and every rerun rewriting
+        it). Warns about shared intents whose flows list different phrases.
+        """
+        merged, first, counts, conflicts = {}, {}, {}, set()
+        for json_file in json_files:
+            try:
+                flow = self._load_flow(json_file)[0]
+            except Exception:
+                continue  # Reported when the flow itself is uploaded
+            for name, intent in flow.intents.items():
+                phrases = intent.training_phrases
+                if name not in merged:
+                    merged[name], first[name], counts[name] = OrderedSet(phrases), frozenset(phrases), 1
+                    continue
+                merged[name].update(phrases)
+                counts[name] += 1
+                if frozenset(phrases) != first[name]:
+                    conflicts.add(name)
+        self.shared_phrases = {name: merged[name].to_list() for name, count in counts.items() if count > 1}
+        if conflicts:
+            names = ", ".join(f"'{name}'" for name in sorted(conflicts)[:5])
+            more = f" and {len(conflicts) - 5} more" if len(conflicts) > 5 else ""
+            logger.warning(f"{len(conflicts)} intent(s) shared between flows have different training phrases "
+                           f"in each; uploading the union: {names}{more}")
+    
+    def _validate_flow(self, flow: Flow):
+        """Check the transition graph; raises ValueError on dangling targets unless allowed."""
+        graph = FlowGraph.from_flow(flow)
+        dangling = graph.dangling_targets()
+        if dangling:
+            details = ", ".join(f"'{t}' (from {', '.join(src)})" for t, src in list(dangling.items())[:5])
+            if not self.allow_dangling:
+                raise ValueError(f"{len(dangling)} route target(s) are not pages in this flow: {details}")
+            logger.warning(f"Routes to missing pages will be skipped: {details}")
+        unreachable = graph.unreachable_pages()
+        if unreachable:
+            logger.warning(f"{len(unreachable)} page(s) unreachable from the first page: "
+                           f"{', '.join(unreachable[:5])}")
         
-        target = page_map.get(first_page_name)
-        if not target:
-            raise RuntimeError(f"First page '{first_page_name}' not found in flow.")
+        # Check for end states in the data
+        if flow.end_pages:
+            logger.info(f"Flow contains {len(flow.end_pages)} end state pages")
+    
+    @staticmethod
+    def _needs_dispatcher(flow: Flow) -> bool:
+        """True if the flow has webhook actions in the data."""
+        return bool(flow.webhooks) or any(r.webhook_action for r in flow.routes)
+    
+    def _dispatcher_headers_map(self) -> Optional[Dict[str, str]]:
+        """Request headers for the dispatcher webhook, from the Key=Value setting."""
+        return parse_header(self.dispatcher_header)
+    
+    @staticmethod
+    def _routes_by_page(flow: Flow) -> Dict[str, List]:
+        """Group the flow's routes by source page, dropping end state routes."""
+        routes_by_page = {}
+        valid_route_count = 0
+        skipped_route_count = 0
+        
+        for r in flow.routes:
+            # Skip routes without valid next pages (these are end states)
+            if not r.next_page:
+                skipped_route_count += 1
+                logger.debug(f"  Skipping end state route from {r.page}")
+                continue
+            
+            routes_by_page.setdefault(r.page, []).append(r)
+            valid_route_count += 1
         
-        body = {"transitionRoutes": [{"condition": "true", "targetPage": target}]}
-        self._api_request('PATCH', flow_url,
-                        params={"updateMask": "transitionRoutes"}, 
-                        json=body)
+        logger.info(f"Processing {valid_route_count} valid routes ({skipped_route_count} end state routes skipped)")
+        return routes_by_page
     
-    def upload_single_flow(self, json_path: str, flow_name: Optional[str] = None) -> Tuple[bool, str]:
-        """Upload a single flow from JSON file."""
-        try:
-            # Load JSON
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+    @staticmethod
+    def _transition_routes(routes: List, page_name_to_id: Dict[str, str],
+                           intent_name_to_id: Dict[str, str],
+                           dispatcher_name: Optional[str]) -> List[Dict]:
+        """transitionRoutes payload for one page's routes."""
+        transition_routes = []
+        
+        for r in routes:
+            intent_ref = intent_name_to_id.get(r.intent)
+            next_page = r.next_page
             
-            # Determine flow name
-            if not flow_name:
-                flow_name = Path(json_path).stem.replace("dialogflow_", "")
-                flow_name = flow_name.replace("_", " ").title()
+            if not next_page:
+                continue
+                
+            target_page_ref = page_name_to_id.get(next_page)
+            if not target_page_ref:
+                logger.warning(f"Target page '{next_page}' not found, skipping route")
+                continue
             
-            logger.info(f"Uploading flow '{flow_name}' from {json_path}")
+            # Build basic route structure
+            route_payload = {
+                "intent": intent_ref,
+                "targetPage": target_page_ref
+            }
             
-            # Check for end states in the data
-            end_pages = data.get("end_pages", [])
-            if end_pages:
-                logger.info(f"Flow contains {len(end_pages)} end state pages")
+            # ONLY add triggerFulfillment if we have webhook or parameters
+            webhook_action = r.webhook_action
+            params = r.parameters
             
-            # Create/update flow
-            flow_resource = self.upsert_flow(flow_name)
-            flow_url = f"{self.api_prefix}/{flow_resource}"
+            # Check if we actually have content for triggerFulfillment
+            has_webhook = webhook_action and dispatcher_name
+            has_params = params and isinstance(params, dict) and any(params.values())
             
-            # Setup dispatcher webhook (if we have webhook actions in the data)
-            dispatcher_name = None
-            has_webhooks = any(r.get("webhook_action") for r in data.get("routes", []))
-            
-            if has_webhooks or data.get("webhooks"):
-                headers_map = None
-                if self.dispatcher_header:
-                    if "=" in self.dispatcher_header:
-                        k, v = self.dispatcher_header.split("=", 1)
-                        headers_map = {k.strip(): v.strip()}
+            if has_webhook or has_params:
+                trig = {}
                 
-                dispatcher_name = self.upsert_webhook("Dispatcher", self.dispatcher_url, headers_map)
-                logger.info(f"Webhook configured: Dispatcher -> {self.dispatcher_url}")
-            else:
-                logger.info("No webhooks needed for this flow")
-            
-            # Get existing resources
-            intents_index = self.list_by_name(f"{self.base_url}/intents", "intents")
-            pages_index = self.list_by_name(f"{flow_url}/pages", "pages")
-            
-            # Create/update pages
-            page_name_to_id = {}
-            for page, info in data.get("pages", {}).items():
-                # Check if this is an end state page
-                is_end_state = page in end_pages
-                if is_end_state:
-                    logger.info(f"  Creating end state page: {page}")
+                # Add webhook reference if we have dispatcher and action
+                if has_webhook:
+                    trig["webhook"] = dispatcher_name
+                    trig["tag"] = webhook_action
+                    logger.debug(f"    Adding webhook action: {webhook_action}")
                 
-                page_resource = self.upsert_page(
-                    flow_url, page,
-                    info.get("prompts", []),
-                    info.get("chips", []),
-                    pages_index,
-                    is_end_state
-                )
-                page_name_to_id[page] = page_resource
-                pages_index[page] = {"name": page_resource}
+                # Add parameters if they exist and are non-empty
+                if has_params:
+                    param_actions = []
+                    for k, v in params.items():
+                        if k and v:  # Only add non-empty params
+                            param_actions.append({"parameter": k, "value": v})
+                    if param_actions:
+                        trig["setParameterActions"] = param_actions
+                        logger.debug(f"    Adding {len(param_actions)} parameters")
+                
+                # Only add triggerFulfillment if trig has content
+                if trig:
+                    route_payload["triggerFulfillment"] = trig
             
-            # Create/update intents
-            intent_name_to_id = {}
-            for intent_name, intent_info in data.get("intents", {}).items():
-                tp = intent_info.get("training_phrases", [])
-                intent_resource = self.upsert_intent(intent_name, tp, intents_index)
-                intent_name_to_id[intent_name] = intent_resource
-                intents_index[intent_name] = {"name": intent_resource}
+            transition_routes.append(route_payload)
+        return transition_routes
+    
+    def _flow_operations(self, flow: Flow, flow_url: str) -> OperationGraph:
+        """
+        The flow's upload after the flow itself exists, as a graph: the
+        dispatcher webhook, pages and intents need nothing else; a page's
+        route patch needs the page, its target pages, its intents and the
+        webhook; the start route needs the first page; pruning comes last.
+        """
+        graph = OperationGraph()
+        end_pages = flow.end_pages
+        page_name_to_id = {}
+        intent_name_to_id = {}
+        
+        # Setup dispatcher webhook (if we have webhook actions in the data)
+        dispatcher = None
+        if self._needs_dispatcher(flow):
+            def upsert_dispatcher():
+                name = self.upsert_webhook("Dispatcher", self.dispatcher_url, self._dispatcher_headers_map())
+                logger.info(f"Webhook configured: Dispatcher -> {self.dispatcher_url}")
+                return name
+            dispatcher = graph.add("dispatcher", upsert_dispatcher)
+        else:
+            logger.info("No webhooks needed for this flow")
+        
+        def upsert_page(page: str, info):
+            # Check if this is an end state page
+            is_end_state = page in end_pages
+            if is_end_state:
+                logger.info(f"  Creating end state page: {page}")
+            page_name_to_id[page] = self.upsert_page(flow_url, page, info.prompts.to_list(),
+                                                     info.chips.to_list(), is_end_state)
+        
+        for page, info in flow.pages.items():
+            graph.add(("page", page), functools.partial(upsert_page, page, info))
+        
+        def upsert_intent(intent_name: str, training_phrases: List[str]):
+            intent_name_to_id[intent_name] = self.upsert_intent(intent_name, training_phrases)
+        
+        for intent_name, intent_info in flow.intents.items():
+            training_phrases = self.shared_phrases.get(intent_name) or intent_info.training_phrases.to_list()
+            graph.add(("intent", intent_name), functools.partial(upsert_intent, intent_name, training_phrases))
+        
+        def patch_routes(page: str, routes: List):
+            transition_routes = self._transition_routes(routes, page_name_to_id, intent_name_to_id,
+                                                        graph.results.get(dispatcher))
+            # Update page routes only if there are routes to add
+            if not transition_routes:
+                logger.info(f"Page '{page}' is an end state (no outgoing routes)")
+            elif self.patch_page_routes(page_name_to_id[page], transition_routes):
+                logger.info(f"Updated {len(transition_routes)} routes for page: {page}")
+        
+        for page, routes in self._routes_by_page(flow).items():
+            if page not in flow.pages:
+                logger.warning(f"Page '{page}' not found in created pages, skipping routes")
+                continue
+            deps = {("page", page)}
+            deps.update(("page", r.next_page) for r in routes if r.next_page in flow.pages)
+            deps.update(("intent", r.intent) for r in routes if r.intent in flow.intents)
+            if dispatcher and any(r.webhook_action for r in routes):
+                deps.add(dispatcher)
+            graph.add(("routes", page), functools.partial(patch_routes, page, routes), deps)
+        
+        # Set start route
+        first_page = flow.first_page
+        if first_page:
+            def set_start_route():
+                self.patch_flow_start_route(flow_url, first_page)
+                logger.info(f"Set flow start route to: {first_page}")
+            graph.add("start_route", set_start_route, [("page", first_page)] if first_page in flow.pages else [])
+        
+        if self.prune:
+            graph.add("prune", lambda: self.prune_pages(flow_url, flow.pages), list(graph.operations))
+        return graph
+    
+    def upload_single_flow(self, json_path, flow_name: Optional[str] = None) -> Tuple[bool, str]:
+        """Upload a single flow from a JSON file path or an already built Flow."""
+        flow_lock = None
+        try:
+            digest = self._file_digest(json_path)
+            flow, flow_name, json_path = self._load_flow(json_path, flow_name)
+            if self._already_uploaded(flow_name, digest):
+                logger.info(f"✓ Flow '{flow_name}' was uploaded before the interruption, skipping")
+                return True, flow_name
             
-            # Create routes
-            routes_by_page = {}
-            valid_route_count = 0
-            skipped_route_count = 0
+            logger.info(f"Uploading flow '{flow_name}' from {json_path}")
             
-            for r in data.get("routes", []):
-                # Skip routes without valid next pages (these are end states)
-                if not r.get("next_page"):
-                    skipped_route_count += 1
-                    logger.debug(f"  Skipping end state route from {r.get('page')}")
-                    continue
-                
-                routes_by_page.setdefault(r["page"], []).append(r)
-                valid_route_count += 1
+            # Two files mapping to the same flow must not upload its pages concurrently
+            flow_lock = self._key_lock('flow_uploads', flow_name)
+            flow_lock.acquire()
             
-            logger.info(f"Processing {valid_route_count} valid routes ({skipped_route_count} end state routes skipped)")
+            # Validate the transition graph before spending any API calls
+            self._validate_flow(flow)
             
-            # Apply routes to pages
-            for page, routes in routes_by_page.items():
-                page_resource = page_name_to_id.get(page)
-                if not page_resource:
-                    logger.warning(f"Page '{page}' not found in created pages, skipping routes")
-                    continue
-                
-                patch_url = f"{self.api_prefix}/{page_resource}"
-                transition_routes = []
-                
-                for r in routes:
-                    intent_ref = intent_name_to_id.get(r["intent"])
-                    next_page = r.get("next_page")
-                    
-                    if not next_page:
-                        continue
-                        
-                    target_page_ref = page_name_to_id.get(next_page)
-                    if not target_page_ref:
-                        logger.warning(f"Target page '{next_page}' not found, skipping route")
-                        continue
-                    
-                    # Build basic route structure
-                    route_payload = {
-                        "intent": intent_ref,
-                        "targetPage": target_page_ref
-                    }
-                    
-                    # ONLY add triggerFulfillment if we have webhook or parameters
-                    webhook_action = r.get("webhook_action")
-                    params = r.get("parameters")
-                    
-                    # Check if we actually have content for triggerFulfillment
-                    has_webhook = webhook_action and dispatcher_name
-                    has_params = params and isinstance(params, dict) and any(params.values())
-                    
-                    if has_webhook or has_params:
-                        trig = {}
-                        
-                        # Add webhook reference if we have dispatcher and action
-                        if has_webhook:
-                            trig["webhook"] = dispatcher_name
-                            trig["tag"] = webhook_action
-                            logger.debug(f"    Adding webhook action: {webhook_action}")
-                        
-                        # Add parameters if they exist and are non-empty
-                        if has_params:
-                            param_actions = []
-                            for k, v in params.items():
-                                if k and v:  # Only add non-empty params
-                                    param_actions.append({"parameter": k, "value": v})
-                            if param_actions:
-                                trig["setParameterActions"] = param_actions
-                                logger.debug(f"    Adding {len(param_actions)} parameters")
-                        
-                        # Only add triggerFulfillment if trig has content
-                        if trig:
-                            route_payload["triggerFulfillment"] = trig
-                    
-                    transition_routes.append(route_payload)
-                
-                # Update page routes only if there are routes to add
-                if transition_routes:
-                    self._api_request('PATCH', patch_url,
-                                    params={"updateMask": "transitionRoutes"},
-                                    json={"transitionRoutes": transition_routes})
-                    logger.info(f"Updated {len(transition_routes)} routes for page: {page}")
-                else:
-                    logger.info(f"Page '{page}' is an end state (no outgoing routes)")
+            # Create/update flow
+            flow_resource = self.upsert_flow(flow_name)
+            flow_url = f"{self.api_prefix}/{flow_resource}"
             
-            # Set start route
-            first_page = data.get("first_page")
-            if first_page:
-                self.patch_flow_start_route(flow_url, first_page)
-                logger.info(f"Set flow start route to: {first_page}")
+            graph = self._flow_operations(flow, flow_url)
+            logger.info(f"{len(graph)} operations, at most {graph.depth()} in sequence")
+            graph.run(self.ops_per_flow)
             
+            self._checkpoint('flow_done', flow_resource, key=flow_name, digest=digest)
             logger.info(f"✓ Successfully uploaded flow '{flow_name}'")
             return True, flow_name
             
         except Exception as e:
             logger.error(f"✗ Failed to upload {json_path}: {e}")
             return False, str(e)
+        finally:
+            if flow_lock:
+                flow_lock.release()
+    
+    def upload_many(self, json_files: Iterable, max_workers: Optional[int] = None
+                    ) -> Iterator[Tuple[str, bool, str]]:
+        """
+        Upload flows concurrently, up to max_workers (default: the uploader's
+        max_workers) at a time. Yields (json_file, success, flow name or error)
+        as each upload finishes. The request rate is bounded by the shared
+        rate limiter, not by the number of workers.
+        """
+        json_files = list(json_files)
+        workers = max(1, min(max_workers or self.max_workers, len(json_files)))
+        self._ensure_pool(workers * self.ops_per_flow)
+        self.merge_shared_intents(json_files)
+        if json_files:
+            self.load_index()
+        
+        if workers == 1:
+            for json_file in json_files:
+                yield (json_file, *self.upload_single_flow(str(json_file)))
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as pool:
+            futures = {pool.submit(self.upload_single_flow, str(f)): f for f in json_files}
+            for future in as_completed(futures):
+                yield (futures[future], *future.result())
+    
+    def wait_operation(self, operation: Dict, timeout: float = 600) -> Dict:
+        """Poll a long-running operation until it is done; raises if it failed or timed out."""
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+        while not operation.get("done"):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Operation {operation['name']} not done after {timeout:g}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
+            operation = self._api_request('GET', f"{self.api_prefix}/{operation['name']}").json()
+        if "error" in operation:
+            raise RuntimeError(f"Operation {operation['name']} failed: "
+                               f"{operation['error'].get('message', operation['error'])}")
+        return operation
+    
+    def import_flows(self, json_files: Iterable, flow_name: Optional[str] = None,
+                     timeout: float = 600) -> Iterator[Tuple[str, bool, str]]:
+        """
+        Upload each of json_files with one flows:import call (importOption
+        FALLBACK) instead of one call per page, intent and route; flow_name
+        only applies to a single file. A flow the agent already has is
+        deleted and replaced by the import; the agent's other flows are left
+        alone. Yields (json_file, success, flow name or error) per flow, in
+        order.
+        """
+        from agent_bundle import build_flow_package, bundle_bytes
+        
+        json_files = [str(f) for f in json_files]
+        self.merge_shared_intents(json_files)
+        if json_files:
+            self.load_index()
+        for json_file in json_files:
+            try:
+                flow, name, _ = self._load_flow(json_file, flow_name if len(json_files) == 1 else None)
+                self._validate_flow(flow)
+                package = build_flow_package(flow, name, self.dispatcher_url, self._dispatcher_headers_map(),
+                                             self.shared_phrases)
+                
+                with self._cache_lock:
+                    existing = self.cache['flows'].get(name)
+                    # The import rewrites the flow's intents, so what the ledger says about them no longer holds
+                    intents = [self.cache['intents'][i] for i in flow.intents if i in self.cache['intents']]
+                for intent_name in intents:
+                    self._forget(intent_name)
+                if existing:
+                    logger.info(f"Replacing flow '{name}' ({existing})")
+                    self._api_request('DELETE', f"{self.api_prefix}/{existing}", params={"force": "true"})
+                    with self._cache_lock:
+                        self.cache['flows'].pop(name, None)
+                        self.cache['pages'].pop(existing, None)
+                    self._forget(existing)
+                
+                operation = self._api_request('POST', f"{self.base_url}/flows:import", json={
+                    "flowContent": base64.b64encode(bundle_bytes(package)).decode("ascii"),
+                    "importOption": "FALLBACK",
+                }).json()
+                flow_resource = self.wait_operation(operation, timeout).get("response", {}).get("flow")
+                with self._cache_lock:
+                    if flow_resource:
+                        self.cache['flows'][name] = flow_resource
+                logger.info(f"✓ Imported flow '{name}': {len(flow.pages)} pages, {len(flow.intents)} intents")
+                yield json_file, True, name
+            except Exception as e:
+                logger.error(f"✗ Failed to import {json_file}: {e}")
+                yield json_file, False, str(e)
+        if json_files:
+            # Imports may have created intents and the dispatcher webhook
+            self.load_index(refresh=True)
+    
+    def restore_flows(self, json_files: Iterable, bundle_path: Optional[str] = None,
+                      timeout: float = 600) -> List[str]:
+        """
+        Replace the whole agent (every flow, intent and webhook) with
+        json_files in a single agents:restore call. The export bundle (see
+        agent_bundle.py) is built and validated before anything is sent, and
+        also written to bundle_path if given. Refuses, with ValueError, if
+        the agent has flows that json_files do not cover, since the restore
+        would delete them; import_flows uploads flows without touching the
+        others. Returns the restored flow names.
+        """
+        from agent_bundle import DEFAULT_START_FLOW, build_bundle, bundle_bytes, validate_bundle, write_bundle
+    
+        flows = []
+        for json_file in json_files:
+            flow, flow_name, _ = self._load_flow(str(json_file))
+            self._validate_flow(flow)
+            flows.append((flow, flow_name))
+        
+        self.load_index(refresh=True)
+        covered = {flow_name for _, flow_name in flows} | {DEFAULT_START_FLOW}
+        with self._cache_lock:
+            uncovered = sorted(set(self.cache['flows']) - covered)
+        if uncovered:
+            names = ", ".join(f"'{name}'" for name in uncovered[:10])
+            raise ValueError(f"Refusing to replace the agent: it has {len(uncovered)} flow(s) not in these files, "
+                             f"which the restore would delete: {names}")
+    
+        agent = self._api_request('GET', self.base_url).json()
+        bundle = build_bundle(flows, agent, self.dispatcher_url, self._dispatcher_headers_map())
+        problems = validate_bundle(bundle)
+        if problems:
+            raise ValueError(f"{len(problems)} problem(s) in the agent bundle: {'; '.join(problems[:5])}")
+        if bundle_path:
+            write_bundle(bundle, bundle_path)
+            logger.info(f"Agent bundle written to {bundle_path}")
+    
+        content = bundle_bytes(bundle)
+        logger.info(f"Restoring agent from bundle: {len(flows)} flows, {len(bundle)} files, {len(content)} bytes")
+        operation = self._api_request('POST', f"{self.base_url}:restore", json={
+            "agentContent": base64.b64encode(content).decode("ascii"),
+            "restoreOption": "FALLBACK",
+        }).json()
+        self.wait_operation(operation, timeout)
     
-    def upload_bulk(self, json_dir: str, max_workers: int = 3) -> Tuple[List[str], List[Tuple[str, str]]]:
-        """Upload multiple flows from a directory of JSON files."""
+        # Every resource name changed; start the index and ledger over
+        with self._cache_lock:
+            self.cache = {kind: {} for kind in self.cache}
+            self.ledger = {}
+            self.remote = {}
+        self.load_index(refresh=True)
+        logger.info(f"✓ Restored {len(flows)} flows")
+        return [flow_name for _, flow_name in flows]
+    
+    @staticmethod
+    def _find_flow_files(json_dir: str) -> List[Path]:
+        """The dialogflow_*.json files in json_dir, sorted by name."""
         json_path = Path(json_dir)
         if not json_path.exists():
             raise ValueError(f"Directory does not exist: {json_dir}")
         
         # Find all JSON files
-        json_files = list(json_path.glob("dialogflow_*.json"))
+        json_files = sorted(json_path.glob("dialogflow_*.json"))
         if not json_files:
             logger.warning(f"No dialogflow_*.json files found in {json_dir}")
-            return [], []
-        
-        logger.info(f"Found {len(json_files)} flows to upload")
+        else:
+            logger.info(f"Found {len(json_files)} flows to upload")
+            logger.info("=" * 50)
+        return json_files
+    
+    @staticmethod
+    def _log_bulk_summary(total: int, successes: List[str], failures: List[Tuple[str, str]]):
         logger.info("=" * 50)
+        logger.info(f"Upload complete: {len(successes)}/{total} successful")
+        
+        if failures:
+            logger.error("Failed uploads:")
+            for file, error in failures:
+                logger.error(f"  - {file}: {error}")
+    
+    def upload_bulk(self, json_dir: str, max_workers: Optional[int] = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """Upload multiple flows from a directory of JSON files, max_workers at a time."""
+        json_files = self._find_flow_files(json_dir)
+        if not json_files:
+            return [], []
         
         successes = []
         failures = []
         
-        # Sequential upload (safer for API limits)
-        for json_file in json_files:
-            success, result = self.upload_single_flow(str(json_file))
+        # Concurrent upload; the shared rate limiter keeps within API limits
+        for json_file, success, result in self.upload_many(json_files, max_workers):
             if success:
                 successes.append(result)
             else:
                 failures.append((json_file.name, result))
-            
-            # Rate limiting
-            time.sleep(1)
         
         # Summary
-        logger.info("=" * 50)
-        logger.info(f"Upload complete: {len(successes)}/{len(json_files)} successful")
-        
-        if failures:
-            logger.error("Failed uploads:")
-            for file, error in failures:
-                logger.error(f"  - {file}: {error}")
-        
+        self._log_bulk_summary(len(json_files), successes, failures)
+        self._log_write_counts()
         return successes, failures
 
+async def _upload_async(uploader, args) -> bool:
+    """Run the CLI upload on the async engine; True if every flow uploaded."""
+    async with uploader:
+        if args.json_dir:
+            _, failures = await uploader.upload_bulk(args.json_dir, max_workers=args.max_workers)
+            return not failures
+        success, _ = await uploader.upload_single_flow(args.json_file, args.flow_name)
+        return success
+
+def _plan_upload(uploader, args) -> bool:
+    """Write the --plan file for the CLI's flows and print its summary; True if every flow is uploadable."""
+    from upload_plan import print_plan, write_plan
+    json_files = uploader._find_flow_files(args.json_dir) if args.json_dir else [args.json_file]
+    plan = uploader.plan(json_files, None if args.json_dir else args.flow_name)
+    write_plan(plan, args.plan)
+    print_plan(plan, args.rate_limit, args.max_workers, args.plan_latency_ms)
+    print(f"Plan written to {args.plan}")
+    return not any(flow.get("error") for flow in plan["flows"])
+
+def _execute_plan(uploader, args) -> bool:
+    """Run the --execute-plan file; True if every flow's calls succeeded."""
+    from upload_plan import execute_plan, load_plan
+    results = list(execute_plan(uploader, load_plan(args.execute_plan), args.max_workers))
+    successes = [result for _, success, result in results if success]
+    failures = [(Path(json_file).name, result) for json_file, success, result in results if not success]
+    uploader._log_bulk_summary(len(results), successes, failures)
+    return not failures
+
+def _restore(uploader, args) -> bool:
+    """Run the --restore upload of the CLI's flows; True if every flow was imported (or the agent restored)."""
+    json_files = uploader._find_flow_files(args.json_dir) if args.json_dir else [args.json_file]
+    if not json_files:
+        return False
+    if args.replace_agent:
+        if args.json_file and args.flow_name:
+            logger.warning("--flow-name is ignored with --replace-agent; flows are named after their files")
+        uploader.restore_flows(json_files, args.bundle)
+        return True
+    if args.bundle:
+        from agent_bundle import export_flows
+        problems = export_flows(json_files, args.bundle, args.dispatcher_url, args.dispatcher_header)
+        if problems:
+            logger.error(f"Agent bundle not written: {'; '.join(problems[:5])}")
+    results = list(uploader.import_flows(json_files, None if args.json_dir else args.flow_name))
+    successes = [result for _, success, result in results if success]
+    failures = [(Path(json_file).name, result) for json_file, success, result in results if not success]
+    uploader._log_bulk_summary(len(results), successes, failures)
+    return not failures
+
 def main():
     parser = argparse.ArgumentParser(description="Upload flows to Dialogflow CX")
     parser.add_argument("--service-account", required=True, help="Service account JSON file")
@@ -442,23 +1290,108 @@ def main():
     parser.add_argument("--json-dir", help="Directory containing JSON files for bulk upload")
     parser.add_argument("--json-file", help="Single JSON file to upload")
     parser.add_argument("--flow-name", help="Flow display name (for single file upload)")
+    parser.add_argument("--allow-dangling", action="store_true",
+                        help="Upload flows whose routes target missing pages, skipping those routes")
+    parser.add_argument("--max-workers", type=int, default=3,
+                        help="Flows uploaded in parallel; also sizes the connection pool (default: 3)")
+    parser.add_argument("--ops-per-flow", type=int, default=8,
+                        help="API operations of one flow run in parallel once their dependencies are done; "
+                             "1 runs them in order (default: 8)")
+    parser.add_argument("--rate-limit", type=float, default=10.0,
+                        help="Starting API requests per second across all workers; adapts to 429/503 "
+                             "responses. 0 for none (default: 10)")
+    parser.add_argument("--max-rate", type=float,
+                        help="Ceiling for the adaptive request rate; equal to --rate-limit for a fixed rate "
+                             "(default: none)")
+    parser.add_argument("--api-endpoint", help="Override the Dialogflow API endpoint (e.g. a local test server)")
+    parser.add_argument("--async", dest="async_upload", action="store_true",
+                        help="Use the asyncio upload engine (requires aiohttp)")
+    parser.add_argument("--max-connections", type=int, default=20,
+                        help="Concurrent API requests with --async (default: 20)")
+    parser.add_argument("--resource-cache", default=CACHE_NAME,
+                        help=f"File keeping the agent's resource names between runs (default: {CACHE_NAME})")
+    parser.add_argument("--no-resource-cache", action="store_true",
+                        help="Discover every resource by listing instead of using the resource cache")
+    parser.add_argument("--sync", action="store_true",
+                        help="Read the agent's current state once and only write what differs")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete pages of uploaded flows that are no longer in their sheet")
+    parser.add_argument("--force", action="store_true",
+                        help="Write every resource, even if the upload ledger shows it unchanged")
+    parser.add_argument("--plan", metavar="PLAN_JSON",
+                        help="Write the API calls the upload would make to this file and print a summary "
+                             "with a time estimate, without calling the API")
+    parser.add_argument("--plan-latency-ms", type=float, default=150,
+                        help="Assumed time per API request for --plan estimates (default: 150)")
+    parser.add_argument("--execute-plan", metavar="PLAN_JSON",
+                        help="Send exactly the API calls of a plan written by --plan")
+    parser.add_argument("--restore", action="store_true",
+                        help="Upload each flow with one flows:import call instead of per-resource calls, "
+                             "replacing flows of the same name; other flows are left alone")
+    parser.add_argument("--replace-agent", action="store_true",
+                        help="With --restore, replace the whole agent with these flows in one agents:restore call; "
+                             "refused if the agent has flows they do not cover")
+    parser.add_argument("--bundle", metavar="BUNDLE_ZIP",
+                        help="With --restore, also write these flows as an agent export bundle")
+    parser.add_argument("--journal", default=JOURNAL_NAME,
+                        help=f"Checkpoint file recording each completed operation (default: {JOURNAL_NAME})")
+    parser.add_argument("--no-journal", action="store_true", help="Do not write a checkpoint journal")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted upload: skip the operations and flows in the journal")
     
     args = parser.parse_args()
     
+    uploader_class = DialogflowUploader
+    extra = {}
+    # Plans and restores do not upload resource by resource, so there is nothing to journal
+    journal = None if args.no_journal or args.plan or args.execute_plan or args.restore else args.journal
+    if args.resume and not journal:
+        logger.warning("--resume only applies to journaled uploads; ignoring it")
+    if args.plan:
+        from upload_plan import PlanningUploader
+        uploader_class = PlanningUploader
+    elif args.execute_plan or args.restore:
+        pass  # Plans and restores run on the threaded engine
+    elif args.async_upload:
+        from async_uploader import AsyncDialogflowUploader
+        uploader_class = AsyncDialogflowUploader
+        extra = {"max_connections": args.max_connections}
+    
     # Initialize uploader
-    uploader = DialogflowUploader(
+    uploader = uploader_class(
         service_account_file=args.service_account,
         project_id=args.project_id,
         location=args.location,
         agent_id=args.agent_id,
         dispatcher_url=args.dispatcher_url,
-        dispatcher_header=args.dispatcher_header
+        dispatcher_header=args.dispatcher_header,
+        allow_dangling=args.allow_dangling,
+        max_workers=args.max_workers,
+        ops_per_flow=args.ops_per_flow,
+        api_endpoint=args.api_endpoint,
+        rate_limit=args.rate_limit,
+        max_rate=args.max_rate,
+        resource_cache=None if args.no_resource_cache else args.resource_cache,
+        sync=args.sync,
+        prune=args.prune,
+        force=args.force,
+        journal=journal,
+        resume=args.resume,
+        **extra
     )
     
     try:
-        if args.json_dir:
+        if args.plan and (args.json_dir or args.json_file):
+            exit(0 if _plan_upload(uploader, args) else 1)
+        elif args.execute_plan:
+            exit(0 if _execute_plan(uploader, args) else 1)
+        elif args.restore and (args.json_dir or args.json_file):
+            exit(0 if _restore(uploader, args) else 1)
+        elif args.async_upload and (args.json_dir or args.json_file):
+            exit(0 if asyncio.run(_upload_async(uploader, args)) else 1)
+        elif args.json_dir:
             # Bulk upload
-            successes, failures = uploader.upload_bulk(args.json_dir)
+            successes, failures = uploader.upload_bulk(args.json_dir, max_workers=args.max_workers)
             exit(0 if not failures else 1)
         elif args.json_file:
             # Single file upload
@@ -471,6 +1404,8 @@ def main():
     except Exception as e:
         logger.error(f"Error: {e}")
         exit(1)
+    finally:
+        uploader.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file